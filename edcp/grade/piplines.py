@@ -1,7 +1,8 @@
-from typing import Dict, Any, Literal, Optional, List, Union
+from typing import Dict, Any, Literal, Optional, List, Union, Iterator
 
 
-from ..tool import read_json, save_json
+from ..tool import save_json
+from ..stream import iter_chunks, open_writer, is_stream_path
 from ..metric.check_type import check_path_data
 from ..metric import utils, McDict
 
@@ -17,7 +18,22 @@ class GradeProcess:
         domain: Optional[str] = None,
         res_save_path: str = "data_grade.json",
         text_column: str = "text",
+        chunk_size: int = 1000,
     ):
+        """
+        GradeProcess初始化方法
+        Args:
+            data_or_filepath: 进入评分管道的变量或文件路径，支持json、jsonl（可加.gz、.zst后缀压缩）、parquet与arrow文件，
+                jsonl、parquet与arrow文件按块流式读取
+            model_name: llm的名称
+            api_key: llm的api key
+            base_url: 调用Qwen系列模型所需提供的base_url
+            prompt_type: 提示词类型，可选领域类（domain）和通用类（general）
+            domain: 当提示词为领域类（domain）时，必须传入该参数
+            res_save_path: 结果文件保存路径，后缀为.json时保存为json文件，为.jsonl（可加.gz、.zst后缀压缩）、.parquet或.arrow时按块写入
+            text_column: Dict中文本的Key
+            chunk_size: 每次读取与评分的样本数量
+        """
         if "qwen" in model_name.lower():
             if "qwen2.5" in model_name.lower():
                 from .chatmodel import ChatQwen2_5
@@ -40,10 +56,13 @@ class GradeProcess:
                 "Only api calls for Qwen, ChatGPT, ChatGLM and Qwen2.5 series models are supported."
             )
 
-        if check_path_data(data_or_filepath) == "str":
-            self.data = read_json(data_or_filepath)
+        # 传入文件路径时不预先载入数据，评分时按块读取
+        if check_path_data(data_or_filepath) == "path":
+            self.data = None
         elif check_path_data(data_or_filepath) == "data":
             self.data = data_or_filepath
+        self.data_or_filepath = data_or_filepath
+        self.chunk_size = chunk_size
 
         self.prompt_type = prompt_type
         self.domain = domain
@@ -57,8 +76,49 @@ class GradeProcess:
             ),
         )
 
-    def forward(self):
-        for idx in range(len(self.data)):
-            self.data[idx] = self.do_grade(self.data[idx])
-        save_json(self.res_save_path, self.data)
+    def iter_results(self) -> Iterator[List[McDict[str, Any]]]:
+        """按chunk_size分块读取样本并评分"""
+        for chunk in iter_chunks(
+            self.data if self.data is not None else self.data_or_filepath,
+            self.chunk_size,
+        ):
+            yield [self.do_grade(d) for d in chunk]
+
+    def save_results(self, keep: bool) -> List[McDict[str, Any]]:
+        """
+        逐块评分并保存，res_save_path为jsonl、parquet或arrow文件时按块写入，为json文件时全部评分完成后保存
+        Args:
+            keep: 是否在内存中保留全部结果，保存为json文件时必须保留
+
+        Returns: 结果列表，keep为False时为空列表
+
+        """
+        results: List[McDict[str, Any]] = []
+        writer = None
+        try:
+            for res in self.iter_results():
+                if is_stream_path(self.res_save_path):
+                    if writer is None:
+                        writer = open_writer(self.res_save_path)
+                    writer.write(res)
+                if keep:
+                    results.extend(res)
+        finally:
+            if writer is not None:
+                writer.close()
+        if not is_stream_path(self.res_save_path):
+            save_json(self.res_save_path, results)
+        return results
+
+    def forward_stream(self):
+        """分块评分并写入结果文件，内存中只保留当前块的结果，res_save_path需为jsonl、parquet或arrow文件"""
+        if not is_stream_path(self.res_save_path):
+            raise ValueError(
+                "forward_stream requires res_save_path to be a .jsonl, .jsonl.gz, .jsonl.zst, .parquet or .arrow file."
+            )
+        self.save_results(keep=False)
+
+    def forward(self) -> List[McDict[str, Any]]:
+        """评分全部样本并返回结果列表"""
+        self.data = self.save_results(keep=True)
         return self.data
@@ -27,3 +27,9 @@ class GradeArgs:
         default=None, metadata={"help": "Path to save the result file."}
     )
     text_column: str = field(default=None, metadata={"help": "Key of text in Dict."})
+    chunk_size: int = field(
+        default=1000,
+        metadata={
+            "help": "Number of samples read and graded at a time, jsonl and parquet files are streamed in chunks of this size."
+        },
+    )
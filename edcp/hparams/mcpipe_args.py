@@ -43,5 +43,44 @@ class McPipeArgs:
         },
     )
     res_save_path: str = field(
-        default="data_metric.json", metadata={"help": "Result file save path"}
+        default="data_metric.json",
+        metadata={
+            "help": "Result file save path, .jsonl (optionally .gz or .zst compressed), .parquet and .arrow results are written in chunks, .parquet and .arrow results have typed metric columns."
+        },
+    )
+    analysis_cache_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of the sqlite database caching segmentation results by content hash. If None, results are only cached in memory."
+        },
+    )
+    analysis_cache_size: int = field(
+        default=2000,
+        metadata={
+            "help": "Maximum number of samples whose segmentation results are kept in memory, about 100KB per 2000-character sample. Metrics are computed in slices of this size so that all metrics share one segmentation. With more samples than this and no analysis_cache_path, the metric pass segments evicted samples again."
+        },
+    )
+    chunk_size: int = field(
+        default=10000,
+        metadata={
+            "help": "Number of samples read and computed at a time, jsonl, parquet and arrow files are streamed in chunks of this size."
+        },
+    )
+    ppl_batch_size: int = field(
+        default=8,
+        metadata={
+            "help": "Number of windows per forward pass when calculating PPL, windows are sorted by token length before batching."
+        },
+    )
+    ppl_max_length: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "Maximum number of tokens per window when calculating PPL. If None, the smaller of 2048 and the maximum length supported by the model is used. Longer texts are scored with a sliding window."
+        },
+    )
+    ppl_stride: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "Stride of the PPL sliding window. If None, half of ppl_max_length is used."
+        },
     )
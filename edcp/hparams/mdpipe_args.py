@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 
 
 @dataclass
@@ -21,10 +21,10 @@ class MdPipeArgs:
     near_tokens: int = field(
         default=1024, metadata={"help": "Approximate range of token counts."}
     )
-    process_method: Literal["chat", "cls"] = field(
+    process_method: Literal["chat", "cls", "onnx"] = field(
         default="cls",
         metadata={
-            "help": "Methods used to filter non-text samples, chat for generic causal models and cls for specialised classification models"
+            "help": "Methods used to filter non-text samples, chat for generic causal models, cls for specialised classification models and onnx for specialised classification models running on ONNX Runtime (CPU only)"
         },
     )
     batch_size: int = field(
@@ -39,3 +39,223 @@ class MdPipeArgs:
         default=False,
         metadata={"help": "Whether to save intermediate result files."},
     )
+    stream: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to deduplicate and append each book's results to a jsonl (or .jsonl.zst) file as soon as the book is finished."
+        },
+    )
+    bloom_capacity: int = field(
+        default=10000000,
+        metadata={
+            "help": "Capacity of the bloom filter used in stream mode, should not be less than the number of samples in the run."
+        },
+    )
+    resume: bool = field(
+        default=False,
+        metadata={
+            "help": "Only valid in stream mode. Whether to skip the books recorded in the run journal and continue from the first unfinished one."
+        },
+    )
+    index_dir: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Directory of the persistent file index. If set, only new or modified markdown files are processed and cached outputs are reused for the rest."
+        },
+    )
+    rule_files: Optional[List[str]] = field(
+        default=None,
+        metadata={
+            "help": "Extra remove/replace rule files (json or tsv), merged with the default rules in BookClean."
+        },
+    )
+    unmark_method: Literal["fast", "markdown"] = field(
+        default="markdown",
+        metadata={
+            "help": "Method used to strip markdown syntax, markdown for rendering with the Markdown package and fast for the line-by-line stripper. fast also strips the leading spaces of continuation lines and the inline syntax inside html blocks, so its output differs slightly."
+        },
+    )
+    pack_exact: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to re-count the tokens of the joined text when packing reaches near_tokens, correcting the per-line count at line boundaries."
+        },
+    )
+    pack_strategy: Literal["greedy", "window_bfd"] = field(
+        default="greedy",
+        metadata={
+            "help": "Packing strategy, greedy for in-order greedy packing and window_bfd for best-fit decreasing bin packing inside a sliding window of lines, keeping samples close to near_tokens. window_bfd may put non-adjacent lines in one sample, joined with a newline."
+        },
+    )
+    pack_window: int = field(
+        default=64,
+        metadata={"help": "Number of lines in the sliding window of window_bfd packing."},
+    )
+    max_batch_tokens: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "If set, lines are bucketed by token length and batched so that the padded token count of a batch stays under this budget, with batch_size as the upper bound of lines per batch."
+        },
+    )
+    group_books: int = field(
+        default=16,
+        metadata={
+            "help": "Number of books whose lines are scheduled together when max_batch_tokens is set."
+        },
+    )
+    chat_mode: Literal["generate", "score"] = field(
+        default="generate",
+        metadata={
+            "help": "Inference mode when process_method is chat, generate for generating the answer and score for a single forward pass comparing the next-token probabilities of 'True' and 'False'."
+        },
+    )
+    score_threshold: float = field(
+        default=0.5,
+        metadata={
+            "help": "In score mode, a line is kept as body text when its calibrated probability is not lower than this threshold."
+        },
+    )
+    calibration_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of the json file with the Platt scaling parameters used in score mode, fitted by fit_calibration and saved by save_calibration. If not set, the sigmoid of the 'True'/'False' margin is used without calibration."
+        },
+    )
+    prefix_cache: bool = field(
+        default=True,
+        metadata={
+            "help": "In score mode, whether to compute the key/value cache of the prompt prefix once per book and reuse it for every line (Transformers only, prefix caching is always enabled for VLLM)."
+        },
+    )
+    cls_cache_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of the sqlite database caching line-level classification results across books and runs. If set, only lines missing from the cache are sent to the model."
+        },
+    )
+    prefilter: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to label confidently decidable lines (figure/table captions, short chapter headings, $$ lines, lines with almost no CJK characters) with rules before model inference."
+        },
+    )
+    prefilter_rules: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Json file of pre-classifier rules. If not set, PreFilter.DEFAULT_RULES is used."
+        },
+    )
+    ft_model_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of the distilled fastText main/non-main text classifier. If set, it runs as a confidence-gated first stage and only low-confidence lines are sent to the model."
+        },
+    )
+    ft_keep_threshold: float = field(
+        default=0.95,
+        metadata={
+            "help": "Lines whose fastText main-text probability is not lower than this threshold are kept directly."
+        },
+    )
+    ft_drop_threshold: float = field(
+        default=0.95,
+        metadata={
+            "help": "Lines whose fastText non-main-text probability is not lower than this threshold are dropped directly."
+        },
+    )
+    onnx_dir: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Directory of the ONNX model when process_method is onnx. If not set, the onnx folder under llm_model_path is used, and the model is exported there if it does not exist."
+        },
+    )
+    onnx_quantize: bool = field(
+        default=True,
+        metadata={
+            "help": "Whether to use the dynamically int8-quantized ONNX model when process_method is onnx."
+        },
+    )
+    onnx_intra_threads: Optional[int] = field(
+        default=None,
+        metadata={
+            "help": "Number of threads used inside a single ONNX Runtime operator. If not set, all physical cores are used."
+        },
+    )
+    onnx_inter_threads: int = field(
+        default=1,
+        metadata={"help": "Number of threads used across ONNX Runtime operators."},
+    )
+    dedup_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of the sqlite database of the persistent dedup store. If set, packed samples are deduplicated against all previous runs before output."
+        },
+    )
+    dedup_lines: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to exactly deduplicate lines before model inference (requires dedup_path). Repeated lines are neither classified nor kept."
+        },
+    )
+    dedup_bits: int = field(
+        default=64,
+        metadata={"help": "Number of bits of the dedup hash keys, 64 or 128."},
+    )
+    boilerplate: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to remove running headers, footers, book titles and page-number lines repeated inside each book before model inference."
+        },
+    )
+    boilerplate_min_count: int = field(
+        default=5,
+        metadata={
+            "help": "Lines (normalized, digits masked) repeated at least this many times inside one book are treated as boilerplate."
+        },
+    )
+    boilerplate_max_len: int = field(
+        default=64,
+        metadata={
+            "help": "Only lines with at most this many characters are checked for boilerplate."
+        },
+    )
+    merge_paragraphs: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to merge paragraphs broken across pages or columns after splitting, using punctuation, CJK continuation and length rules."
+        },
+    )
+    paragraph_min_len: int = field(
+        default=20,
+        metadata={
+            "help": "Only lines with at least this many characters that do not end with sentence punctuation are merged with the next line."
+        },
+    )
+    paragraph_max_len: int = field(
+        default=512,
+        metadata={"help": "Maximum number of characters of a merged paragraph."},
+    )
+    block_mode: bool = field(
+        default=False,
+        metadata={
+            "help": "Whether to process typed blocks (text, heading, list, quote, formula, table, code, image) with their source line ranges instead of plain lines. Requires unmark_method 'fast'."
+        },
+    )
+    block_policy: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of a json file mapping block types to keep, drop or classify. If None, BlockPolicy.DEFAULT is used."
+        },
+    )
+    profile_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of the json report with per-stage timing and throughput (lines, characters, tokens, batches, padding ratio), per book and in aggregate. If None, no report is saved."
+        },
+    )
+    prom_path: Optional[str] = field(
+        default=None,
+        metadata={
+            "help": "Path of the Prometheus textfile (.prom) with aggregate per-stage metrics. Profiling is disabled when both profile_path and prom_path are None."
+        },
+    )
@@ -1,5 +1,5 @@
 import torch
-from typing import List
+from typing import List, Tuple, Optional
 from transformers import AutoModelForSequenceClassification
 from transformers import AutoTokenizer
 
@@ -15,6 +15,7 @@ class QwenCLS:
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
 
     # book_name变量是为了与其他方法调用形式一致，不可删减
+    @torch.inference_mode()
     def forward(self, book_name: str, text: List[str]) -> List[str]:
         encoding = self.tokenizer(text, return_tensors="pt", padding=True)
         encoding = {k: v.to(self.model.device) for k, v in encoding.items()}
@@ -23,3 +24,26 @@ class QwenCLS:
         ids = torch.argmax(logits, dim=-1).tolist()
         response = [ID2BOOL[id] for id in ids]
         return response
+
+    @torch.inference_mode()
+    def predict(
+        self, book_names: List[str], text: List[str]
+    ) -> List[Tuple[str, Optional[float]]]:
+        """
+        返回每条文本的判断结果及其属于正文的概率，分类模型不使用书名
+        Args:
+            book_names: 每条文本对应的书名
+            text: 字符串列表
+
+        Returns: 形如[(判断结果, 正文概率)]
+
+        """
+        encoding = self.tokenizer(text, return_tensors="pt", padding=True)
+        encoding = {k: v.to(self.model.device) for k, v in encoding.items()}
+        probs = torch.softmax(self.model(**encoding).logits.float(), dim=-1)
+        ids = torch.argmax(probs, dim=-1).tolist()
+        return [(ID2BOOL[id], p) for id, p in zip(ids, probs[:, 0].tolist())]
+
+    # 分类模型不使用书名，book_names变量是为了与其他方法调用形式一致
+    def forward_batch(self, book_names: List[str], text: List[str]) -> List[str]:
+        return self.forward("", text)
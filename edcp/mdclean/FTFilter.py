@@ -0,0 +1,87 @@
+import re
+from typing import List, Tuple, Optional
+
+import fasttext
+from loguru import logger
+from .CLSFilter import ID2BOOL
+
+# 汉字逐字切分，连续的字母与数字作为一个词，其余非空白字符逐个切分
+_FT_TOKEN = re.compile(r"[\u4e00-\u9fff]|[A-Za-z]+|\d+|[^\sA-Za-z\d\u4e00-\u9fff]")
+
+
+def ft_tokenize(text: str) -> str:
+    """将文本转换为fastText的输入格式，训练与推理必须使用相同的切分方式"""
+    return " ".join(_FT_TOKEN.findall(text.lower()))
+
+
+class FastTextCLS:
+    def __init__(
+        self,
+        model_path: str,
+        keep_threshold: float = 0.95,
+        drop_threshold: float = 0.95,
+    ):
+        """
+        由QwenCLS蒸馏得到的fastText正文与非正文分类模型，作为置信度门控的第一级过滤器，
+        仅对置信度足够高的文本行直接给出结果，其余文本行交给后续模型推理
+        Args:
+            model_path: fastText模型路径，由train_fasttext/train_cls.py训练得到
+            keep_threshold: 正文概率不低于该值时直接判断为正文
+            drop_threshold: 非正文概率不低于该值时直接判断为非正文
+        """
+        self.model = fasttext.load_model(model_path)
+        logger.info(f"Successful Loading FastText model from {model_path}.")
+        self.keep_threshold = keep_threshold
+        self.drop_threshold = drop_threshold
+        self.decided_num = 0
+        self.total_num = 0
+
+    def prob(self, text_list: List[str]) -> List[float]:
+        """返回每行文本属于正文的概率"""
+        if not text_list:
+            return []
+        labels, probs = self.model.predict([ft_tokenize(t) for t in text_list], k=2)
+        res: List[float] = []
+        for label, prob in zip(labels, probs):
+            scores = dict(zip(label, prob.tolist()))
+            res.append(min(max(scores.get("__label__0", 0.0), 0.0), 1.0))
+        return res
+
+    # 分类模型不使用书名，book_names变量是为了与其他方法调用形式一致
+    def predict(
+        self, book_names: List[str], text: List[str]
+    ) -> List[Tuple[str, Optional[float]]]:
+        return [(ID2BOOL[0] if p >= 0.5 else ID2BOOL[1], p) for p in self.prob(text)]
+
+    def label(self, text_list: List[str]) -> List[Optional[str]]:
+        """
+        对文本行进行置信度门控分类
+        Args:
+            text_list: 字符串列表
+
+        Returns: 每行的判断结果，置信度不足的文本行为None
+
+        """
+        res: List[Optional[str]] = []
+        for p in self.prob(text_list):
+            if p >= self.keep_threshold:
+                res.append(ID2BOOL[0])
+            elif 1 - p >= self.drop_threshold:
+                res.append(ID2BOOL[1])
+            else:
+                res.append(None)
+        return res
+
+    def book_info(self, book_name: str, decided_num: int, total_num: int):
+        """打印单本书由fastText直接判断的文本行比例，并累计到整个运行的统计中"""
+        self.decided_num += decided_num
+        self.total_num += total_num
+        logger.info(
+            f"FastText first stage: {book_name}.md decides {decided_num} of {total_num} lines ({decided_num / total_num * 100 if total_num else 0.0:.2f}% inference saved)."
+        )
+
+    def info(self):
+        logger.info(
+            f"FastText first stage in total: {self.decided_num} of {self.total_num} lines are decided, "
+            f"{self.decided_num / self.total_num * 100 if self.total_num else 0.0:.2f}% of inference saved."
+        )
@@ -1,15 +1,122 @@
-from typing import List, Dict
+import copy
+import json
+import math
+from typing import List, Dict, Literal, Tuple, Optional, Any
 
+import torch
+from loguru import logger
 from .template import LLMFilterPrompt as lfp
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
+# 用于定位提示词中{context}位置的占位符
+CONTEXT_SENTINEL = "\x00CONTEXT\x00"
+
+
+def fit_calibration(
+    margins: List[float], labels: List[int], steps: int = 200
+) -> Tuple[float, float]:
+    """
+    在带标签的验证集上拟合Platt缩放参数，使sigmoid(scale * margin + bias)为校准后的正文概率
+    Args:
+        margins: "True"与"False"的对数概率之差
+        labels: 是否为正文，1为正文，0为非正文
+        steps: LBFGS迭代次数
+
+    Returns: (scale, bias)
+
+    """
+    x = torch.tensor(margins, dtype=torch.float64)
+    y = torch.tensor(labels, dtype=torch.float64)
+    scale = torch.ones(1, dtype=torch.float64, requires_grad=True)
+    bias = torch.zeros(1, dtype=torch.float64, requires_grad=True)
+    optimizer = torch.optim.LBFGS([scale, bias], max_iter=steps)
+
+    def closure():
+        optimizer.zero_grad()
+        loss = torch.nn.functional.binary_cross_entropy_with_logits(
+            scale * x + bias, y
+        )
+        loss.backward()
+        return loss
+
+    optimizer.step(closure)
+    return scale.item(), bias.item()
+
+
+def save_calibration(path: str, calibration: Tuple[float, float]):
+    """将fit_calibration拟合得到的(scale, bias)保存为json文件"""
+    scale, bias = calibration
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"scale": scale, "bias": bias}, f)
+
+
+def load_calibration(path: Optional[str]) -> Tuple[float, float]:
+    """
+    读取save_calibration保存的Platt缩放参数
+    Args:
+        path: json文件路径，若为None则返回不做校准的(1.0, 0.0)
+
+    Returns: (scale, bias)
+
+    """
+    if path is None:
+        return 1.0, 0.0
+    with open(path, "r", encoding="utf-8") as f:
+        calibration = json.load(f)
+    return float(calibration["scale"]), float(calibration["bias"])
+
 
 class ChatModel:
-    def __init__(self, model_path: str):
+    # 判断结果对应的输出
+    TRUE_WORD = "True"
+    FALSE_WORD = "False"
+
+    def __init__(
+        self,
+        model_path: str,
+        mode: Literal["generate", "score"] = "generate",
+        threshold: float = 0.5,
+        calibration: Tuple[float, float] = (1.0, 0.0),
+        prefix_cache: bool = True,
+    ):
+        """
+        Args:
+            model_path: 用于过滤非正文样本的LLM路径
+            mode: generate为生成回答，score为单次前向计算，比较下一个token为"True"与"False"的概率
+            threshold: score模式下校准后的正文概率不低于该值时判断为正文
+            calibration: score模式下的Platt缩放参数(scale, bias)，可由fit_calibration在带标签数据上拟合
+            prefix_cache: score模式下是否对每本书只计算一次提示词公共前缀的KV缓存，并在该书的每行文本中复用
+        """
+        if mode != "generate" and mode != "score":
+            raise ValueError("mode must be 'generate' or 'score'")
         self.model = AutoModelForCausalLM.from_pretrained(
             model_path, torch_dtype="auto", device_map="auto"
         )
         self.tokenizer = AutoTokenizer.from_pretrained(model_path, padding_side="left")
+        self.mode = mode
+        self.threshold = threshold
+        self.calibration = calibration
+        self.prefix_cache = prefix_cache
+        # 当前书籍的前缀缓存，包括书名、后缀模板、前缀长度与KV缓存
+        self._prefix: Optional[Dict[str, Any]] = None
+        self.true_id, self.false_id = self.answer_token_ids()
+
+    def answer_token_ids(self) -> Tuple[int, int]:
+        """获取"True"与"False"的首个token"""
+        true_id = self.tokenizer.encode(self.TRUE_WORD, add_special_tokens=False)[0]
+        false_id = self.tokenizer.encode(self.FALSE_WORD, add_special_tokens=False)[0]
+        if true_id == false_id:
+            raise ValueError("The first tokens of 'True' and 'False' are the same")
+        return true_id, false_id
+
+    def calibrate(self, margins: List[float]) -> List[float]:
+        """将"True"与"False"的对数概率之差转换为校准后的正文概率，无法判定（nan）的文本行概率为0"""
+        scale, bias = self.calibration
+        # 以tanh计算sigmoid，避免差值较大时exp溢出
+        return [
+            0.0 if math.isnan(m) else 0.5 * (1 + math.tanh((scale * m + bias) / 2))
+            for m in margins
+        ]
 
     @staticmethod
     def collate_prompt(
@@ -51,10 +158,200 @@ class ChatModel:
         ]
         return generated_ids_batch
 
-    def forward(self, book_name: str, context: List[str]) -> List[str]:
-        messages_batch = self.collate_prompt(book_name, context)
-        generated_ids_batch = self.text_encoder(messages_batch)
+    @torch.inference_mode()
+    def score_margins(self, message_batch: List[List[Dict[str, str]]]) -> List[float]:
+        """单次前向计算，返回下一个token为"True"与"False"的对数概率之差"""
+        text_batch = self.tokenizer.apply_chat_template(
+            message_batch,
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+        model_inputs_batch = self.tokenizer(
+            text_batch, return_tensors="pt", padding=True
+        ).to(self.model.device)
+        # 左填充时最后一个位置即为下一个token，仅对该位置计算词表logits
+        hidden = self.model.base_model(**model_inputs_batch).last_hidden_state[:, -1]
+        logits = self.model.get_output_embeddings()(hidden).float()
+        margins = logits[:, self.true_id] - logits[:, self.false_id]
+        return margins.tolist()
+
+    def split_prompt(self, book_name: str) -> Tuple[str, str]:
+        """
+        将套用对话模板后的提示词在{context}之前的最后一个换行处切分为公共前缀与后缀模板，
+        在换行处切分可保证前缀与后缀分别分词的结果与整体分词一致
+        Args:
+            book_name: 当前处理的书名
+
+        Returns: (公共前缀, 含占位符的后缀模板)
+
+        """
+        message = self.collate_prompt(book_name, [CONTEXT_SENTINEL])[0]
+        text = self.tokenizer.apply_chat_template(
+            message, tokenize=False, add_generation_prompt=True
+        )
+        cut = text.rfind("\n", 0, text.index(CONTEXT_SENTINEL)) + 1
+        return text[:cut], text[cut:]
+
+    @torch.inference_mode()
+    def build_prefix(self, book_name: str, sample: str) -> Optional[Dict[str, Any]]:
+        """
+        计算书籍公共前缀的KV缓存，若前缀与后缀分别分词的结果与整体分词不一致则返回None
+        Args:
+            book_name: 当前处理的书名
+            sample: 用于校验分词结果的一行文本
+
+        Returns: 前缀缓存
+
+        """
+        prefix, suffix = self.split_prompt(book_name)
+        prefix_ids = self.tokenizer(prefix)["input_ids"]
+        suffix_ids = self.tokenizer(
+            suffix.replace(CONTEXT_SENTINEL, sample), add_special_tokens=False
+        )["input_ids"]
+        full_ids = self.tokenizer(prefix + suffix.replace(CONTEXT_SENTINEL, sample))[
+            "input_ids"
+        ]
+        if prefix_ids + suffix_ids != full_ids:
+            logger.warning(
+                f"Prompt prefix of {book_name} does not tokenize independently, prefix cache is disabled for this book"
+            )
+            return None
+        input_ids = torch.tensor([prefix_ids], device=self.model.device)
+        outputs = self.model.base_model(input_ids=input_ids, use_cache=True)
+        return {
+            "book_name": book_name,
+            "suffix": suffix,
+            "length": len(prefix_ids),
+            "cache": outputs.past_key_values,
+        }
+
+    @torch.inference_mode()
+    def score_margins_cached(
+        self, book_name: str, context: List[str]
+    ) -> Optional[List[float]]:
+        """
+        复用书籍公共前缀的KV缓存，仅对每行文本及其后的模板进行前向计算
+        Args:
+            book_name: 当前处理的书名
+            context: 字符串列表
+
+        Returns: "True"与"False"的对数概率之差，前缀缓存不可用时返回None
+
+        """
+        if self._prefix is None or self._prefix["book_name"] != book_name:
+            self._prefix = self.build_prefix(book_name, context[0])
+            if self._prefix is None:
+                # 记录书名，避免同一本书重复校验
+                self._prefix = {"book_name": book_name, "cache": None}
+        if self._prefix["cache"] is None:
+            return None
+        suffix_ids = self.tokenizer(
+            [self._prefix["suffix"].replace(CONTEXT_SENTINEL, c) for c in context],
+            add_special_tokens=False,
+        )["input_ids"]
+        batch = len(suffix_ids)
+        lengths = torch.tensor([len(ids) for ids in suffix_ids])
+        max_len = int(lengths.max())
+        pad_id = (
+            self.tokenizer.pad_token_id
+            if self.tokenizer.pad_token_id is not None
+            else self.tokenizer.eos_token_id or 0
+        )
+        # 后缀使用右填充，使前缀之后的位置编号连续
+        input_ids = torch.full((batch, max_len), pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((batch, self._prefix["length"] + max_len), dtype=torch.long)
+        attention_mask[:, : self._prefix["length"]] = 1
+        for i, ids in enumerate(suffix_ids):
+            input_ids[i, : len(ids)] = torch.tensor(ids)
+            attention_mask[i, self._prefix["length"] : self._prefix["length"] + len(ids)] = 1
+        position_ids = torch.arange(
+            self._prefix["length"], self._prefix["length"] + max_len
+        ).expand(batch, -1)
+        cache = copy.deepcopy(self._prefix["cache"])
+        cache.batch_repeat_interleave(batch)
+        device = self.model.device
+        hidden = self.model.base_model(
+            input_ids=input_ids.to(device),
+            attention_mask=attention_mask.to(device),
+            position_ids=position_ids.to(device),
+            past_key_values=cache,
+            use_cache=True,
+        ).last_hidden_state
+        hidden = hidden[torch.arange(batch, device=device), (lengths - 1).to(device)]
+        logits = self.model.get_output_embeddings()(hidden).float()
+        margins = logits[:, self.true_id] - logits[:, self.false_id]
+        return margins.tolist()
+
+    def margins(self, book_name: str, context: List[str]) -> List[float]:
+        """score模式下计算"True"与"False"的对数概率之差，可用时复用前缀缓存"""
+        if self.prefix_cache:
+            margins = self.score_margins_cached(book_name, context)
+            if margins is not None:
+                return margins
+        return self.score_margins(self.collate_prompt(book_name, context))
+
+    def to_answer(self, probs: List[float]) -> List[str]:
+        return [
+            self.TRUE_WORD if p >= self.threshold else self.FALSE_WORD for p in probs
+        ]
+
+    def forward_with_prob(self, book_name: str, context: List[str]) -> List[float]:
+        """
+        返回每段文本属于正文的校准概率
+        Args:
+            book_name: 当前处理的书名
+            context: 字符串列表
+
+        Returns: 校准后的正文概率列表
+
+        """
+        return self.calibrate(self.margins(book_name, context))
+
+    def chat(self, message_batch: List[List[Dict[str, str]]]) -> List[str]:
+        if self.mode == "score":
+            return self.to_answer(self.calibrate(self.score_margins(message_batch)))
+        generated_ids_batch = self.text_encoder(message_batch)
         response = self.tokenizer.batch_decode(
             generated_ids_batch, skip_special_tokens=True
         )
         return response
+
+    def forward(self, book_name: str, context: List[str]) -> List[str]:
+        if self.mode == "score":
+            return self.to_answer(self.forward_with_prob(book_name, context))
+        messages_batch = self.collate_prompt(book_name, context)
+        return self.chat(messages_batch)
+
+    def predict(
+        self, book_names: List[str], context: List[str]
+    ) -> List[Tuple[str, Optional[float]]]:
+        """
+        跨书籍批推理，每条文本使用各自的书名构造提示词
+        Args:
+            book_names: 每条文本对应的书名
+            context: 字符串列表
+
+        Returns: 每条文本的判断结果及其正文概率，generate模式下概率为None
+
+        """
+        if self.mode == "score" and self.prefix_cache:
+            # 按书名分组，同一本书的文本复用同一个前缀缓存
+            groups: Dict[str, List[int]] = {}
+            for i, b in enumerate(book_names):
+                groups.setdefault(b, []).append(i)
+            probs: List[float] = [0.0] * len(context)
+            for b, idx in groups.items():
+                for i, p in zip(idx, self.forward_with_prob(b, [context[i] for i in idx])):
+                    probs[i] = p
+            return list(zip(self.to_answer(probs), probs))
+        messages_batch = [
+            self.collate_prompt(b, [c])[0] for b, c in zip(book_names, context)
+        ]
+        if self.mode == "score":
+            probs = self.calibrate(self.score_margins(messages_batch))
+            return list(zip(self.to_answer(probs), probs))
+        return [(r, None) for r in self.chat(messages_batch)]
+
+    def forward_batch(self, book_names: List[str], context: List[str]) -> List[str]:
+        """跨书籍批推理，每条文本使用各自的书名构造提示词"""
+        return [r for r, _ in self.predict(book_names, context)]
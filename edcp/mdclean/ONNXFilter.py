@@ -0,0 +1,182 @@
+import os
+from typing import List, Tuple, Optional
+
+import torch
+import numpy as np
+from loguru import logger
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from .CLSFilter import ID2BOOL
+from ..tool import _is_package_available
+
+ONNX_NAME = "model.onnx"
+INT8_NAME = "model.int8.onnx"
+
+
+class _LogitsOnly(torch.nn.Module):
+    """仅输出logits，便于导出固定输入输出的计算图"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(
+            input_ids=input_ids, attention_mask=attention_mask, use_cache=False
+        ).logits
+
+
+def export_onnx(
+    model_path: str, onnx_dir: str, quantize: bool = True, opset: int = 17
+) -> str:
+    """
+    将QwenCLS分类模型导出为ONNX格式，并进行动态int8量化
+    Args:
+        model_path: Qwen2.5分类模型路径
+        onnx_dir: ONNX模型与分词器的保存目录
+        quantize: 是否对权重进行动态int8量化
+        opset: ONNX算子集版本
+
+    Returns: 用于推理的ONNX模型路径
+
+    """
+    # 导出需要onnx，量化与推理需要onnxruntime
+    for package in ("onnx", "onnxruntime"):
+        if not _is_package_available(package):
+            raise ImportError(
+                f"Exporting the onnx model requires the {package} package, 'pip install onnx onnxruntime'."
+            )
+    os.makedirs(onnx_dir, exist_ok=True)
+    onnx_path = os.path.join(onnx_dir, ONNX_NAME)
+    model = AutoModelForSequenceClassification.from_pretrained(
+        model_path, torch_dtype=torch.float32, attn_implementation="eager"
+    ).eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    tokenizer.save_pretrained(onnx_dir)
+    dummy = tokenizer(["正文", "非正文内容"], return_tensors="pt", padding=True)
+    with torch.inference_mode():
+        torch.onnx.export(
+            _LogitsOnly(model),
+            (dummy["input_ids"], dummy["attention_mask"]),
+            onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+            dynamo=False,
+        )
+    logger.info(f"Export onnx model to {onnx_path}.")
+    if not quantize:
+        return onnx_path
+    return quantize_onnx(onnx_dir)
+
+
+def quantize_onnx(onnx_dir: str) -> str:
+    """
+    对目录中已导出的ONNX模型进行动态int8量化
+    Args:
+        onnx_dir: ONNX模型的保存目录
+
+    Returns: 量化后的ONNX模型路径
+
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    onnx_path = os.path.join(onnx_dir, ONNX_NAME)
+    int8_path = os.path.join(onnx_dir, INT8_NAME)
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    logger.info(f"Quantize onnx model to {int8_path}.")
+    return int8_path
+
+
+class ONNXCLS:
+    def __init__(
+        self,
+        model_name: str,
+        onnx_dir: Optional[str] = None,
+        quantize: bool = True,
+        intra_op_threads: Optional[int] = None,
+        inter_op_threads: int = 1,
+    ):
+        """
+        基于ONNX Runtime的QwenCLS推理后端，适用于仅有CPU的节点，输入输出与QwenCLS一致
+        Args:
+            model_name: Qwen2.5分类模型路径
+            onnx_dir: ONNX模型的保存目录，若为None则为模型路径下的onnx文件夹，
+                目录中只有未量化的模型时直接量化，两种模型都不存在时自动导出
+            quantize: 是否使用动态int8量化后的模型
+            intra_op_threads: 单个算子内部的并行线程数，若为None则使用全部物理核心
+            inter_op_threads: 算子之间的并行线程数，顺序执行的Transformer计算图中设为1即可
+        """
+        if not _is_package_available("onnxruntime"):
+            raise ImportError(
+                "The onnx backend requires the onnxruntime package, 'pip install onnx onnxruntime'."
+            )
+        onnx_dir = onnx_dir or os.path.join(model_name, "onnx")
+        onnx_path = os.path.join(onnx_dir, INT8_NAME if quantize else ONNX_NAME)
+        if not os.path.exists(onnx_path):
+            if quantize and os.path.exists(os.path.join(onnx_dir, ONNX_NAME)):
+                # 已导出未量化的模型时直接量化，不需要重新导出
+                onnx_path = quantize_onnx(onnx_dir)
+            else:
+                onnx_path = export_onnx(model_name, onnx_dir, quantize)
+        self.onnx_path = onnx_path
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.session = self.load_session()
+        self.tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        logger.info(f"Successful Loading onnx model from {onnx_path}.")
+
+    def load_session(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if self.intra_op_threads is not None:
+            options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        return ort.InferenceSession(
+            self.onnx_path, options, providers=["CPUExecutionProvider"]
+        )
+
+    # InferenceSession无法序列化，多进程处理时在子进程中重新创建
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["session"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.session = self.load_session()
+
+    def logits(self, text: List[str]) -> np.ndarray:
+        encoding = self.tokenizer(text, return_tensors="np", padding=True)
+        return self.session.run(
+            ["logits"],
+            {
+                "input_ids": encoding["input_ids"].astype(np.int64),
+                "attention_mask": encoding["attention_mask"].astype(np.int64),
+            },
+        )[0]
+
+    # book_name变量是为了与其他方法调用形式一致，不可删减
+    def forward(self, book_name: str, text: List[str]) -> List[str]:
+        ids = np.argmax(self.logits(text), axis=-1).tolist()
+        return [ID2BOOL[id] for id in ids]
+
+    def predict(
+        self, book_names: List[str], text: List[str]
+    ) -> List[Tuple[str, Optional[float]]]:
+        logits = self.logits(text).astype(np.float64)
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        probs = np.exp(logits) / np.exp(logits).sum(axis=-1, keepdims=True)
+        ids = np.argmax(probs, axis=-1).tolist()
+        return [(ID2BOOL[id], p) for id, p in zip(ids, probs[:, 0].tolist())]
+
+    # 分类模型不使用书名，book_names变量是为了与其他方法调用形式一致
+    def forward_batch(self, book_names: List[str], text: List[str]) -> List[str]:
+        return self.forward("", text)
@@ -1,21 +1,69 @@
-from typing import List
+import math
+from typing import List, Dict, Literal, Tuple
 
+from loguru import logger
 from .LLMFilter import ChatModel
 from vllm import LLM, SamplingParams
 from transformers import AutoTokenizer
 
+# 未出现在返回的top-k对数概率中的token所使用的对数概率
+MISSING_LOGPROB = -100.0
+
 
 class VLLMChatModel(ChatModel):
-    def __init__(self, model_path: str):
+    def __init__(
+        self,
+        model_path: str,
+        mode: Literal["generate", "score"] = "generate",
+        threshold: float = 0.5,
+        calibration: Tuple[float, float] = (1.0, 0.0),
+    ):
+        if mode != "generate" and mode != "score":
+            raise ValueError("mode must be 'generate' or 'score'")
         self.tokenizer = AutoTokenizer.from_pretrained(model_path, padding_side="left")
         self.sampling_params = SamplingParams(
             temperature=0.7, top_p=0.8, repetition_penalty=1.05, max_tokens=512
         )
-        self.llm = LLM(model=model_path)
+        # score模式只解码一个token，并返回top-k对数概率
+        self.score_params = SamplingParams(temperature=0, max_tokens=1, logprobs=20)
+        # 提示词中仅末尾的{context}随文本变化，开启自动前缀缓存后同一本书的公共前缀只需计算一次
+        self.llm = LLM(model=model_path, enable_prefix_caching=True)
+        self.mode = mode
+        self.threshold = threshold
+        self.calibration = calibration
+        # 前缀缓存由VLLM自动管理
+        self.prefix_cache = False
+        self.true_id, self.false_id = self.answer_token_ids()
+
+    def score_margins(self, message_batch: List[List[Dict[str, str]]]) -> List[float]:
+        text_batch = self.tokenizer.apply_chat_template(
+            message_batch,
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+        outputs = self.llm.generate(text_batch, self.score_params, use_tqdm=False)
+        margins: List[float] = []
+        undecided = 0
+        for output in outputs:
+            logprobs = output.outputs[0].logprobs[0]
+            if self.true_id not in logprobs and self.false_id not in logprobs:
+                # "True"与"False"均不在top-k中时无法判定，记为nan，校准后概率为0即判断为非正文
+                margins.append(math.nan)
+                undecided += 1
+                continue
+            true_lp = logprobs[self.true_id].logprob if self.true_id in logprobs else MISSING_LOGPROB
+            false_lp = logprobs[self.false_id].logprob if self.false_id in logprobs else MISSING_LOGPROB
+            margins.append(true_lp - false_lp)
+        if undecided:
+            logger.warning(
+                f"Neither 'True' nor 'False' is in the top-{self.score_params.logprobs} logprobs of {undecided}/{len(outputs)} lines, these lines are judged as non-body text"
+            )
+        return margins
 
-    def forward(self, book_name: str, context: List[str]) -> List[str]:
+    def chat(self, message_batch: List[List[Dict[str, str]]]) -> List[str]:
+        if self.mode == "score":
+            return super().chat(message_batch)
         response: List[str] = []
-        message_batch = self.collate_prompt(book_name, context)
         text_batch = self.tokenizer.apply_chat_template(
             message_batch,
             tokenize=False,
@@ -25,4 +73,4 @@ class VLLMChatModel(ChatModel):
         for output in outputs:
             generated_text = output.outputs[0].text
             response.append(generated_text)
-        return response
\ No newline at end of file
+        return response
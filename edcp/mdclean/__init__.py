@@ -1,4 +1,5 @@
 from .charreplace import *
+from .ruleengine import *
 from .pipelines import *
 from .template import *
 from .utils import *
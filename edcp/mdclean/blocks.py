@@ -0,0 +1,98 @@
+import json
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Dict, Any, Union, Optional
+
+from loguru import logger
+
+# 块类型：正文段落、标题、列表项、引用、$$公式块、html表格、代码块、图片
+BLOCK_TYPES = ("text", "heading", "list", "quote", "formula", "table", "code", "image")
+# 块的处理方式：keep为直接保留，drop为直接剔除，classify为交给模型推理
+POLICY_ACTIONS = ("keep", "drop", "classify")
+
+
+@dataclass
+class Block:
+    """markdown中的一个块，start与end为块在源文件中的起止行号（从1开始，包含end）"""
+
+    type: str
+    text: str
+    start: int
+    end: int
+
+
+# 打包后的样本，按块处理时为{"text": ..., "file": ..., "lines": [[start, end], ...]}
+Sample = Union[str, Dict[str, Any]]
+
+
+def item_text(item: Union[str, Block, Dict[str, Any]]) -> str:
+    """文本行、块或打包后样本的文本"""
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        return item["text"]
+    return item.text
+
+
+def sample_record(sample: Sample, idx: int) -> Dict[str, Any]:
+    """将打包后的样本转换为输出记录，按块处理时保留样本在源文件中的位置"""
+    if isinstance(sample, str):
+        return {"text": sample, "id_int": idx}
+    extra = {k: v for k, v in sample.items() if k != "text"}
+    return {"text": sample["text"], "id_int": idx, **extra}
+
+
+class BlockPolicy:
+    # 默认策略，公式块、表格与图片不经过模型推理直接剔除，与LLMFilterPrompt中的非正文特征一致
+    DEFAULT: Dict[str, str] = {
+        "text": "classify",
+        "heading": "classify",
+        "list": "classify",
+        "quote": "classify",
+        "formula": "drop",
+        "table": "drop",
+        "code": "classify",
+        "image": "drop",
+    }
+
+    def __init__(self, policy: Optional[Dict[str, str]] = None):
+        """
+        按块类型决定每个块的处理方式
+        Args:
+            policy: 块类型到处理方式的映射，未给出的类型使用DEFAULT中的处理方式
+        """
+        self.policy = {**self.DEFAULT, **(policy or {})}
+        for block_type, action in self.policy.items():
+            if block_type not in BLOCK_TYPES:
+                raise ValueError(f"unknown block type {block_type}, must be one of {BLOCK_TYPES}")
+            if action not in POLICY_ACTIONS:
+                raise ValueError(f"action of block type {block_type} must be one of {POLICY_ACTIONS}")
+        self.hits: Counter = Counter()
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "BlockPolicy":
+        """从json文件读取处理方式，若path为None则使用默认策略"""
+        if path is None:
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def label(self, blocks: List[Block]) -> List[Optional[str]]:
+        """
+        根据块类型给出判断结果
+        Args:
+            blocks: 块列表
+
+        Returns: 每个块的判断结果，需要模型推理的块为None
+
+        """
+        labels: List[Optional[str]] = []
+        for b in blocks:
+            action = self.policy[b.type]
+            self.hits[(b.type, action)] += 1
+            labels.append({"keep": "True", "drop": "False"}.get(action))
+        return labels
+
+    def info(self):
+        for (block_type, action), num in sorted(self.hits.items()):
+            logger.info(f"Block policy: {num} {block_type} blocks -> {action}")
@@ -0,0 +1,104 @@
+import re
+from collections import Counter
+from typing import List, Union
+
+from loguru import logger
+from .clscache import normalize_line
+from .blocks import Block, item_text
+
+_DIGITS = re.compile(r"\d+")
+# 【临床表现】等小标题在每个章节中重复出现，属于正文结构，不作为样板文本剔除
+_HEADING = re.compile(r"^\s*【[^】]+】")
+# 公式块与表格中的文本行可能重复出现，不作为样板文本剔除
+_EXEMPT_TYPES = ("formula", "table")
+
+
+def boilerplate_key(text: str) -> str:
+    """归一化文本行并将连续数字替换为0，使仅页码不同的页眉页脚共用同一个键"""
+    return _DIGITS.sub("0", normalize_line(text))
+
+
+class Boilerplate:
+    def __init__(self, min_count: int = 5, max_len: int = 64):
+        """
+        基于书内频次的样板文本检测，OCR得到的书籍中页眉、书名、页码行与页脚会在同一本书中重复出现成百上千次，
+        统计每本书中归一化（数字统一替换）后文本行的出现次数，剔除出现次数达到阈值的短文本行
+        Args:
+            min_count: 同一本书中出现次数不低于该值的文本行视为样板文本
+            max_len: 仅检测字符数不超过该值的文本行，避免误删重复出现的正文段落，【…】小标题、$$公式块与html表格中的文本行不参与检测
+        """
+        self.min_count = min_count
+        self.max_len = max_len
+        self.hits: Counter = Counter()
+        self.removed_num = 0
+        self.total_num = 0
+
+    @staticmethod
+    def exempt(text_list: List[Union[str, Block]]) -> List[bool]:
+        """
+        判断每个文本行（或块）是否不参与样板文本检测：【…】小标题、$$公式块与html表格中的文本行
+        Args:
+            text_list: 字符串列表，按块处理时为块列表
+
+        Returns: 与text_list等长的布尔列表
+
+        """
+        flags: List[bool] = []
+        in_formula = False
+        in_table = False
+        for item in text_list:
+            if isinstance(item, Block):
+                flags.append(
+                    item.type in _EXEMPT_TYPES or bool(_HEADING.match(item.text))
+                )
+                continue
+            line = item.strip()
+            if line == "$$":
+                # 公式块的起止行
+                in_formula = not in_formula
+                flags.append(True)
+                continue
+            if "<table" in line:
+                in_table = True
+            flags.append(in_formula or in_table or bool(_HEADING.match(line)))
+            if "</table>" in line:
+                in_table = False
+        return flags
+
+    def filter(
+        self, book_name: str, text_list: List[Union[str, Block]]
+    ) -> List[Union[str, Block]]:
+        """
+        剔除单本书中的样板文本行
+        Args:
+            book_name: 当前处理的书名
+            text_list: 字符串列表，按块处理时为块列表
+
+        Returns: 剔除样板文本后的列表
+
+        """
+        texts = [item_text(t) for t in text_list]
+        keys = [
+            boilerplate_key(t) if len(t) <= self.max_len and not e else None
+            for t, e in zip(texts, self.exempt(text_list))
+        ]
+        counts = Counter(k for k in keys if k)
+        boiler = {k for k, n in counts.items() if n >= self.min_count}
+        filter_text = [t for t, k in zip(text_list, keys) if k not in boiler]
+        for k in boiler:
+            self.hits[k] += counts[k]
+        removed = len(text_list) - len(filter_text)
+        self.removed_num += removed
+        self.total_num += len(text_list)
+        logger.info(
+            f"Boilerplate: {book_name}.md removes {removed} of {len(text_list)} lines in {len(boiler)} repeated patterns."
+        )
+        return filter_text
+
+    def info(self, top_k: int = 10):
+        logger.info(
+            f"Boilerplate in total: {self.removed_num} of {self.total_num} lines are removed "
+            f"({self.removed_num / self.total_num * 100 if self.total_num else 0.0:.2f}%)."
+        )
+        for key, num in self.hits.most_common(top_k):
+            logger.info(f"Boilerplate pattern {key!r} removes {num} lines")
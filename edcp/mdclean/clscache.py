@@ -0,0 +1,133 @@
+import os
+import re
+import sqlite3
+import hashlib
+import unicodedata
+from typing import List, Dict, Tuple, Optional
+
+from loguru import logger
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_line(text: str) -> str:
+    """NFKC归一化并合并连续空白字符，使仅有全半角或空白差异的文本行共用同一条缓存"""
+    return _SPACES.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def line_key(text: str, scope: str = "") -> bytes:
+    """
+    计算文本行的缓存键
+    Args:
+        text: 文本行
+        scope: 影响推理结果的额外信息，如chat方式下提示词中的书名
+
+    Returns: 128位哈希值
+
+    """
+    return hashlib.blake2b(
+        (scope + "\x00" + normalize_line(text)).encode("utf-8"), digest_size=16
+    ).digest()
+
+
+class ClsCache:
+    def __init__(self, db_path: str, model_id: str):
+        """
+        基于sqlite的文本行分类结果缓存，以(模型标识, 归一化文本行哈希)为键保存保留/剔除结果及其置信度，
+        可在书籍之间与多次运行之间复用
+        数据库连接在首次使用时按进程创建，实例可以被序列化后传入进程池
+        Args:
+            db_path: sqlite数据库文件路径
+            model_id: 模型标识，由模型路径、推理方式与提示词模板等决定推理结果的配置计算
+        """
+        self.db_path = db_path
+        self.model_id = model_id
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.hit_num = 0
+        self.query_num = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_pid"] = None
+        return state
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            # 流水线处理时连接可能在推理线程中使用，同一时刻只有一个线程访问
+            self._conn = sqlite3.connect(
+                self.db_path, timeout=60, check_same_thread=False
+            )
+            # WAL模式允许多个进程同时读取，并与单个写入者并发
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cls_cache ("
+                "model TEXT NOT NULL, key BLOB NOT NULL, res TEXT NOT NULL, prob REAL, "
+                "PRIMARY KEY (model, key)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def get_many(
+        self, keys: List[bytes], chunk_size: int = 500
+    ) -> Dict[bytes, Tuple[str, Optional[float]]]:
+        """
+        批量查询缓存
+        Args:
+            keys: 缓存键列表
+            chunk_size: 单条SQL语句查询的键数量
+
+        Returns: 命中的缓存，形如{key: (res, prob)}
+
+        """
+        found: Dict[bytes, Tuple[str, Optional[float]]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for i in range(0, len(unique_keys), chunk_size):
+            chunk = unique_keys[i : i + chunk_size]
+            rows = self.conn.execute(
+                f"SELECT key, res, prob FROM cls_cache WHERE model = ? AND key IN ({','.join('?' * len(chunk))})",
+                [self.model_id, *chunk],
+            )
+            for key, res, prob in rows:
+                found[key] = (res, prob)
+        return found
+
+    def put_many(self, items: List[Tuple[bytes, str, Optional[float]]]):
+        """
+        批量写入缓存
+        Args:
+            items: 形如[(key, res, prob)]
+        """
+        if not items:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cls_cache (model, key, res, prob) VALUES (?, ?, ?, ?)",
+                [(self.model_id, k, r, p) for k, r, p in items],
+            )
+
+    def book_info(self, book_name: str, hit_num: int, query_num: int):
+        """打印单本书的缓存命中率，并累计到整个运行的统计中"""
+        self.hit_num += hit_num
+        self.query_num += query_num
+        logger.info(
+            f"Classification cache: {book_name}.md hits {hit_num} of {query_num} lines ({hit_num / query_num * 100 if query_num else 0.0:.2f}%)."
+        )
+
+    def info(self):
+        logger.info(
+            f"Classification cache in total: {self.hit_num} of {self.query_num} lines hit ({self.hit_num / self.query_num * 100 if self.query_num else 0.0:.2f}%)."
+        )
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._pid = None
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+from typing import List, Optional, Union
+
+from loguru import logger
+from . import utils
+from .clscache import normalize_line
+from .blocks import Block, Sample, item_text
+
+
+def dedup_key(text: str, bits: int = 64) -> bytes:
+    """
+    计算去重键
+    Args:
+        text: 文本行或打包后的样本
+        bits: 哈希位数，64或128
+
+    Returns: 归一化文本的哈希值
+
+    """
+    return hashlib.blake2b(
+        normalize_line(text).encode("utf-8"), digest_size=bits // 8
+    ).digest()
+
+
+class DedupStore:
+    def __init__(self, db_path: str, bits: int = 64):
+        """
+        基于sqlite的持久化去重集合，以(去重级别, 归一化文本哈希)为键，可在多次运行与多个任务之间共享，
+        line级别用于推理前的文本行去重，chunk级别用于打包后的样本去重
+        每个键记录首次出现的书籍，同一本书重新处理（断点续跑、文件修改后重跑）时不会被自身之前写入的键过滤
+        数据库连接在首次使用时按进程与线程创建，实例可以被序列化后传入进程池
+        Args:
+            db_path: sqlite数据库文件路径，为":memory:"时仅在当前线程内去重，不做持久化
+            bits: 哈希位数，64位适合亿级以下的文本，更大规模时使用128位以降低碰撞概率
+        """
+        if bits not in (64, 128):
+            raise ValueError("bits must be 64 or 128")
+        self.db_path = db_path
+        self.bits = bits
+        self._local = threading.local()
+        # 每个级别去重前后的数量
+        self.total_num: Counter = Counter()
+        self.unique_num: Counter = Counter()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_local"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+            # WAL模式允许多个进程同时读取，并与单个写入者并发
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dedup ("
+                "level TEXT NOT NULL, key BLOB NOT NULL, owner BLOB NOT NULL, "
+                "PRIMARY KEY (level, key)) WITHOUT ROWID"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def unique(
+        self,
+        level: str,
+        text_list: List[str],
+        owner: Optional[str] = None,
+        chunk_size: int = 500,
+    ) -> List[bool]:
+        """
+        判断每条文本是否首次出现，并将首次出现的文本写入去重集合，查询与写入在同一事务中完成
+        Args:
+            level: 去重级别，如line或chunk
+            text_list: 字符串列表
+            owner: 文本所属的书籍，同一书籍写入的键不会过滤该书籍自身（重新处理同一本书时结果不变），
+                若为None则不区分来源，数据库中已有的键全部过滤
+            chunk_size: 单次查询的键数量
+
+        Returns: 每条文本是否保留
+
+        """
+        if not text_list:
+            return []
+        keys = [dedup_key(t, self.bits) for t in text_list]
+        # 未指定来源的键记为空值，不会与任何书籍的哈希相同
+        owner_key = (
+            b""
+            if owner is None
+            else hashlib.blake2b(owner.encode("utf-8"), digest_size=8).digest()
+        )
+        conn = self.conn
+        # 立即获取写锁，避免多个进程同时判断同一文本为首次出现
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = {}
+            uniq_keys = list(dict.fromkeys(keys))
+            for i in range(0, len(uniq_keys), chunk_size):
+                chunk = uniq_keys[i : i + chunk_size]
+                rows = conn.execute(
+                    f"SELECT key, owner FROM dedup WHERE level = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [level, *chunk],
+                ).fetchall()
+                existing.update(rows)
+            keep: List[bool] = []
+            seen = set()
+            for k in keys:
+                if k in seen or (
+                    k in existing and (owner is None or existing[k] != owner_key)
+                ):
+                    keep.append(False)
+                    continue
+                seen.add(k)
+                keep.append(True)
+            conn.executemany(
+                "INSERT OR IGNORE INTO dedup (level, key, owner) VALUES (?, ?, ?)",
+                [(level, k, owner_key) for k in seen if k not in existing],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.total_num[level] += len(keys)
+        self.unique_num[level] += len(seen)
+        return keep
+
+    def filter(
+        self,
+        level: str,
+        text_list: List[Union[str, Block, Sample]],
+        owner: Optional[str] = None,
+        book_name: Optional[str] = None,
+    ) -> List[Union[str, Block, Sample]]:
+        """
+        对字符串列表进行去重，保留首次出现的文本
+        Args:
+            level: 去重级别，如line或chunk
+            text_list: 字符串列表，按块处理时为块或打包后的样本列表
+            owner: 文本所属的书籍，若为None则不区分来源
+            book_name: 当前处理的书名，用于日志
+
+        Returns: 去重后的列表
+
+        """
+        keep = self.unique(level, [item_text(t) for t in text_list], owner)
+        unique_text = [t for t, k in zip(text_list, keep) if k]
+        utils.filter_info(
+            f"Dedup Store ({level})",
+            len(text_list),
+            len(unique_text),
+            book_name + ".md" if book_name is not None else None,
+        )
+        return unique_text
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def info(self):
+        for level, total in self.total_num.items():
+            unique = self.unique_num[level]
+            logger.info(
+                f"Dedup store ({level}): {total - unique} of {total} removed, dedup rate {(total - unique) / total * 100 if total else 0.0:.2f}%."
+            )
@@ -0,0 +1,120 @@
+import os
+import json
+import hashlib
+from typing import List, Dict, Any, Union
+
+from loguru import logger
+from ..tool import check_dir_exist, read_json
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """分块计算文件内容的sha256值"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def atomic_save_json(path: str, data: Any):
+    """先写入临时文件再替换，避免崩溃时留下不完整的json文件"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+class FileIndex:
+    def __init__(self, index_dir: str, cfg_hash: str):
+        """
+        持久化的内容寻址索引，记录markdown文件的路径、大小、修改时间与内容哈希，
+        并以(内容哈希, 配置哈希)为键缓存清洗后的结果
+        Args:
+            index_dir: 索引与缓存结果的保存目录
+            cfg_hash: 当前运行配置的哈希值
+        """
+        self.index_dir = index_dir
+        self.output_dir = os.path.join(index_dir, "outputs")
+        self.index_path = os.path.join(index_dir, "index.json")
+        self.cfg_hash = cfg_hash
+        check_dir_exist(self.output_dir)
+        self.index: Dict[str, Dict[str, Any]] = (
+            read_json(self.index_path) if os.path.exists(self.index_path) else {}
+        )
+        self.hit_num = 0
+        self.miss_num = 0
+
+    def content_hash(self, path: str) -> str:
+        """
+        获取文件的内容哈希，文件大小与修改时间均未变化时直接复用索引中的记录
+        Args:
+            path: markdown文件路径
+
+        Returns: 文件内容的sha256值
+
+        """
+        stat = os.stat(path)
+        entry = self.index.get(path)
+        if (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+        ):
+            return entry["sha256"]
+        sha = file_sha256(path)
+        self.index[path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha,
+        }
+        return sha
+
+    def output_path(self, sha: str) -> str:
+        return os.path.join(self.output_dir, f"{sha}_{self.cfg_hash[:16]}.json")
+
+    def has_output(self, path: str) -> bool:
+        """
+        判断文件在当前配置下是否已有缓存的清洗结果
+        Args:
+            path: markdown文件路径
+
+        Returns: 若文件为新增或已修改则返回False
+
+        """
+        if os.path.exists(self.output_path(self.content_hash(path))):
+            self.hit_num += 1
+            return True
+        self.miss_num += 1
+        return False
+
+    def get_output(self, path: str) -> List[Union[str, Dict[str, Any]]]:
+        """
+        读取文件在当前配置下缓存的清洗结果，内容相同的文件共用同一份缓存，
+        按块处理时样本中记录的来源文件改写为当前文件路径
+        Args:
+            path: markdown文件路径
+
+        Returns: 清洗并打包后的样本列表
+
+        """
+        return [
+            {**t, "file": path} if isinstance(t, dict) and "file" in t else t
+            for t in read_json(self.output_path(self.content_hash(path)))
+        ]
+
+    def put_output(self, path: str, text_list: List[Union[str, Dict[str, Any]]]):
+        """
+        缓存文件的清洗结果，索引在save时统一保存
+        Args:
+            path: markdown文件路径
+            text_list: 清洗并打包后的样本列表
+        """
+        atomic_save_json(self.output_path(self.content_hash(path)), text_list)
+
+    def save(self):
+        atomic_save_json(self.index_path, self.index)
+
+    def info(self):
+        logger.info(
+            f"File index: {self.hit_num} books reuse cached outputs, {self.miss_num} books are new or modified."
+        )
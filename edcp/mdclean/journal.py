@@ -0,0 +1,97 @@
+import os
+import json
+import hashlib
+from typing import List, Dict, Any, Optional
+
+from loguru import logger
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    """计算配置字典的哈希值，用于判断断点续跑时配置是否发生变化"""
+    config_str = json.dumps(config, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(config_str.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    def __init__(self, journal_path: str, cfg_hash: str):
+        """
+        运行日志，记录已完成书籍的路径、结果文件偏移量与配置哈希，用于崩溃后断点续跑
+        Args:
+            journal_path: 日志文件路径
+            cfg_hash: 当前运行配置的哈希值
+        """
+        self.journal_path = journal_path
+        self.cfg_hash = cfg_hash
+        self.entries: List[Dict[str, Any]] = []
+        self.file = None
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        读取日志中已完成的书籍记录，若配置哈希与当前配置不一致则丢弃全部记录
+
+        Returns: 已完成书籍的记录列表
+
+        """
+        self.entries = []
+        if not os.path.exists(self.journal_path):
+            return self.entries
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时最后一行可能未写完整，忽略即可
+                    logger.warning(f"Skip broken journal line in {self.journal_path}")
+                    break
+                if entry["config_hash"] != self.cfg_hash:
+                    logger.warning(
+                        "The configuration has changed since the last run, the journal is discarded and the run restarts."
+                    )
+                    self.entries = []
+                    return self.entries
+                self.entries.append(entry)
+        logger.info(f"{len(self.entries)} finished books are recorded in the journal.")
+        return self.entries
+
+    @property
+    def finished(self) -> List[str]:
+        return [e["single_md_path"] for e in self.entries]
+
+    @property
+    def last_entry(self) -> Optional[Dict[str, Any]]:
+        return self.entries[-1] if self.entries else None
+
+    def open(self, mode: str = "a"):
+        self.file = open(self.journal_path, mode, encoding="utf-8")
+
+    def record(
+        self,
+        single_md_path: str,
+        offset: int,
+        sample_num: int,
+        middle_offset: Optional[int] = None,
+    ):
+        """
+        记录一本已完成的书籍，写入后立即落盘
+        Args:
+            single_md_path: markdown文件路径
+            offset: 该书写入后结果文件的字节偏移量
+            sample_num: 该书写入后结果文件中的样本总数
+            middle_offset: 该书写入后中间结果文件的字节偏移量
+        """
+        entry = {
+            "single_md_path": single_md_path,
+            "offset": offset,
+            "sample_num": sample_num,
+            "middle_offset": middle_offset,
+            "config_hash": self.cfg_hash,
+        }
+        self.entries.append(entry)
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self.file.close()
+        self.file = None
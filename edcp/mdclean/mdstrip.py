@@ -0,0 +1,210 @@
+import re
+from typing import Iterable, Iterator, Optional
+
+from .blocks import Block
+
+# 块级语法
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_FORMULA = re.compile(r"^ {0,3}\$\$")
+_HEADING = re.compile(r"^ {0,3}#{1,6}[ \t]*(.*?)[ \t]*#*[ \t]*$")
+_SETEXT = re.compile(r"^ {0,3}(?:=+|-+)[ \t]*$")
+_HR = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+_QUOTE = re.compile(r"^ {0,3}>[ \t]?")
+_LIST = re.compile(r"^ {0,3}(?:[-*+]|\d+\.)[ \t]+")
+_HTML = re.compile(r"^ {0,3}<[A-Za-z!/]")
+# 行内语法
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_CODE = re.compile(r"(`+)(.+?)\1")
+_STRONG = re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1")
+_EM_STAR = re.compile(r"\*(?=\S)(.+?)(?<=\S)\*")
+_EM_UNDER = re.compile(r"(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)")
+_ESCAPE = re.compile(r"\\([\\`*_{}\[\]()#+\-.!>])")
+_STASH = re.compile(r"\x02(\d+)\x03")
+
+
+class MdStripper:
+    def __init__(self, keep_formula: bool = True, keep_html: bool = True):
+        """
+        逐行剥离markdown语法的转换器，保留MinerU输出中标题、$$公式块、表格与图片所在的块边界
+        所有正则均在模块导入时编译，实例不保存任何处理状态，可在多线程中共享
+        Args:
+            keep_formula: 是否保留$$公式块中的内容（公式内容不做行内语法剥离）
+            keep_html: 是否保留html块（MinerU以html形式输出表格）
+        """
+        self.keep_formula = keep_formula
+        self.keep_html = keep_html
+
+    @staticmethod
+    def strip_inline(line: str) -> str:
+        """剥离单行文本中的行内markdown语法"""
+        escaped = "\\" in line
+        if escaped:
+            # 先暂存转义字符，避免被当作强调等语法处理
+            line = _ESCAPE.sub(lambda m: f"\x02{ord(m.group(1))}\x03", line)
+        if "!" in line:
+            line = _IMAGE.sub("", line)
+        if "[" in line:
+            line = _LINK.sub(r"\1", line)
+        if "`" in line:
+            line = _CODE.sub(r"\2", line)
+        if "*" in line or "_" in line:
+            line = _STRONG.sub(r"\2", line)
+            line = _EM_STAR.sub(r"\1", line)
+            line = _EM_UNDER.sub(r"\1", line)
+        if escaped:
+            line = _STASH.sub(lambda m: chr(int(m.group(1))), line)
+        return line
+
+    def strip_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        逐行剥离markdown语法，可直接传入文件对象实现流式处理
+        Args:
+            lines: markdown文本行
+
+        Returns: 剥离语法后的文本行迭代器
+
+        """
+        in_formula = False
+        in_fence = False
+        prev_blank = True
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if not line.strip():
+                prev_blank = True
+                yield ""
+                continue
+            if in_fence:
+                if _FENCE.match(line):
+                    in_fence = False
+                    continue
+                yield line
+                continue
+            if in_formula or _FORMULA.match(line):
+                # $$单独成行时作为公式块的起止标记
+                if _FORMULA.match(line) and line.strip() == "$$":
+                    in_formula = not in_formula
+                if self.keep_formula:
+                    yield line.strip()
+                prev_blank = False
+                continue
+            if _FENCE.match(line):
+                in_fence = True
+                continue
+            if _HTML.match(line):
+                if self.keep_html:
+                    yield line.strip()
+                prev_blank = False
+                continue
+            if _HR.match(line) or (not prev_blank and _SETEXT.match(line)):
+                prev_blank = False
+                continue
+            m = _HEADING.match(line)
+            if m:
+                line = m.group(1)
+            else:
+                line = _QUOTE.sub("", line)
+                line = _LIST.sub("", line)
+            prev_blank = False
+            yield self.strip_inline(line).strip()
+
+    def strip_blocks(self, lines: Iterable[str]) -> Iterator[Block]:
+        """
+        按块剥离markdown语法，保留块类型与源文件中的起止行号，
+        $$公式块、连续的html行与代码块分别合并为一个块，其余块与源文件中的非空行一一对应
+        Args:
+            lines: markdown文本行
+
+        Returns: 剥离语法后的块迭代器
+
+        """
+        in_formula = False
+        in_fence = False
+        prev_blank = True
+        # 尚未结束的多行块
+        pending: Optional[Block] = None
+        for no, line in enumerate(lines, start=1):
+            line = line.rstrip("\r\n")
+            if in_fence:
+                if _FENCE.match(line):
+                    in_fence = False
+                    yield pending
+                    pending = None
+                    continue
+                pending.text = pending.text + "\n" + line if pending.text else line
+                pending.end = no
+                continue
+            if in_formula:
+                if line.strip():
+                    pending.text += "\n" + line.strip()
+                    pending.end = no
+                if line.strip() == "$$":
+                    in_formula = False
+                    if self.keep_formula:
+                        yield pending
+                    pending = None
+                continue
+            if not line.strip():
+                prev_blank = True
+                if pending is not None:
+                    yield pending
+                    pending = None
+                continue
+            if _HTML.match(line):
+                if pending is not None and pending.type == "table":
+                    pending.text += "\n" + line.strip()
+                    pending.end = no
+                elif self.keep_html:
+                    if pending is not None:
+                        yield pending
+                    pending = Block("table", line.strip(), no, no)
+                prev_blank = False
+                continue
+            if pending is not None:
+                yield pending
+                pending = None
+            if _FORMULA.match(line):
+                block = Block("formula", line.strip(), no, no)
+                # $$单独成行时作为公式块的起始标记
+                if line.strip() == "$$":
+                    in_formula = True
+                    pending = block
+                elif self.keep_formula:
+                    yield block
+                prev_blank = False
+                continue
+            if _FENCE.match(line):
+                in_fence = True
+                pending = Block("code", "", no, no)
+                continue
+            if _HR.match(line) or (not prev_blank and _SETEXT.match(line)):
+                prev_blank = False
+                continue
+            prev_blank = False
+            m = _HEADING.match(line)
+            if m:
+                block_type, text = "heading", m.group(1)
+            else:
+                text = _QUOTE.sub("", line)
+                block_type = "quote" if text != line else "text"
+                unlisted = _LIST.sub("", text)
+                if unlisted != text and block_type == "text":
+                    block_type = "list"
+                text = unlisted
+            text = self.strip_inline(text).strip()
+            if not text and _IMAGE.search(line):
+                # 仅包含图片的行保留图片引用，便于追溯
+                block_type, text = "image", line.strip()
+            yield Block(block_type, text, no, no)
+        # 文件末尾未闭合的公式块同样遵循keep_formula
+        if pending is not None and (pending.type != "formula" or self.keep_formula):
+            yield pending
+
+    def strip(self, text: str) -> str:
+        """剥离整段markdown文本中的语法"""
+        return "\n".join(self.strip_lines(text.split("\n")))
+
+    def strip_file(self, md_path: str) -> str:
+        """逐行读取markdown文件并剥离语法"""
+        with open(md_path, "r", encoding="utf-8") as f:
+            return "\n".join(self.strip_lines(f))
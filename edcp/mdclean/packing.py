@@ -1,33 +1,212 @@
-from typing import List
+from typing import List, Literal, Optional
+
+from loguru import logger
 from transformers import AutoTokenizer
 
 
 class PackText:
-    def __init__(self, model_path: str, max_tokens: int = 1024):
+    def __init__(
+        self,
+        model_path: str,
+        max_tokens: int = 1024,
+        exact: bool = False,
+        batch_size: int = 1024,
+        strategy: Literal["greedy", "window_bfd"] = "greedy",
+        window_size: int = 64,
+        min_fill: float = 0.9,
+    ):
+        """
+        按token数量打包文本
+        Args:
+            model_path: 用于统计token数量的LLM路径
+            max_tokens: 单个样本token数量的大致范围
+            exact: 是否在达到max_tokens时对拼接后的文本重新统计token数量，用于校正逐行统计在拼接处的误差，仅greedy策略有效
+            batch_size: 批量统计每行token数量时的批大小
+            strategy: 打包策略，greedy为按顺序贪心打包（默认），window_bfd为在滑动窗口内进行最佳适应递减装箱，
+                填充率更高，但同一样本中的行可能不相邻，不相邻的行之间以换行符连接
+            window_size: window_bfd策略中滑动窗口包含的行数
+            min_fill: window_bfd策略中，填充率低于该值的样本会并入下一个窗口继续装箱
+        """
+        if strategy != "greedy" and strategy != "window_bfd":
+            raise ValueError("strategy must be 'greedy' or 'window_bfd'")
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
         self.max_tokens = max_tokens
+        self.exact = exact
+        self.batch_size = batch_size
+        self.strategy = strategy
+        self.window_size = window_size
+        self.min_fill = min_fill
+        # 整个运行的打包统计
+        self.total_tokens = 0
+        self.total_chunks = 0
+        self.total_under = 0
 
     def tokens_cont(self, text: str) -> int:
         return len(self.tokenizer(text)["input_ids"])
 
-    def to_max_tokens(self, content: List[str]) -> List[str]:
-        max_token_list = []
-        temp_str = ""
-        i = 0
-        while i < len(content):
-            temp_str = temp_str + content[i]
-            if (
-                len(temp_str) >= self.max_tokens
-                and self.tokens_cont(temp_str) >= self.max_tokens
-            ):
-                max_token_list.append(temp_str)
-                temp_str = ""
-                i = i + 1
+    def lines_tokens(self, content: List[str]) -> List[int]:
+        """使用快速分词器批量统计每行的token数量，每行只分词一次"""
+        lengths: List[int] = []
+        for i in range(0, len(content), self.batch_size):
+            encoding = self.tokenizer(
+                content[i : i + self.batch_size], add_special_tokens=False
+            )
+            lengths.extend(len(ids) for ids in encoding["input_ids"])
+        return lengths
+
+    def pack_indices(self, content: List[str], lengths: List[int]) -> List[List[int]]:
+        """
+        按顺序累加每行的token数量，累计数量达到max_tokens时（包含当前行）结束当前样本
+        Args:
+            content: 字符串列表
+            lengths: 每行的token数量
+
+        Returns: 每个样本包含的行下标
+
+        """
+        chunks: List[List[int]] = []
+        chunk: List[int] = []
+        total = 0
+        # 逐行统计相对拼接后重新统计多出的token数量
+        overcount = 0
+        for i, length in enumerate(lengths):
+            chunk.append(i)
+            total += length
+            if total - overcount < self.max_tokens:
+                continue
+            if self.exact:
+                exact_total = self.tokens_cont("".join(content[j] for j in chunk))
+                if exact_total < self.max_tokens:
+                    overcount = total - exact_total
+                    continue
+            chunks.append(chunk)
+            chunk = []
+            total = 0
+            overcount = 0
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def best_fit_decreasing(
+        self, items: List[int], lengths: List[int]
+    ) -> List[List[int]]:
+        """
+        最佳适应递减装箱，每个箱子的容量为max_tokens，超过容量的行单独成箱
+        Args:
+            items: 参与装箱的行下标
+            lengths: 每行的token数量
+
+        Returns: 每个箱子包含的行下标
+
+        """
+        bins: List[List[int]] = []
+        remains: List[int] = []
+        for i in sorted(items, key=lambda x: lengths[x], reverse=True):
+            best = -1
+            for b, remain in enumerate(remains):
+                if lengths[i] <= remain and (best < 0 or remain < remains[best]):
+                    best = b
+            if best < 0:
+                bins.append([i])
+                remains.append(self.max_tokens - lengths[i])
             else:
-                i = i + 1
-            if i == len(content) and temp_str != "":
-                max_token_list.append(temp_str)
-        return max_token_list
+                bins[best].append(i)
+                remains[best] -= lengths[i]
+        return bins
+
+    def pack_window_bfd(self, lengths: List[int]) -> List[List[int]]:
+        """
+        在滑动窗口内进行最佳适应递减装箱，样本内部保持原有行序，样本按首行顺序输出
+        填充率低于min_fill的样本并入下一个窗口，每行最多顺延一个窗口，
+        已顺延过的样本直接输出，因此每个样本包含的行不超过相邻两个窗口的范围
+        Args:
+            lengths: 每行的token数量
+
+        Returns: 每个样本包含的行下标
+
+        """
+        chunks: List[List[int]] = []
+        carry: List[int] = []
+        for start in range(0, len(lengths), self.window_size):
+            end = min(start + self.window_size, len(lengths))
+            bins = self.best_fit_decreasing(carry + list(range(start, end)), lengths)
+            bins = sorted((sorted(b) for b in bins), key=lambda b: b[0])
+            carry = []
+            for b in bins:
+                fill = sum(lengths[i] for i in b) / self.max_tokens
+                # 仅顺延全部来自当前窗口的样本
+                if end < len(lengths) and fill < self.min_fill and b[0] >= start:
+                    carry.extend(b)
+                else:
+                    chunks.append(b)
+        # 顺延的样本晚于同窗口的其他样本输出，按首行重新排序
+        chunks.sort(key=lambda b: b[0])
+        return chunks
+
+    def pack_info(self, chunk_tokens: List[int], book_name: Optional[str] = None):
+        """
+        统计打包效率（实际token数量与预算token数量之比），并累计到整个运行的统计中
+        Args:
+            chunk_tokens: 每个样本的token数量
+            book_name: 当前处理的书名
+        """
+        tokens = sum(chunk_tokens)
+        under = sum(t < self.max_tokens * 0.5 for t in chunk_tokens)
+        self.total_tokens += tokens
+        self.total_chunks += len(chunk_tokens)
+        self.total_under += under
+        if book_name is not None:
+            logger.info(f"File name: {book_name}")
+        budget = len(chunk_tokens) * self.max_tokens
+        logger.info(
+            f"Packing {self.strategy}: {len(chunk_tokens)} samples, {tokens} tokens used of {budget} budget "
+            f"({tokens / budget * 100 if budget else 0.0:.2f}%), {under} samples below half of the budget"
+        )
+
+    def total_info(self):
+        """打印整个运行的打包效率"""
+        budget = self.total_chunks * self.max_tokens
+        logger.info(
+            f"Packing {self.strategy} in total: {self.total_chunks} samples, {self.total_tokens} tokens used of {budget} budget "
+            f"({self.total_tokens / budget * 100 if budget else 0.0:.2f}%), {self.total_under} samples below half of the budget"
+        )
+
+    def pack(
+        self, content: List[str], book_name: Optional[str] = None
+    ) -> List[List[int]]:
+        """按打包策略将文本行分组，返回每个样本包含的行下标"""
+        lengths = self.lines_tokens(content)
+        if self.strategy == "window_bfd":
+            chunks = self.pack_window_bfd(lengths)
+        else:
+            chunks = self.pack_indices(content, lengths)
+        self.pack_info([sum(lengths[i] for i in chunk) for chunk in chunks], book_name)
+        return chunks
+
+    @staticmethod
+    def join_chunk(content: List[str], chunk: List[int]) -> str:
+        """
+        拼接样本包含的行，相邻的行直接拼接，不相邻的行（仅window_bfd策略会出现）之间插入换行符，
+        避免原文中不相邻的两行首尾相连
+        Args:
+            content: 字符串列表
+            chunk: 样本包含的行下标，按行序排列
+
+        Returns: 拼接后的文本
+
+        """
+        parts: List[str] = []
+        for k, i in enumerate(chunk):
+            if k and i != chunk[k - 1] + 1:
+                parts.append("\n")
+            parts.append(content[i])
+        return "".join(parts)
+
+    def to_max_tokens(
+        self, content: List[str], book_name: Optional[str] = None
+    ) -> List[str]:
+        chunks = self.pack(content, book_name)
+        return [self.join_chunk(content, chunk) for chunk in chunks]
 
-    def forward(self, text_list: List[str]):
-        return self.to_max_tokens(text_list)
+    def forward(self, text_list: List[str], book_name: Optional[str] = None):
+        return self.to_max_tokens(text_list, book_name)
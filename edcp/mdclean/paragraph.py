@@ -0,0 +1,119 @@
+import re
+from typing import List
+
+from loguru import logger
+from .blocks import Block
+
+# 句末标点，以这些字符结尾的文本行视为完整的段落
+_TERMINAL = set("。！？；：…!?;:”」』")
+# 可以出现在被打断段落末尾的标点
+_TAIL_PUNCT = set("，、,（(“《")
+# 可以出现在续接文本开头的标点
+_HEAD_PUNCT = set("，、。；：,.;:）)”》")
+# 章节标题、列表编号、图表标题与【开头的条目，不与上一行合并
+_BLOCK_START = re.compile(
+    r"^(?:第[一二三四五六七八九十百零\d]+[章节篇部]|[一二三四五六七八九十]+[、.．]|"
+    r"\d+(?:\.\d+)*[、.．]?\s|[（(]\d+[)）]|[图表]\s*\d|【)"
+)
+
+
+def is_cjk(c: str) -> bool:
+    return "\u4e00" <= c <= "\u9fff"
+
+
+class ParagraphMerger:
+    def __init__(self, min_len: int = 20, max_len: int = 512):
+        """
+        段落重组，MinerU会将跨页或跨栏的段落拆分为多行，拆分后的片段缺少完整的句子，容易被误判为非正文，
+        根据句末标点、中文续接与长度规则将片段合并为完整段落，减少推理次数并提高过滤准确率
+        Args:
+            min_len: 字符数不低于该值且不以句末标点结尾的文本行才会与下一行合并，较短的文本行多为标题或图表标题
+            max_len: 合并后段落的最大字符数
+        """
+        self.min_len = min_len
+        self.max_len = max_len
+
+    @staticmethod
+    def is_structural(line: str) -> bool:
+        """$$公式行与html表格行不参与合并"""
+        return line.startswith("$$") or line.startswith("<")
+
+    def can_merge(self, cur: str, nxt: str) -> bool:
+        """判断下一行是否为当前段落的续接"""
+        if len(cur) < self.min_len or len(cur) + len(nxt) > self.max_len:
+            return False
+        if cur[-1] in _TERMINAL or _BLOCK_START.match(nxt):
+            return False
+        # 较短且没有句末标点的下一行多为页眉、标题等，不与正文合并
+        if len(nxt) < self.min_len and nxt[-1] not in _TERMINAL:
+            return False
+        tail_ok = is_cjk(cur[-1]) or cur[-1] in _TAIL_PUNCT or cur[-1].isalnum() or cur[-1] == "-"
+        head_ok = is_cjk(nxt[0]) or nxt[0] in _HEAD_PUNCT or nxt[0].islower() or nxt[0].isdigit()
+        return tail_ok and head_ok
+
+    @staticmethod
+    def join(cur: str, nxt: str) -> str:
+        # 英文单词之间补空格，行末连字符连接的单词直接拼接
+        if cur[-1] == "-" and cur[-2:-1].isalpha() and nxt[0].islower():
+            return cur[:-1] + nxt
+        if cur[-1].isascii() and cur[-1].isalnum() and nxt[0].isascii() and nxt[0].isalnum():
+            return cur + " " + nxt
+        return cur + nxt
+
+    def merge(self, text_list: List[str], book_name: str = "") -> List[str]:
+        """
+        合并被打断的段落
+        Args:
+            text_list: split_text得到的文本行
+            book_name: 当前处理的书名，用于日志
+
+        Returns: 合并后的文本行
+
+        """
+        merged: List[str] = []
+        in_formula = False
+        cur_mergeable = False
+        for line in text_list:
+            line = line.strip()
+            if line == "$$":
+                in_formula = not in_formula
+            if in_formula or line == "$$" or self.is_structural(line):
+                merged.append(line)
+                cur_mergeable = False
+                continue
+            if cur_mergeable and self.can_merge(merged[-1], line):
+                merged[-1] = self.join(merged[-1], line)
+                continue
+            merged.append(line)
+            cur_mergeable = True
+        logger.info(
+            f"Paragraph reassembly: {book_name}.md {len(text_list)} lines are merged into {len(merged)} lines."
+        )
+        return merged
+
+    def merge_blocks(self, blocks: List[Block], book_name: str = "") -> List[Block]:
+        """
+        合并相邻正文段落块中被打断的段落，合并后的块覆盖所有片段在源文件中的行号范围
+        Args:
+            blocks: 块列表
+            book_name: 当前处理的书名，用于日志
+
+        Returns: 合并后的块列表
+
+        """
+        merged: List[Block] = []
+        for b in blocks:
+            if (
+                b.type == "text"
+                and merged
+                and merged[-1].type == "text"
+                and self.can_merge(merged[-1].text, b.text)
+            ):
+                prev = merged[-1]
+                merged[-1] = Block("text", self.join(prev.text, b.text), prev.start, b.end)
+                continue
+            merged.append(b)
+        logger.info(
+            f"Paragraph reassembly: {book_name}.md {len(blocks)} blocks are merged into {len(merged)} blocks."
+        )
+        return merged
@@ -1,30 +1,88 @@
 import os
+import inspect
 import importlib
-from typing import List, Dict, Any, Literal
+import threading
+from dataclasses import asdict
+from collections import Counter
+from typing import List, Dict, Any, Literal, Optional, Iterator, Tuple, Union
 
 from tqdm import tqdm
+from loguru import logger
 from rbloom import Bloom
 from mpire import WorkerPool
 from markdown import Markdown
 from . import utils
-from .LLMFilter import ChatModel
+from .LLMFilter import ChatModel, load_calibration
 from .CLSFilter import QwenCLS
-from .charreplace import BookClean
+from .ruleengine import RuleEngine
+from .mdstrip import MdStripper
 from .packing import PackText
 from ..tool import save_json
+from ..hparams.mdpipe_args import MdPipeArgs
+from .journal import RunJournal, config_hash
+from .fileindex import FileIndex
+from .scheduler import BatchScheduler
+from .clscache import ClsCache, line_key
+from .prefilter import PreFilter
+from .FTFilter import FastTextCLS
+from .stages import Stage
+from .dedup import DedupStore
+from .boilerplate import Boilerplate
+from .paragraph import ParagraphMerger
+from .blocks import Block, BlockPolicy, Sample, item_text, sample_record
+from .profiler import StageProfiler
+from .template import LLMFilterPrompt
+from ..stream import JsonlWriter, iter_jsonl
+
+
+class _PlainMarkdown(Markdown):
+    """渲染为纯文本的Markdown，剔除与markdown相关的语法，不修改Markdown类的输出格式"""
+
+    output_formats = dict(Markdown.output_formats, plain=utils.unmark_element)
+
+
+# 每个线程独立持有一个Markdown实例，避免并发调用时共享状态
+_md_local = threading.local()
 
 
 class BaseProcess:
+    # 删除与替换规则，每个实例独立持有，命中次数互不影响
+    rule_engine: RuleEngine
+    # 剔除markdown语法的方法，markdown为Markdown库渲染后展平，fast为逐行剥离
+    unmark_method: Literal["fast", "markdown"] = "markdown"
+    stripper: MdStripper = MdStripper()
+    # 段落重组，为None时不合并被打断的段落
+    paragraph: Optional[ParagraphMerger] = None
+    # 是否按块处理，按块处理时保留块类型与源文件中的行号
+    block_mode: bool = False
+    # 各阶段耗时与吞吐量统计，默认不开启
+    profiler: StageProfiler = StageProfiler()
+
+    def __init__(self, rule_engine: Optional[RuleEngine] = None):
+        """
+        Args:
+            rule_engine: 删除与替换规则引擎，若为None则使用BookClean中的默认规则
+        """
+        self.rule_engine = (
+            rule_engine if rule_engine is not None else RuleEngine.from_files()
+        )
+
     @staticmethod
-    def unmark(text: str) -> str:
-        # 更改markdown文件的渲染方式，剔除与markdown相关的语法
-        Markdown.output_formats["plain"] = utils.unmark_element
-        __md = Markdown(output_format="plain")
-        __md.stripTopLevelTags = False
-        return __md.convert(text)
+    def unmark_markdown(text: str) -> str:
+        """使用Markdown库将文本渲染为ElementTree后展平，剔除markdown语法"""
+        md = getattr(_md_local, "md", None)
+        if md is None:
+            md = _PlainMarkdown(output_format="plain")
+            md.stripTopLevelTags = False
+            _md_local.md = md
+        return md.reset().convert(text)
 
-    @classmethod
-    def read_md(cls, md_path: str):
+    def unmark(self, text: str) -> str:
+        if self.unmark_method == "markdown":
+            return self.unmark_markdown(text)
+        return self.stripper.strip(text)
+
+    def read_md(self, md_path: str):
         """
         读取md文件，并过滤文本中存在的markdown语法
 
@@ -34,12 +92,17 @@ class BaseProcess:
         Returns:
             过滤markdown后的字符串
         """
-        with open(md_path, "r", encoding="utf-8") as f:
-            md_text = f.read()
-        return cls.unmark(md_text)
+        book_name = self.get_book_name(md_path)
+        with self.profiler.timer("read_md", book_name):
+            with open(md_path, "r", encoding="utf-8") as f:
+                md_text = f.read()
+        self.profiler.add("read_md", book_name, chars=len(md_text))
+        with self.profiler.timer("unmark", book_name):
+            text = self.unmark(md_text)
+        self.profiler.add("unmark", book_name, chars=len(text))
+        return text
 
-    @staticmethod
-    def replace_op(text_list: List[str]) -> List[str]:
+    def replace_op(self, text_list: List[str]) -> List[str]:
         """
         对列表中的字符串逐一进行替换操作
         Args:
@@ -47,16 +110,55 @@ class BaseProcess:
 
         Returns:处理好后的字符串列表
         """
-        rep_text: List[str] = []
-        for t in text_list:
-            c_t = utils.remove_and_replace(
-                t, BookClean.REMOVE_WORDS, BookClean.REPLACEMENTS
-            )
-            rep_text.append(c_t)
-        return rep_text
+        return [self.rule_engine.apply(t) for t in text_list]
+
+    def prepare_file(self, single_md_path: str) -> List[str]:
+        """读取文件、剔除markdown语法、分割文件、段落重组并进行替换操作"""
+        book_name = self.get_book_name(single_md_path)
+        # 读取文件
+        text = self.read_md(single_md_path)
+        # 分割文件
+        with self.profiler.timer("split_text", book_name):
+            text = utils.split_text(text)
+        self.profiler.add_lines("split_text", book_name, text)
+        # 合并跨页或跨栏被打断的段落
+        if self.paragraph is not None:
+            text = self.paragraph.merge(text, book_name)
+        # 替换操作
+        with self.profiler.timer("replace_op", book_name):
+            text = self.replace_op(text)
+        self.profiler.add_lines("replace_op", book_name, text)
+        return text
+
+    def prepare_blocks(self, single_md_path: str) -> List[Block]:
+        """按块读取文件并剥离markdown语法，段落重组后对每个块进行替换操作，剔除替换后为空的块"""
+        book_name = self.get_book_name(single_md_path)
+        with self.profiler.timer("read_md", book_name):
+            with open(single_md_path, "r", encoding="utf-8") as f:
+                md_lines = f.readlines()
+        self.profiler.add_lines("read_md", book_name, md_lines)
+        with self.profiler.timer("unmark", book_name):
+            blocks = list(self.stripper.strip_blocks(md_lines))
+        self.profiler.add("unmark", book_name, blocks=len(blocks))
+        if self.paragraph is not None:
+            blocks = self.paragraph.merge_blocks(blocks, book_name)
+        with self.profiler.timer("replace_op", book_name):
+            for b in blocks:
+                b.text = self.rule_engine.apply(b.text)
+            blocks = [b for b in blocks if b.text.strip()]
+        self.profiler.add_lines("replace_op", book_name, [b.text for b in blocks])
+        return blocks
+
+    def prepare_book(self, single_md_path: str) -> Union[List[str], List[Block]]:
+        """按当前处理方式预处理单本书，按块处理时返回块列表，否则返回文本行列表"""
+        if self.block_mode:
+            return self.prepare_blocks(single_md_path)
+        return self.prepare_file(single_md_path)
 
     @staticmethod
-    def trans_dict(key_name: str, text_list: List[str]) -> List[Dict[str, Any]]:
+    def trans_dict(key_name: str, text_list: List[Sample]) -> List[Dict[str, Any]]:
+        if key_name == "text":
+            return [sample_record(t, idx) for idx, t in enumerate(text_list)]
         return [
             {key_name: t, "id_int": idx}
             for t, idx in zip(text_list, range(len(text_list)))
@@ -75,6 +177,20 @@ class BaseProcess:
         utils.filter_info("Bloom Filter", len(text_list), len(unique_text))
         return unique_text
 
+    @staticmethod
+    def get_book_name(md_path: str) -> str:
+        return os.path.splitext(os.path.basename(md_path))[0]
+
+
+def _parse_book(
+    parser: BaseProcess, md_path: str
+) -> Tuple[Union[List[str], List[Block]], Counter, Dict[str, Any]]:
+    """在进程池中读取并预处理单本书，同时返回该书的规则命中次数与各阶段统计，用于在主进程中汇总"""
+    parser.rule_engine.hits.clear()
+    parser.profiler.reset()
+    lines = parser.prepare_book(md_path)
+    return lines, Counter(parser.rule_engine.hits), parser.profiler.snapshot()
+
 
 class MdProcess(BaseProcess):
     def __init__(
@@ -83,21 +199,158 @@ class MdProcess(BaseProcess):
         llm_model_path: str,
         token_cont_model: str,
         near_tokens: int,
-        process_method: Literal["chat", "cls"],
+        process_method: Literal["chat", "cls", "onnx"],
+        *,
+        rule_files: Optional[List[str]] = None,
+        unmark_method: Literal["fast", "markdown"] = "markdown",
+        pack_exact: bool = False,
+        pack_strategy: Literal["greedy", "window_bfd"] = "greedy",
+        pack_window: int = 64,
+        max_batch_tokens: Optional[int] = None,
+        group_books: int = 16,
+        chat_mode: Literal["generate", "score"] = "generate",
+        score_threshold: float = 0.5,
+        calibration_path: Optional[str] = None,
+        prefix_cache: bool = True,
+        cls_cache_path: Optional[str] = None,
+        prefilter: bool = False,
+        prefilter_rules: Optional[str] = None,
+        ft_model_path: Optional[str] = None,
+        ft_keep_threshold: float = 0.95,
+        ft_drop_threshold: float = 0.95,
+        onnx_dir: Optional[str] = None,
+        onnx_quantize: bool = True,
+        onnx_intra_threads: Optional[int] = None,
+        onnx_inter_threads: int = 1,
+        dedup_path: Optional[str] = None,
+        dedup_lines: bool = False,
+        dedup_bits: int = 64,
+        boilerplate: bool = False,
+        boilerplate_min_count: int = 5,
+        boilerplate_max_len: int = 64,
+        merge_paragraphs: bool = False,
+        paragraph_min_len: int = 20,
+        paragraph_max_len: int = 512,
+        block_mode: bool = False,
+        block_policy: Optional[str] = None,
+        profile_path: Optional[str] = None,
+        prom_path: Optional[str] = None,
     ):
         """
-        MdProcess初始化方法
+        MdProcess初始化方法，process_method之后的参数仅支持以关键字传入，也可使用from_args由MdPipeArgs构建
         Args:
             md_path: 包含需要处理markdown文件的主目录
             llm_model_path: 用于过滤非正文样本的LLM路径
             token_cont_model: 用于统计token数量的LLM路径
             near_tokens: token数量的大致范围
-            process_method: 用于过滤非正文样本的方法，chat为通用因果模型，cls为专用分类模型
+            process_method: 用于过滤非正文样本的方法，chat为通用因果模型，cls为专用分类模型，onnx为ONNX Runtime推理的专用分类模型（仅CPU）
+            rule_files: 额外的删除与替换规则文件路径列表，与BookClean中的默认规则合并
+            unmark_method: 剔除markdown语法的方法，markdown为Markdown库渲染后展平，fast为逐行剥离，
+                fast会去掉列表续行与缩进续行的行首空白，并剥离html块内部的行内markdown语法，输出与markdown略有不同
+            pack_exact: 打包时是否对拼接后的文本重新统计token数量，以校正逐行统计的误差
+            pack_strategy: 打包策略，greedy为按顺序贪心打包（默认），window_bfd为在滑动窗口内进行最佳适应递减装箱，使样本尽量接近near_tokens，
+                但同一样本中的行可能不相邻，不相邻的行之间以换行符连接
+            pack_window: window_bfd策略中滑动窗口包含的行数
+            max_batch_tokens: 若不为None，则按token长度对文本行分桶，以填充后的token数量不超过该值构造批次，batch_size作为批大小上限
+            group_books: 按token长度分桶时，每次合并调度的书籍数量
+            chat_mode: process_method为chat时的推理方式，generate为生成回答，score为单次前向计算比较"True"与"False"的概率
+            score_threshold: score模式下正文概率的判断阈值
+            calibration_path: score模式下Platt缩放参数的json文件路径（由save_calibration保存），若为None则不做校准，直接对"True"与"False"的对数概率之差取sigmoid
+            prefix_cache: score模式下是否对每本书只计算一次提示词公共前缀的KV缓存（仅Transformers框架，VLLM框架自动开启前缀缓存）
+            cls_cache_path: 文本行分类结果缓存的sqlite数据库路径，若不为None则在推理前查询缓存，仅对未命中的文本行进行推理
+            prefilter: 是否在模型推理前使用规则预分类器，直接判断图表标题、章节标题、$$公式行与中文占比极低的文本行
+            prefilter_rules: 预分类规则的json文件路径，若为None则使用PreFilter.DEFAULT_RULES
+            ft_model_path: 蒸馏得到的fastText分类模型路径，若不为None则作为第一级过滤器，仅将置信度不足的文本行交给模型推理
+            ft_keep_threshold: fastText正文概率不低于该值时直接判断为正文
+            ft_drop_threshold: fastText非正文概率不低于该值时直接判断为非正文
+            onnx_dir: process_method为onnx时ONNX模型的保存目录，若为None则为llm_model_path下的onnx文件夹，不存在ONNX模型时自动导出
+            onnx_quantize: process_method为onnx时是否使用动态int8量化后的模型
+            onnx_intra_threads: ONNX Runtime单个算子内部的并行线程数，若为None则使用全部物理核心
+            onnx_inter_threads: ONNX Runtime算子之间的并行线程数
+            dedup_path: 持久化去重集合的sqlite数据库路径，若不为None则打包后的样本在输出前与历次运行的结果去重
+            dedup_lines: 是否在模型推理前对文本行进行精确去重（需设置dedup_path），重复出现的文本行不再推理也不进入结果
+            dedup_bits: 去重键的哈希位数，64或128
+            boilerplate: 是否在模型推理前剔除每本书中反复出现的页眉、页脚、书名与页码行
+            boilerplate_min_count: 同一本书中（数字统一替换后）出现次数不低于该值的文本行视为样板文本
+            boilerplate_max_len: 仅检测字符数不超过该值的文本行
+            merge_paragraphs: 是否在分割文本后根据句末标点、中文续接与长度规则合并跨页或跨栏被打断的段落
+            paragraph_min_len: 字符数不低于该值且不以句末标点结尾的文本行才会与下一行合并
+            paragraph_max_len: 合并后段落的最大字符数
+            block_mode: 是否按块处理，保留块类型与源文件中的行号，$$公式块与html表格作为整体，按块类型决定保留、剔除或交给模型推理，输出样本记录来源文件与行号范围（仅支持unmark_method为fast）
+            block_policy: 块类型处理方式的json文件路径，如{"formula": "drop", "table": "keep"}，若为None则使用BlockPolicy.DEFAULT
+            profile_path: 各阶段耗时与吞吐量统计报告的json文件路径，包含汇总与每本书的统计，若为None则不保存
+            prom_path: Prometheus textfile格式的统计文件路径（后缀为.prom），若为None则不保存，两者均为None时不开启统计
         """
         # 查找markdown文件
         self.md_path_list = utils.search_file_suffix(md_path, "md")
-        if process_method != "chat" and process_method != "cls":
-            raise ValueError("process_method must be 'chat' or 'cls'")
+        # 加载删除与替换规则，与BookClean中的默认规则合并
+        super().__init__(RuleEngine.from_files(rule_files))
+        if unmark_method != "fast" and unmark_method != "markdown":
+            raise ValueError("unmark_method must be 'fast' or 'markdown'")
+        self.unmark_method = unmark_method
+        if merge_paragraphs:
+            self.paragraph = ParagraphMerger(paragraph_min_len, paragraph_max_len)
+        if block_mode and unmark_method != "fast":
+            raise ValueError("block_mode requires unmark_method 'fast'")
+        self.block_mode = block_mode
+        # 各阶段耗时与吞吐量统计
+        self.profile_path = profile_path
+        self.prom_path = prom_path
+        self.profiler = StageProfiler(profile_path is not None or prom_path is not None)
+        # 影响处理结果的配置，用于断点续跑时校验
+        self.config: Dict[str, Any] = {
+            "llm_model_path": llm_model_path,
+            "token_cont_model": token_cont_model,
+            "near_tokens": near_tokens,
+            "process_method": process_method,
+            "rules": self.rule_engine.rules(),
+            "unmark_method": unmark_method,
+            "pack_exact": pack_exact,
+            "pack_strategy": pack_strategy,
+            "pack_window": pack_window,
+            "chat_mode": chat_mode,
+            "score_threshold": score_threshold,
+        }
+        # Platt缩放参数，仅在score模式下生效
+        calibration = load_calibration(calibration_path)
+        if process_method == "chat" and chat_mode == "score":
+            self.config["calibration"] = list(calibration)
+        if merge_paragraphs:
+            self.config["paragraph"] = [paragraph_min_len, paragraph_max_len]
+        # 按块类型决定处理方式
+        self.block_policy: Optional[BlockPolicy] = None
+        if block_mode:
+            self.block_policy = BlockPolicy.from_file(block_policy)
+            self.config["block_policy"] = self.block_policy.policy
+        # 持久化去重集合
+        self.dedup: Optional[DedupStore] = None
+        self.dedup_lines = dedup_lines
+        if dedup_path is not None:
+            self.dedup = DedupStore(dedup_path, dedup_bits)
+            self.config["dedup"] = [dedup_lines, dedup_bits]
+        elif dedup_lines:
+            raise ValueError("dedup_lines requires dedup_path")
+        # 书内样板文本检测
+        self.boilerplate: Optional[Boilerplate] = None
+        if boilerplate:
+            self.boilerplate = Boilerplate(boilerplate_min_count, boilerplate_max_len)
+            self.config["boilerplate"] = [boilerplate_min_count, boilerplate_max_len]
+        # 规则预分类器
+        self.prefilter: Optional[PreFilter] = None
+        if prefilter:
+            self.prefilter = PreFilter.from_file(prefilter_rules)
+            self.config["prefilter_rules"] = self.prefilter.rules
+        # 置信度门控的fastText第一级过滤器
+        self.ft_filter: Optional[FastTextCLS] = None
+        if ft_model_path is not None:
+            self.ft_filter = FastTextCLS(ft_model_path, ft_keep_threshold, ft_drop_threshold)
+            self.config["ft_filter"] = [ft_model_path, ft_keep_threshold, ft_drop_threshold]
+        if process_method == "chat":
+            self.config["prompt"] = LLMFilterPrompt.SYSTEM + LLMFilterPrompt.PROMPT
+        if process_method == "onnx":
+            self.config["onnx_quantize"] = onnx_quantize
+        if process_method not in ("chat", "cls", "onnx"):
+            raise ValueError("process_method must be 'chat', 'cls' or 'onnx'")
         if process_method == "chat":
             # 检查VLLM环境是否可用
             try:
@@ -105,19 +358,129 @@ class MdProcess(BaseProcess):
                 from .VLLMFilter import VLLMChatModel
 
                 # 若VLLM可用，使用VLLM框架推理
-                self.cm = VLLMChatModel(llm_model_path)
+                self.cm = VLLMChatModel(
+                    llm_model_path, chat_mode, score_threshold, calibration
+                )
             except ImportError:
                 # 若VLLM不可用，使用Transformers框架进行推理
-                self.cm = ChatModel(llm_model_path)
+                self.cm = ChatModel(
+                    llm_model_path,
+                    chat_mode,
+                    score_threshold,
+                    calibration,
+                    prefix_cache=prefix_cache,
+                )
+        elif process_method == "onnx":
+            from .ONNXFilter import ONNXCLS
+
+            # 使用ONNX Runtime在CPU上推理Qwen2.5分类模型
+            self.cm = ONNXCLS(
+                llm_model_path,
+                onnx_dir,
+                onnx_quantize,
+                onnx_intra_threads,
+                onnx_inter_threads,
+            )
         else:
             # 加载Qwen2.5分类模型
             self.cm = QwenCLS(llm_model_path)
+        # 按token长度分桶的批处理调度器
+        self.scheduler: Optional[BatchScheduler] = None
+        if max_batch_tokens is not None:
+            self.scheduler = BatchScheduler(self.cm.tokenizer, max_batch_tokens)
+        self.group_books = group_books
+        # 文本行分类结果缓存，模型标识由决定推理结果的配置计算
+        self.process_method = process_method
+        self.cls_cache: Optional[ClsCache] = None
+        if cls_cache_path is not None:
+            model_config = {
+                k: self.config[k]
+                for k in (
+                    "llm_model_path",
+                    "process_method",
+                    "chat_mode",
+                    "score_threshold",
+                    "calibration",
+                    "prompt",
+                    "onnx_quantize",
+                )
+                if k in self.config
+            }
+            self.cls_cache = ClsCache(cls_cache_path, config_hash(model_config))
         # 加载PackText工具
-        self.pt = PackText(token_cont_model, near_tokens)
+        self.pt = PackText(
+            token_cont_model,
+            near_tokens,
+            pack_exact,
+            strategy=pack_strategy,
+            window_size=pack_window,
+        )
         # 暂存处理后结果
-        self.res_text: List[Dict[str, str]] = []
+        self.res_text: List[Dict[str, Any]] = []
         # 暂存中间结果
-        self.middle_res: List[Dict[str, str]] = []
+        self.middle_res: List[Dict[str, Any]] = []
+        # 流式输出所用的写入器、布隆过滤器与样本计数
+        self.writer: Optional[JsonlWriter] = None
+        self.middle_writer: Optional[JsonlWriter] = None
+        self.bf: Optional[Bloom] = None
+        self.sample_num: int = 0
+        # 断点续跑所用的运行日志
+        self.journal: Optional[RunJournal] = None
+        # 增量处理所用的文件索引
+        self.index: Optional[FileIndex] = None
+
+    @classmethod
+    def from_args(cls, args: MdPipeArgs) -> "MdProcess":
+        """
+        由MdPipeArgs构建MdProcess，仅传入初始化方法中同名的参数，batch_size、save_path等运行参数由forward使用
+        Args:
+            args: markdown清洗管道的参数
+
+        Returns: MdProcess实例
+
+        """
+        names = inspect.signature(cls.__init__).parameters
+        return cls(**{k: v for k, v in asdict(args).items() if k in names})
+
+    @staticmethod
+    def middle_record(item: Union[str, Block], res: str) -> Dict[str, Any]:
+        """中间结果记录，按块处理时同时记录块类型与源文件中的行号范围"""
+        if isinstance(item, str):
+            return {"text": item, "res": res}
+        return {
+            "text": item.text,
+            "res": res,
+            "type": item.type,
+            "lines": [item.start, item.end],
+        }
+
+    def collect_filter(
+        self,
+        book_name: str,
+        text_list: Union[List[str], List[Block]],
+        res: List[str],
+        save_middle: bool = False,
+    ) -> Union[List[str], List[Block]]:
+        """
+        根据LLM推理结果筛选正文样本
+        Args:
+            book_name: 当前处理的书名
+            text_list: 字符串列表，按块处理时为块列表
+            res: 每个字符串的推理结果
+            save_middle: 是否保存中间结果
+
+        Returns:过滤后的字符串列表
+
+        """
+        if save_middle:
+            self.middle_res.extend(
+                self.middle_record(c, r) for c, r in zip(text_list, res)
+            )
+        filter_text = utils.select_strings(text_list, res)
+        utils.filter_info(
+            "LLM Filtering Process", len(text_list), len(filter_text), book_name + ".md"
+        )
+        return filter_text
 
     def llm_filter(
         self,
@@ -137,27 +500,296 @@ class MdProcess(BaseProcess):
         Returns:过滤后的字符串列表
 
         """
-        # 仅正文样本
-        filter_text: List[str] = []
-        # 构造Batch输入
-        chunk_text_list: List[List[str]] = utils.chunk_list(text_list, batch_size)
-        for chunk_text in tqdm(chunk_text_list, desc="LLM Filtering Process"):
-            res: List[str] = self.cm.forward(book_name, chunk_text)
-            if save_middle:
-                self.middle_res = self.middle_res + [
-                    {"text": c, "res": r} for c, r in zip(chunk_text, res)
-                ]
+        res = self.classify([book_name], [text_list], batch_size)[0]
+        return self.collect_filter(book_name, text_list, res, save_middle)
+
+    def infer(
+        self,
+        book_names: List[str],
+        book_lines: List[List[str]],
+        batch_size: int,
+        with_prob: bool = False,
+    ) -> List[List[Any]]:
+        """
+        调用LLM对多本书的文本行进行推理
+        Args:
+            book_names: 书名列表
+            book_lines: 每本书的文本行
+            batch_size: 批处理大小
+            with_prob: 是否同时返回正文概率
 
-            filter_text = filter_text + utils.select_strings(chunk_text, res)
+        Returns: 每本书按原顺序排列的推理结果，with_prob为True时每个结果形如(判断结果, 正文概率)
 
-        utils.filter_info(
-            "LLM Filtering Process", len(text_list), len(filter_text), book_name + ".md"
+        """
+        if self.scheduler is not None:
+            infer_fn = self.cm.predict if with_prob else self.cm.forward_batch
+            sc = self.scheduler
+            before = (sc.batch_num, sc.real_tokens, sc.padded_tokens)
+            book_res = sc.run(infer_fn, book_names, book_lines, batch_size)
+            self.profiler.add(
+                "llm_filter",
+                batches=sc.batch_num - before[0],
+                tokens=sc.real_tokens - before[1],
+                padded_tokens=sc.padded_tokens - before[2],
+            )
+            return book_res
+        book_res: List[List[Any]] = []
+        for book_name, text_list in zip(book_names, book_lines):
+            res: List[Any] = []
+            # 构造Batch输入
+            chunk_text_list: List[List[str]] = utils.chunk_list(text_list, batch_size)
+            for chunk_text in tqdm(chunk_text_list, desc="LLM Filtering Process"):
+                self.profile_batch(book_name, chunk_text)
+                if with_prob:
+                    res.extend(self.cm.predict([book_name] * len(chunk_text), chunk_text))
+                else:
+                    res.extend(self.cm.forward(book_name, chunk_text))
+            book_res.append(res)
+        return book_res
+
+    def profile_batch(self, book_name: str, chunk_text: List[str]):
+        """统计单个批次的token数量与填充后的token数量，未开启统计时不进行分词"""
+        if not self.profiler.enabled:
+            return
+        lengths = [len(ids) for ids in self.cm.tokenizer(chunk_text)["input_ids"]]
+        self.profiler.add(
+            "llm_filter",
+            book_name,
+            batches=1,
+            tokens=sum(lengths),
+            padded_tokens=len(lengths) * max(lengths, default=0),
+        )
+
+    def classify(
+        self, book_names: List[str], book_lines: List[List[str]], batch_size: int
+    ) -> List[List[str]]:
+        """
+        对多本书的文本行进行分类，依次经过规则预分类器与fastText第一级过滤器，仅将无法判断的文本行交给模型
+        Args:
+            book_names: 书名列表
+            book_lines: 每本书的文本行
+            batch_size: 批处理大小
+
+        Returns: 每本书按原顺序排列的推理结果
+
+        """
+        gates = [g for g in (self.prefilter, self.ft_filter) if g is not None]
+        return self.gated_classify(gates, book_names, book_lines, batch_size)
+
+    def classify_books(
+        self,
+        book_names: List[str],
+        books: Union[List[List[str]], List[List[Block]]],
+        batch_size: int,
+    ) -> List[List[str]]:
+        """
+        对多本书进行分类，按块处理时先根据块类型直接保留或剔除，仅将策略为classify的块交给classify
+        Args:
+            book_names: 书名列表
+            books: 每本书的文本行，按块处理时为块列表
+            batch_size: 批处理大小
+
+        Returns: 每本书按原顺序排列的推理结果
+
+        """
+        for book_name, book in zip(book_names, books):
+            self.profiler.add_lines("llm_filter", book_name, [item_text(t) for t in book])
+        # 多本书合并调度时推理耗时仅计入汇总
+        with self.profiler.timer("llm_filter", book_names[0] if len(book_names) == 1 else None):
+            return self.classify_blocks(book_names, books, batch_size)
+
+    def classify_blocks(
+        self,
+        book_names: List[str],
+        books: Union[List[List[str]], List[List[Block]]],
+        batch_size: int,
+    ) -> List[List[str]]:
+        """按块类型处理方式与classify对多本书进行分类，不按块处理时直接调用classify"""
+        if self.block_policy is None:
+            return self.classify(book_names, books, batch_size)
+        book_labels = [self.block_policy.label(blocks) for blocks in books]
+        rest_lines = [
+            [b.text for b, label in zip(blocks, labels) if label is None]
+            for blocks, labels in zip(books, book_labels)
+        ]
+        rest_res = self.classify(book_names, rest_lines, batch_size)
+        book_res: List[List[str]] = []
+        for labels, res in zip(book_labels, rest_res):
+            res_iter = iter(res)
+            book_res.append([next(res_iter) if label is None else label for label in labels])
+        return book_res
+
+    def finish_book(
+        self,
+        single_md_path: str,
+        book_name: str,
+        book: Union[List[str], List[Block]],
+        res: List[str],
+        save_middle: bool = False,
+    ) -> List[Sample]:
+        """
+        根据推理结果筛选正文并按near_tokens打包样本
+        Args:
+            single_md_path: markdown文件路径
+            book_name: 当前处理的书名
+            book: 文本行列表，按块处理时为块列表
+            res: 每个文本行或块的推理结果
+            save_middle: 是否保存中间结果
+
+        Returns: 打包后的字符串列表，按块处理时每个样本为{"text": ..., "file": ..., "lines": [[start, end], ...]}
+
+        """
+        kept = self.collect_filter(book_name, book, res, save_middle)
+        kept_text = [item_text(t) for t in kept]
+        tokens_before = self.pt.total_tokens
+        with self.profiler.timer("pack_text", book_name):
+            chunks = self.pt.pack(kept_text, book_name)
+        self.profiler.add_lines("pack_text", book_name, kept_text)
+        self.profiler.add(
+            "pack_text",
+            book_name,
+            tokens=self.pt.total_tokens - tokens_before,
+            samples=len(chunks),
+        )
+        if not self.block_mode:
+            return ["".join(kept_text[i] for i in chunk) for chunk in chunks]
+        return [
+            {
+                "text": "".join(kept_text[i] for i in chunk),
+                "file": single_md_path,
+                "lines": [[kept[i].start, kept[i].end] for i in chunk],
+            }
+            for chunk in chunks
+        ]
+
+    def gated_classify(
+        self,
+        gates: List[Any],
+        book_names: List[str],
+        book_lines: List[List[str]],
+        batch_size: int,
+    ) -> List[List[str]]:
+        """
+        逐级分类，每一级对可以确定的文本行直接给出结果，其余文本行交给下一级，最后一级为模型推理
+        Args:
+            gates: 过滤器列表，每个过滤器需实现label、book_info与info方法
+            book_names: 书名列表
+            book_lines: 每本书的文本行
+            batch_size: 批处理大小
+
+        Returns: 每本书按原顺序排列的推理结果
+
+        """
+        if not gates:
+            return self.model_classify(book_names, book_lines, batch_size)
+        gate = gates[0]
+        book_labels = [gate.label(lines) for lines in book_lines]
+        rest_lines = [
+            [t for t, l in zip(lines, labels) if l is None]
+            for lines, labels in zip(book_lines, book_labels)
+        ]
+        rest_res = self.gated_classify(gates[1:], book_names, rest_lines, batch_size)
+        book_res: List[List[str]] = []
+        for b, labels, res in zip(book_names, book_labels, rest_res):
+            gate.book_info(b, len(labels) - len(res), len(labels))
+            res_iter = iter(res)
+            book_res.append([l if l is not None else next(res_iter) for l in labels])
+        return book_res
+
+    def model_classify(
+        self, book_names: List[str], book_lines: List[List[str]], batch_size: int
+    ) -> List[List[str]]:
+        """
+        调用模型对多本书的文本行进行分类，启用分类结果缓存时仅对未命中的文本行进行推理，并将新结果写入缓存
+        Args:
+            book_names: 书名列表
+            book_lines: 每本书的文本行
+            batch_size: 批处理大小
+
+        Returns: 每本书按原顺序排列的推理结果
+
+        """
+        if self.cls_cache is None:
+            return self.infer(book_names, book_lines, batch_size)
+        # chat方式的提示词中包含书名，书名需要作为缓存键的一部分
+        book_keys = [
+            [line_key(t, b if self.process_method == "chat" else "") for t in lines]
+            for b, lines in zip(book_names, book_lines)
+        ]
+        found = self.cls_cache.get_many([k for keys in book_keys for k in keys])
+        # 未命中的文本行，相同的键只推理一次
+        miss_keys: List[List[bytes]] = []
+        miss_lines: List[List[str]] = []
+        seen = set(found)
+        for keys, lines in zip(book_keys, book_lines):
+            mk: List[bytes] = []
+            ml: List[str] = []
+            for k, t in zip(keys, lines):
+                if k not in seen:
+                    seen.add(k)
+                    mk.append(k)
+                    ml.append(t)
+            miss_keys.append(mk)
+            miss_lines.append(ml)
+        miss_res = self.infer(book_names, miss_lines, batch_size, with_prob=True)
+        new_items = [
+            (k, r, p)
+            for keys, res in zip(miss_keys, miss_res)
+            for k, (r, p) in zip(keys, res)
+        ]
+        # 仅缓存合法的判断结果
+        self.cls_cache.put_many([i for i in new_items if i[1] in ("True", "False")])
+        for b, keys in zip(book_names, book_keys):
+            self.cls_cache.book_info(b, sum(k in found for k in keys), len(keys))
+        found.update({k: (r, p) for k, r, p in new_items})
+        return [[found[k][0] for k in keys] for keys in book_keys]
+
+    def dedup_book_lines(
+        self, single_md_path: str, text_list: Union[List[str], List[Block]]
+    ) -> Union[List[str], List[Block]]:
+        """推理前对单本书的文本行（或块）进行去重"""
+        if self.dedup is None or not self.dedup_lines:
+            return text_list
+        return self.dedup.filter(
+            "line", text_list, single_md_path, self.get_book_name(single_md_path)
+        )
+
+    def clean_book_lines(
+        self, single_md_path: str, text_list: Union[List[str], List[Block]]
+    ) -> Union[List[str], List[Block]]:
+        """推理前剔除单本书中的样板文本行，并对文本行（或块）进行去重"""
+        if self.boilerplate is not None:
+            text_list = self.boilerplate.filter(
+                self.get_book_name(single_md_path), text_list
+            )
+        return self.dedup_book_lines(single_md_path, text_list)
+
+    def dedup_book_chunks(
+        self, single_md_path: str, text_list: List[Sample]
+    ) -> List[Sample]:
+        """输出前对单本书打包后的样本进行去重"""
+        if self.dedup is None:
+            return text_list
+        return self.dedup.filter(
+            "chunk", text_list, single_md_path, self.get_book_name(single_md_path)
         )
-        return filter_text
+
+    def parser(self) -> BaseProcess:
+        """仅包含markdown剥离与替换规则的轻量处理器，传入进程池时无需复制模型"""
+        # 解析器使用独立的规则引擎，命中次数按书籍返回后汇总到self.rule_engine
+        parser = BaseProcess(
+            RuleEngine(self.rule_engine.remove_words, self.rule_engine.replacements)
+        )
+        parser.unmark_method = self.unmark_method
+        parser.paragraph = self.paragraph
+        parser.block_mode = self.block_mode
+        # 进程池中的统计按书籍返回主进程汇总
+        parser.profiler = StageProfiler(self.profiler.enabled)
+        return parser
 
     def single_file(
         self, single_md_path, batch_size: int = 4, save_middle: bool = False
-    ) -> List[str]:
+    ) -> List[Sample]:
         """
         单文件处理流程
         Args:
@@ -167,67 +799,382 @@ class MdProcess(BaseProcess):
         Returns: LLM过滤后的字符串列表
 
         """
-        book_name = os.path.splitext(os.path.basename(single_md_path))[0]
-        # 读取文件
-        text = self.read_md(single_md_path)
-        # 分割文件
-        text = utils.split_text(text)
-        # 替换操作
-        text = self.replace_op(text)
+        book_name = self.get_book_name(single_md_path)
+        book = self.prepare_book(single_md_path)
+        book = self.clean_book_lines(single_md_path, book)
         # LLM过滤
-        text = self.llm_filter(book_name, text, batch_size, save_middle)
-        # 按near_tokens打包样本
-        text = self.pt.forward(text)
-        return text
+        res = self.classify_books([book_name], [book], batch_size)[0]
+        # 筛选正文并按near_tokens打包样本
+        return self.finish_book(single_md_path, book_name, book, res, save_middle)
 
-    def forward(self, batch_size, save_path, save_middle: bool = False):
+    def cached_single_file(
+        self, single_md_path, batch_size: int = 4, save_middle: bool = False
+    ) -> List[Sample]:
         """
-        单核处理流程
+        带缓存的单文件处理流程，文件未变化时直接复用文件索引中缓存的结果
         Args:
+            single_md_path: markdown文件路径
             batch_size: 批处理大小
-            save_path: 结果文件保存路径
             save_middle: 是否保存中间结果
+        Returns: LLM过滤后的字符串列表
+
+        """
+        if self.index is None:
+            return self.single_file(single_md_path, batch_size, save_middle)
+        if self.index.has_output(single_md_path):
+            return self.index.get_output(single_md_path)
+        text = self.single_file(single_md_path, batch_size, save_middle)
+        self.index.put_output(single_md_path, text)
+        return text
+
+    def group_files(
+        self, md_paths: List[str], batch_size: int = 4, save_middle: bool = False
+    ) -> Iterator[Tuple[str, List[Sample]]]:
+        """
+        按group_books本书为一组合并调度，同组书籍的文本行按token长度分桶后统一推理，结果按书籍顺序逐本返回
+        Args:
+            md_paths: markdown文件路径列表
+            batch_size: 单个批次的最大行数
+            save_middle: 是否保存中间结果
+
+        Returns: (markdown文件路径, 打包后的字符串列表)迭代器
+
+        """
+        for start in tqdm(
+            range(0, len(md_paths), self.group_books), desc="LLM Filtering Process"
+        ):
+            group = md_paths[start : start + self.group_books]
+            cached = set()
+            if self.index is not None:
+                cached = {p for p in group if self.index.has_output(p)}
+            todo = [p for p in group if p not in cached]
+            book_names = [self.get_book_name(p) for p in todo]
+            book_lines = [self.clean_book_lines(p, self.prepare_book(p)) for p in todo]
+            book_res = self.classify_books(book_names, book_lines, batch_size)
+            results = dict(zip(todo, zip(book_names, book_lines, book_res)))
+            for md_path in group:
+                if md_path in cached:
+                    yield md_path, self.index.get_output(md_path)
+                    continue
+                book_name, lines, res = results.pop(md_path)
+                text = self.finish_book(md_path, book_name, lines, res, save_middle)
+                if self.index is not None:
+                    self.index.put_output(md_path, text)
+                yield md_path, text
+
+    def iter_files(
+        self, md_paths: List[str], batch_size: int = 4, save_middle: bool = False
+    ) -> Iterator[Tuple[str, List[Sample]]]:
+        """按书籍顺序逐本返回处理结果"""
+        if self.scheduler is not None:
+            yield from self.group_files(md_paths, batch_size, save_middle)
+            return
+        for md_path in md_paths:
+            yield md_path, self.cached_single_file(md_path, batch_size, save_middle)
+
+    def open_index(self, index_dir: Optional[str]):
+        self.index = None
+        if index_dir is not None:
+            self.index = FileIndex(index_dir, config_hash(self.config))
+
+    def close_index(self):
+        if self.index is not None:
+            self.index.save()
+            self.index.info()
+
+    def open_stream(
+        self,
+        save_path: str,
+        bloom_capacity: int,
+        save_middle: bool = False,
+        resume: bool = False,
+    ) -> List[str]:
+        """
+        初始化流式输出所需的写入器、布隆过滤器与运行日志
+        Args:
+            save_path: 结果文件保存路径，后缀为.zst时使用zstd压缩
+            bloom_capacity: 布隆过滤器的容量，应不小于整个运行的样本数量
+            save_middle: 是否保存中间结果
+            resume: 是否根据运行日志从上次中断处继续处理
+
+        Returns: 尚未处理的markdown文件路径列表
+
+        """
+        middle_path = utils.filename_add_suffix(save_path, "_middle")
+        self.bf = Bloom(bloom_capacity, 0.01)
+        self.sample_num = 0
+        self.journal = RunJournal(save_path + ".journal", config_hash(self.config))
+        if resume:
+            self.journal.load()
+        last = self.journal.last_entry
+        if last is not None and not (
+            os.path.exists(save_path) and os.path.getsize(save_path) >= last["offset"]
+        ):
+            # 结果文件被删除、移动或被截短时无法从日志记录的偏移量继续，丢弃运行日志重新处理全部书籍
+            logger.warning(
+                f"{save_path} is missing or shorter than the journal offset {last['offset']}, the journal is discarded and the run restarts."
+            )
+            self.journal.entries = []
+            last = None
+        if last is None:
+            self.writer = JsonlWriter(save_path)
+            if save_middle:
+                self.middle_writer = JsonlWriter(middle_path)
+            self.journal.open("w")
+            return self.md_path_list
+
+        # 截断最后一本已完成书籍之后写入的不完整数据
+        os.truncate(save_path, last["offset"])
+        self.sample_num = last["sample_num"]
+        # 用已写入的结果重建布隆过滤器
+        for r in iter_jsonl(save_path):
+            self.bf.add(r["text"])
+        self.writer = JsonlWriter(save_path, mode="a")
+        if save_middle:
+            if (
+                last["middle_offset"] is not None
+                and os.path.exists(middle_path)
+                and os.path.getsize(middle_path) >= last["middle_offset"]
+            ):
+                os.truncate(middle_path, last["middle_offset"])
+                self.middle_writer = JsonlWriter(middle_path, mode="a")
+            else:
+                self.middle_writer = JsonlWriter(middle_path)
+        self.journal.open("a")
+        finished = set(self.journal.finished)
+        pending = [p for p in self.md_path_list if p not in finished]
+        logger.info(
+            f"Resume from the journal, {len(finished)} books are skipped and {len(pending)} books remain."
+        )
+        return pending
+
+    def close_stream(self):
+        for writer in (self.writer, self.middle_writer):
+            if writer is not None:
+                writer.close()
+        if self.journal is not None:
+            self.journal.close()
+        self.writer = None
+        self.middle_writer = None
+        self.journal = None
+
+    def run_info(self):
+        """打印整个运行的规则命中、打包效率、批处理调度、分类缓存、预分类、fastText过滤、样板文本、去重与块处理方式统计，并保存各阶段耗时报告"""
+        self.rule_engine.hit_info()
+        self.pt.total_info()
+        if self.scheduler is not None:
+            self.scheduler.info()
+        if self.cls_cache is not None:
+            self.cls_cache.info()
+        if self.prefilter is not None:
+            self.prefilter.info()
+        if self.ft_filter is not None:
+            self.ft_filter.info()
+        if self.boilerplate is not None:
+            self.boilerplate.info()
+        if self.dedup is not None:
+            self.dedup.info()
+        if self.block_policy is not None:
+            self.block_policy.info()
+        self.profiler.info()
+        if self.profile_path is not None:
+            self.profiler.save_json(self.profile_path)
+        if self.prom_path is not None:
+            self.profiler.save_prometheus(self.prom_path)
+
+    def stream_book(self, single_md_path: str, text_list: List[Sample]) -> int:
+        """
+        对单本书的打包结果进行去重，立即追加写入结果文件，并记录到运行日志
+        Args:
+            single_md_path: 当前处理的markdown文件路径
+            text_list: 单本书打包后的字符串列表
+
+        Returns: 写入后结果文件的字节偏移量
+
         """
-        text_list: List[str] = []
-        for md_path in self.md_path_list:
-            text_list = text_list + self.single_file(md_path, batch_size, save_middle)
+        book_name = self.get_book_name(single_md_path)
+        unique_text: List[Dict[str, Any]] = []
+        with self.profiler.timer("bloom_filter", book_name):
+            for sample in text_list:
+                t = item_text(sample)
+                if t in self.bf:
+                    continue
+                self.bf.add(t)
+                unique_text.append(sample_record(sample, self.sample_num))
+                self.sample_num += 1
+        self.profiler.add(
+            "bloom_filter", book_name, samples=len(text_list), kept=len(unique_text)
+        )
+        utils.filter_info(
+            "Bloom Filter",
+            len(text_list),
+            len(unique_text),
+            self.get_book_name(single_md_path) + ".md",
+        )
+        middle_offset = None
+        if self.middle_writer is not None:
+            middle_offset = self.middle_writer.write(self.middle_res)
+            self.middle_res = []
+        offset = self.writer.write(unique_text)
+        self.journal.record(single_md_path, offset, self.sample_num, middle_offset)
+        return offset
+
+    def save_results(
+        self, save_path: str, text_list: List[Sample], save_middle: bool = False
+    ):
+        """对整个运行的打包结果进行布隆过滤器去重并保存"""
         self.res_text = self.trans_dict("text", text_list)
-        self.res_text = self.bloom_filter(self.res_text)
+        with self.profiler.timer("bloom_filter"):
+            self.res_text = self.bloom_filter(self.res_text)
+        self.profiler.add(
+            "bloom_filter", samples=len(text_list), kept=len(self.res_text)
+        )
         save_json(save_path, self.res_text)
         if save_middle:
             save_json(utils.filename_add_suffix(save_path, "_middle"), self.middle_res)
 
+    def forward(
+        self,
+        batch_size,
+        save_path,
+        save_middle: bool = False,
+        stream: bool = False,
+        bloom_capacity: int = int(1e7),
+        resume: bool = False,
+        index_dir: Optional[str] = None,
+    ):
+        """
+        单核处理流程
+        Args:
+            batch_size: 批处理大小
+            save_path: 结果文件保存路径
+            save_middle: 是否保存中间结果
+            stream: 是否流式输出，每本书处理完成后立即去重并追加写入jsonl文件
+            bloom_capacity: 流式输出时布隆过滤器的容量
+            resume: 是否根据运行日志跳过已完成的书籍，仅在流式输出时有效
+            index_dir: 文件索引目录，若不为None则仅处理新增或修改的文件，其余文件复用缓存结果
+        """
+        if resume and not stream:
+            raise ValueError("resume is only supported when stream is True")
+        self.profiler.reset()
+        self.open_index(index_dir)
+        if stream:
+            pending = self.open_stream(save_path, bloom_capacity, save_middle, resume)
+            try:
+                for md_path, text in self.iter_files(pending, batch_size, save_middle):
+                    self.stream_book(md_path, self.dedup_book_chunks(md_path, text))
+            finally:
+                self.close_stream()
+                self.close_index()
+            self.run_info()
+            return
+        text_list: List[Sample] = []
+        for md_path, text in self.iter_files(self.md_path_list, batch_size, save_middle):
+            text_list.extend(self.dedup_book_chunks(md_path, text))
+        self.close_index()
+        self.save_results(save_path, text_list, save_middle)
+        self.run_info()
+
     def forward_with_pool(
         self,
         num_proc: int,
         save_path: str,
         batch_size: int = 4,
         save_middle: bool = False,
+        stream: bool = False,
+        bloom_capacity: int = int(1e7),
+        resume: bool = False,
+        index_dir: Optional[str] = None,
+        queue_size: int = 8,
     ):
         """
-        并行处理流程
+        并行处理流程，分为三个流水线阶段，各阶段之间通过有界队列连接：
+        1. 解析：num_proc个进程读取文件、剔除markdown语法、分割文本并进行替换操作，进程中不加载模型
+        2. 推理：主进程中唯一持有模型的线程从队列中取出已就绪的书籍（至多group_books本）组成微批次进行分类
+        3. 写入：主线程按书籍顺序筛选正文、打包样本并输出结果
 
         Args:
-            num_proc: 进程数
+            num_proc: 解析阶段的进程数
             save_path: 结果文件保存路径
             batch_size: 批处理大小
             save_middle: 是否保存中间结果
+            stream: 是否流式输出，每本书处理完成后立即去重并追加写入jsonl文件
+            bloom_capacity: 流式输出时布隆过滤器的容量
+            resume: 是否根据运行日志跳过已完成的书籍，仅在流式输出时有效
+            index_dir: 文件索引目录，若不为None则仅处理新增或修改的文件，其余文件复用缓存结果
+            queue_size: 各阶段之间队列可暂存的书籍数量，用于限制内存占用
         """
 
-        def aux_iter(ls: List[str], **kwargs):
-            for l in ls:
-                yield {**{"single_md_path": l}, **kwargs}
+        def parse(paths: List[str]) -> Iterator[Tuple[str, Union[List[str], List[Block]]]]:
+            with WorkerPool(
+                n_jobs=num_proc, shared_objects=self.parser(), start_method="spawn"
+            ) as pool:
+                # imap按书籍顺序返回结果，同时处理中的书籍数量受限，避免解析结果堆积
+                book_iter = pool.imap(
+                    _parse_book,
+                    paths,
+                    iterable_len=len(paths),
+                    max_tasks_active=num_proc + queue_size,
+                    progress_bar=True,
+                )
+                for md_path, (lines, hits, profile) in zip(paths, book_iter):
+                    self.rule_engine.hits.update(hits)
+                    self.profiler.merge(profile)
+                    yield md_path, lines
 
-        with WorkerPool(n_jobs=num_proc, start_method="spawn") as pool:
-            text_list = pool.map(
-                self.single_file,
-                aux_iter(
-                    self.md_path_list, batch_size=batch_size, save_middle=save_middle
-                ),
-                progress_bar=True,
-            )
-        self.res_text = self.trans_dict("text", text_list)
-        self.res_text = self.bloom_filter(self.res_text)
-        save_json(save_path, self.res_text)
-        if save_middle:
-            save_json(utils.filename_add_suffix(save_path, "_middle"), self.middle_res)
+        def infer(books: Stage) -> Iterator[Tuple[str, str, List[Any], List[str]]]:
+            for group in books.batches(self.group_books):
+                book_names = [self.get_book_name(p) for p, _ in group]
+                book_lines = [self.clean_book_lines(p, lines) for p, lines in group]
+                book_res = self.classify_books(book_names, book_lines, batch_size)
+                for (md_path, _), book_name, lines, res in zip(
+                    group, book_names, book_lines, book_res
+                ):
+                    yield md_path, book_name, lines, res
+
+        if resume and not stream:
+            raise ValueError("resume is only supported when stream is True")
+        self.profiler.reset()
+        self.open_index(index_dir)
+        pending = self.md_path_list
+        if stream:
+            pending = self.open_stream(save_path, bloom_capacity, save_middle, resume)
+        # 文件索引的查找与写入均在主进程中进行，仅新增或修改的文件进入流水线
+        cached = set()
+        if self.index is not None:
+            cached = {p for p in pending if self.index.has_output(p)}
+        todo = [p for p in pending if p not in cached]
+
+        books = Stage("parse", parse, todo, queue_size)
+        results = Stage("inference", infer, books, queue_size).start()
+        result_iter = iter(results)
+        text_list: List[Sample] = []
+        try:
+            for md_path in pending:
+                if md_path in cached:
+                    text = self.index.get_output(md_path)
+                else:
+                    item = next(result_iter, None)
+                    if item is None:
+                        raise RuntimeError(
+                            f"The inference stage ended after {results.item_num} books, no result for {md_path}"
+                        ) from results.failure()
+                    _, book_name, lines, res = item
+                    # 筛选正文并按near_tokens打包样本
+                    text = self.finish_book(md_path, book_name, lines, res, save_middle)
+                    if self.index is not None:
+                        self.index.put_output(md_path, text)
+                text = self.dedup_book_chunks(md_path, text)
+                if stream:
+                    self.stream_book(md_path, text)
+                else:
+                    text_list.extend(text)
+        finally:
+            results.stop()
+            if stream:
+                self.close_stream()
+            self.close_index()
+        results.info()
+        if not stream:
+            self.save_results(save_path, text_list, save_middle)
+        self.run_info()
@@ -0,0 +1,109 @@
+import json
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+import pandas as pd
+from loguru import logger
+
+# 汉字的Unicode范围
+CJK_PATTERN = r"[\u4e00-\u9fff]"
+
+
+class PreFilter:
+    # 默认规则，与LLMFilterPrompt中的非正文特征以及clsdataset.batch_amend中的规则对应
+    DEFAULT_RULES: List[Dict[str, Any]] = [
+        # $$公式块的起止行
+        {"name": "formula", "pattern": r"^\$\$$", "label": "False"},
+        # 仅包含图表编号与标题，如：表11-4儿童重症肺炎诊断标准
+        {
+            "name": "caption",
+            "pattern": r"^[图表]\s*\d+(?:[-－—.．]\d+)*[^。；！？]{0,30}$",
+            "label": "False",
+        },
+        # 以章节标题开头，字数少于20，且以数字结尾
+        {
+            "name": "heading",
+            "pattern": r"^(?:第[一二三四五六七八九十百零\d]+[章节篇部]|[一二三四五六七八九十]+[、.．]).*\d$",
+            "max_len": 20,
+            "label": "False",
+        },
+        # 由大量英文单词或数字与极少量的中文组成
+        {"name": "low_cjk", "max_cjk_ratio": 0.05, "min_len": 1, "label": "False"},
+        # 以【开头的条目均为正文
+        {"name": "bracket", "pattern": r"^【", "label": "True"},
+    ]
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        """
+        基于规则的向量化预分类器，对可以确定判断结果的文本行直接给出结果，其余文本行交给模型推理
+        每条规则的条件之间为且的关系，可包含pattern（正则表达式）、min_len、max_len、min_cjk_ratio、max_cjk_ratio，
+        label为"True"或"False"，多条规则同时满足时以靠前的规则为准
+        Args:
+            rules: 规则列表，若为None则使用DEFAULT_RULES
+        """
+        self.rules = rules if rules is not None else self.DEFAULT_RULES
+        for rule in self.rules:
+            if rule.get("label") not in ("True", "False"):
+                raise ValueError(f"label of rule {rule.get('name')} must be 'True' or 'False'")
+        self.hits: Counter = Counter()
+        self.decided_num = 0
+        self.total_num = 0
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "PreFilter":
+        """从json文件读取规则，若path为None则使用默认规则"""
+        if path is None:
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def label(self, text_list: List[str]) -> List[Optional[str]]:
+        """
+        对文本行进行预分类
+        Args:
+            text_list: 字符串列表
+
+        Returns: 每行的判断结果，无法确定的文本行为None
+
+        """
+        if not text_list:
+            return []
+        s = pd.Series(text_list, dtype=object).str.strip()
+        lengths = s.str.len()
+        cjk_ratio = s.str.count(CJK_PATTERN) / lengths.clip(lower=1)
+        labels = pd.Series([None] * len(s), dtype=object)
+        undecided = pd.Series(True, index=s.index)
+        for rule in self.rules:
+            mask = undecided.copy()
+            if "pattern" in rule:
+                mask &= s.str.contains(rule["pattern"], regex=True)
+            if "min_len" in rule:
+                mask &= lengths >= rule["min_len"]
+            if "max_len" in rule:
+                mask &= lengths <= rule["max_len"]
+            if "min_cjk_ratio" in rule:
+                mask &= cjk_ratio >= rule["min_cjk_ratio"]
+            if "max_cjk_ratio" in rule:
+                mask &= cjk_ratio <= rule["max_cjk_ratio"]
+            hit = int(mask.sum())
+            if hit:
+                labels[mask] = rule["label"]
+                undecided &= ~mask
+                self.hits[rule["name"]] += hit
+        return labels.tolist()
+
+    def book_info(self, book_name: str, decided_num: int, total_num: int):
+        """打印单本书由规则直接判断的文本行比例，并累计到整个运行的统计中"""
+        self.decided_num += decided_num
+        self.total_num += total_num
+        logger.info(
+            f"Pre-classifier: {book_name}.md decides {decided_num} of {total_num} lines ({decided_num / total_num * 100 if total_num else 0.0:.2f}% inference saved)."
+        )
+
+    def info(self):
+        logger.info(
+            f"Pre-classifier in total: {self.decided_num} of {self.total_num} lines are decided by rules, "
+            f"{self.decided_num / self.total_num * 100 if self.total_num else 0.0:.2f}% of inference saved."
+        )
+        for name, num in self.hits.most_common():
+            logger.info(f"Pre-classifier rule {name} hits {num} lines")
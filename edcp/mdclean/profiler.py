@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+# 未开启统计时所有计时共用的空上下文，不产生额外开销
+_NULL = nullcontext()
+
+
+class _Timer:
+    __slots__ = ("profiler", "stage", "book_name", "start")
+
+    def __init__(self, profiler: "StageProfiler", stage: str, book_name: Optional[str]):
+        self.profiler = profiler
+        self.stage = stage
+        self.book_name = book_name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(
+            self.stage, self.book_name, time=time.perf_counter() - self.start, calls=1
+        )
+
+
+class StageProfiler:
+    def __init__(self, enabled: bool = False):
+        """
+        处理流程各阶段的耗时与吞吐量统计，按阶段累计耗时、调用次数以及文本行数、字符数、token数量、批次数与填充后的token数量，
+        同时保留每本书的统计，可保存为json报告或Prometheus textfile格式
+        未开启时timer返回共享的空上下文，add与add_lines直接返回，不遍历文本
+        Args:
+            enabled: 是否开启统计
+        """
+        self.enabled = enabled
+        self.total: Dict[str, Counter] = {}
+        self.books: Dict[str, Dict[str, Counter]] = {}
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """清空统计并重新开始计时"""
+        self.total = {}
+        self.books = {}
+        self.start_time = time.perf_counter()
+
+    def timer(self, stage: str, book_name: Optional[str] = None):
+        """统计with语句块的耗时与调用次数，book_name为None时仅计入汇总"""
+        if not self.enabled:
+            return _NULL
+        return _Timer(self, stage, book_name)
+
+    def add(self, stage: str, book_name: Optional[str] = None, **counts: float):
+        """
+        累加阶段计数
+        Args:
+            stage: 阶段名称
+            book_name: 当前处理的书名，为None时仅计入汇总
+            **counts: 计数名称与数量，如lines=10
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.total.setdefault(stage, Counter()).update(counts)
+            if book_name is not None:
+                self.books.setdefault(book_name, {}).setdefault(stage, Counter()).update(
+                    counts
+                )
+
+    def add_lines(self, stage: str, book_name: Optional[str], text_list: List[str]):
+        """累加文本行数与字符数"""
+        if not self.enabled:
+            return
+        self.add(
+            stage, book_name, lines=len(text_list), chars=sum(len(t) for t in text_list)
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前统计，用于从进程池汇总到主进程"""
+        return {"total": self.total, "books": self.books}
+
+    def merge(self, snapshot: Dict[str, Any]):
+        """合并其他进程中的统计"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for stage, counts in snapshot["total"].items():
+                self.total.setdefault(stage, Counter()).update(counts)
+            for book_name, stages in snapshot["books"].items():
+                book = self.books.setdefault(book_name, {})
+                for stage, counts in stages.items():
+                    book.setdefault(stage, Counter()).update(counts)
+
+    @staticmethod
+    def stage_view(counts: Counter) -> Dict[str, float]:
+        """在计数基础上计算每秒处理的文本行、字符与token数量，以及填充比例"""
+        view: Dict[str, float] = dict(counts)
+        seconds = counts.get("time", 0.0)
+        for key in ("lines", "chars", "tokens"):
+            if key in counts and seconds > 0:
+                view[f"{key}_per_sec"] = counts[key] / seconds
+        if counts.get("padded_tokens"):
+            view["padding_ratio"] = 1 - counts.get("tokens", 0) / counts["padded_tokens"]
+        return view
+
+    def report(self) -> Dict[str, Any]:
+        """
+        整个运行的统计报告
+        Returns: {"run_time": 运行时间, "stages": 各阶段汇总, "books": 每本书各阶段的统计}
+        多进程解析时各阶段耗时为所有进程的累计耗时，可能超过运行时间
+
+        """
+        return {
+            "run_time": time.perf_counter() - self.start_time,
+            "stages": {s: self.stage_view(c) for s, c in self.total.items()},
+            "books": {
+                b: {s: self.stage_view(c) for s, c in stages.items()}
+                for b, stages in self.books.items()
+            },
+        }
+
+    def save_json(self, path: str):
+        """保存json格式的统计报告"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    def save_prometheus(self, path: str, prefix: str = "edcp_mdclean"):
+        """
+        以Prometheus textfile格式保存各阶段的汇总统计，先写入临时文件再替换，避免node_exporter读取到不完整的文件
+        Args:
+            path: 输出文件路径，node_exporter要求后缀为.prom
+            prefix: 指标名称前缀
+        """
+        report = self.report()
+        metrics: Dict[str, Dict[str, float]] = {}
+        for stage, view in report["stages"].items():
+            for key, value in view.items():
+                if key == "time":
+                    name = f"{prefix}_stage_seconds_total"
+                elif key.endswith("_per_sec") or key == "padding_ratio":
+                    name = f"{prefix}_stage_{key}"
+                else:
+                    name = f"{prefix}_stage_{key}_total"
+                metrics.setdefault(name, {})[stage] = value
+        lines = [
+            f"# TYPE {prefix}_run_seconds gauge",
+            f"{prefix}_run_seconds {report['run_time']:.6f}",
+        ]
+        for name in sorted(metrics):
+            metric_type = "counter" if name.endswith("_total") else "gauge"
+            lines.append(f"# TYPE {name} {metric_type}")
+            for stage, value in sorted(metrics[name].items()):
+                lines.append(f'{name}{{stage="{stage}"}} {value:.6f}')
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def info(self):
+        if not self.enabled:
+            return
+        report = self.report()
+        logger.info(f"Stage profile: run time {report['run_time']:.2f}s")
+        for stage, view in report["stages"].items():
+            detail = ", ".join(
+                f"{k} {v:.2f}" if isinstance(v, float) else f"{k} {v}"
+                for k, v in view.items()
+                if k not in ("time", "calls")
+            )
+            logger.info(
+                f"Stage profile: {stage} {view.get('time', 0.0):.2f}s in {view.get('calls', 0)} calls, {detail}"
+            )
@@ -0,0 +1,260 @@
+import re
+import json
+from collections import Counter
+from typing import List, Tuple, Dict, Optional, Union, Any
+
+from loguru import logger
+from .charreplace import BookClean
+from ..tool import _is_package_available
+
+# 正则表达式中具有特殊含义的字符
+_META_CHARS = set(".^$*+?{}[]|()")
+# 未安装pyahocorasick的提示只输出一次
+_FALLBACK_WARNED = False
+
+
+def literal_of(pattern: str) -> Optional[str]:
+    """
+    判断正则表达式是否等价于普通字符串
+    Args:
+        pattern: 正则表达式
+
+    Returns: 若等价于普通字符串则返回该字符串，否则返回None
+
+    """
+    chars: List[str] = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                # \d、\s、\1等为正则语法
+                return None
+            chars.append(pattern[i + 1])
+            i += 2
+            continue
+        if c in _META_CHARS:
+            return None
+        chars.append(c)
+        i += 1
+    return "".join(chars)
+
+
+def load_rules(path: str) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    从文件读取替换规则
+    json文件格式为{"remove_words": [...], "replacements": [[pattern, replacement], ...]}，
+    tsv/txt文件每行为"pattern<TAB>replacement"，不含制表符的行视为需要删除的字符串，以#开头的行为注释
+    Args:
+        path: 规则文件路径
+
+    Returns: 需要删除的字符串列表与正则替换规则列表
+
+    """
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            rules = json.load(f)
+        return list(rules.get("remove_words") or []), [
+            tuple(r) for r in rules.get("replacements") or []
+        ]
+    remove_words: List[str] = []
+    replacements: List[Tuple[str, str]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#"):
+                continue
+            if "\t" in line:
+                pattern, replacement = line.split("\t", 1)
+                replacements.append((pattern, replacement))
+            else:
+                remove_words.append(line)
+    return remove_words, replacements
+
+
+def overlaps(a: str, b: str) -> bool:
+    """判断两个字符串是否存在包含关系或首尾重叠"""
+    if a in b or b in a:
+        return True
+    for k in range(1, min(len(a), len(b))):
+        if a[-k:] == b[:k] or b[-k:] == a[:k]:
+            return True
+    return False
+
+
+def conflicts(literal: str, group: Dict[str, str]) -> bool:
+    """
+    判断普通字符串规则能否与同组中之前的规则在一次扫描中完成
+    Args:
+        literal: 新的普通字符串规则
+        group: 同组中之前的规则，{字符串: 替换结果}
+
+    Returns: 若与之前的字符串或替换结果存在包含或首尾重叠则返回True
+
+    """
+    return any(
+        overlaps(literal, word) or (replacement and overlaps(literal, replacement))
+        for word, replacement in group.items()
+    )
+
+
+class RuleEngine:
+    def __init__(
+        self,
+        remove_words: Optional[List[str]] = None,
+        replacements: Optional[List[Tuple[str, str]]] = None,
+    ):
+        """
+        将删除与替换规则编译为匹配器，执行结果与utils.remove_and_replace逐条执行一致，并统计每条规则的命中次数
+        规则按原顺序执行：连续的普通字符串规则合并为一组，使用Aho-Corasick自动机一次扫描完成
+        （需安装pyahocorasick，否则退化为单个正则交替式），正则规则预先编译后逐条执行
+        若普通字符串规则与同组中之前的规则或其替换结果存在包含或首尾重叠，则另起一组，
+        使其在之前的规则执行完成后再匹配（删除字符串后前后文本拼接成新匹配的情况除外）
+        Args:
+            remove_words: 需要删除的字符串
+            replacements: 正则替换规则，形如[(pattern, replacement)]
+        """
+        self.remove_words: List[str] = list(remove_words or [])
+        self.replacements: List[Tuple[str, str]] = list(replacements or [])
+        # 全部普通字符串规则，同一字符串以先出现的规则为准
+        self.literals: Dict[str, str] = {}
+        # 真正的正则规则
+        self.regexes: List[Tuple[str, str]] = []
+        # 按原顺序排列的执行阶段，普通字符串规则组为{字符串: 替换结果}，正则规则为(pattern, replacement)
+        stages: List[Union[Dict[str, str], Tuple[str, str]]] = []
+        # (普通字符串, 替换结果, 正则表达式)，普通字符串规则的正则表达式为None，反之亦然
+        rules: List[Tuple[Optional[str], str, Optional[str]]] = [
+            (word, "", None) for word in self.remove_words if word
+        ]
+        for pattern, replacement in self.replacements:
+            literal = literal_of(pattern)
+            if literal and "\\" not in replacement:
+                rules.append((literal, replacement, None))
+            else:
+                rules.append((None, replacement, pattern))
+        for literal, replacement, pattern in rules:
+            if literal is None:
+                self.regexes.append((pattern, replacement))
+                stages.append((pattern, replacement))
+                continue
+            self.literals.setdefault(literal, replacement)
+            group = stages[-1] if stages and isinstance(stages[-1], dict) else None
+            if group is None or (literal not in group and conflicts(literal, group)):
+                group = {}
+                stages.append(group)
+            group.setdefault(literal, replacement)
+        self.hits: Counter = Counter()
+        self._compile(stages)
+
+    @classmethod
+    def from_files(
+        cls, rule_files: Optional[List[str]] = None, with_default: bool = True
+    ) -> "RuleEngine":
+        """
+        从规则文件构建规则引擎
+        Args:
+            rule_files: 规则文件路径列表
+            with_default: 是否包含BookClean中的默认规则
+
+        Returns: RuleEngine实例
+
+        """
+        remove_words: List[str] = []
+        replacements: List[Tuple[str, str]] = []
+        if with_default:
+            remove_words.extend(BookClean.REMOVE_WORDS or [])
+            replacements.extend(BookClean.REPLACEMENTS or [])
+        for path in rule_files or []:
+            rw, rp = load_rules(path)
+            remove_words.extend(rw)
+            replacements.extend(rp)
+            logger.info(
+                f"Load {len(rw)} remove words and {len(rp)} replacements from {path}."
+            )
+        return cls(remove_words, replacements)
+
+    def _compile(self, stages: List[Union[Dict[str, str], Tuple[str, str]]]):
+        self._stages: List[Tuple[Any, ...]] = []
+        for stage in stages:
+            if isinstance(stage, dict):
+                self._stages.append(("literal", stage, self._compile_literals(stage)))
+            else:
+                pattern, replacement = stage
+                self._stages.append(
+                    ("regex", re.compile(pattern, flags=re.MULTILINE), replacement)
+                )
+
+    @staticmethod
+    def _compile_literals(words: Dict[str, str]):
+        """编译一组普通字符串规则，返回Aho-Corasick自动机或正则交替式"""
+        if _is_package_available("ahocorasick"):
+            import ahocorasick
+
+            automaton = ahocorasick.Automaton()
+            for word in words:
+                automaton.add_word(word, word)
+            automaton.make_automaton()
+            return automaton
+        global _FALLBACK_WARNED
+        if not _FALLBACK_WARNED:
+            logger.warning(
+                "pyahocorasick is not installed, literal rules fall back to a regular expression alternation, 'pip install pyahocorasick'."
+            )
+            _FALLBACK_WARNED = True
+        # 按长度降序排列，保证同一位置优先匹配最长的字符串
+        return re.compile(
+            "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+        )
+
+    def _literal_sub(self, text: str, words: Dict[str, str], matcher) -> str:
+        if not isinstance(matcher, re.Pattern):
+            pieces: List[str] = []
+            last = 0
+            for end, word in matcher.iter_long(text):
+                start = end - len(word) + 1
+                pieces.append(text[last:start])
+                pieces.append(words[word])
+                self.hits[word] += 1
+                last = end + 1
+            if last == 0:
+                return text
+            pieces.append(text[last:])
+            return "".join(pieces)
+
+        def repl(m: re.Match) -> str:
+            word = m.group(0)
+            self.hits[word] += 1
+            return words[word]
+
+        return matcher.sub(repl, text)
+
+    def apply(self, text: str) -> str:
+        """
+        按原顺序对字符串执行全部删除与替换规则
+        Args:
+            text: 需要处理的字符串
+
+        Returns: 处理后的字符串
+
+        """
+        for kind, rule, target in self._stages:
+            if kind == "literal":
+                text = self._literal_sub(text, rule, target)
+                continue
+            text, n = rule.subn(target, text)
+            if n:
+                self.hits[rule.pattern] += n
+        return text
+
+    def rules(self) -> Dict[str, List]:
+        """返回全部规则，用于计算配置哈希"""
+        return {"remove_words": self.remove_words, "replacements": self.replacements}
+
+    def hit_info(self, top_k: int = 20):
+        """打印命中次数最多的规则"""
+        total = sum(self.hits.values())
+        logger.info(
+            f"Rule engine: {len(self.literals)} literal rules and {len(self.regexes)} regex rules, {total} hits in total."
+        )
+        for rule, num in self.hits.most_common(top_k):
+            logger.info(f"Rule {rule!r} hits {num} times")
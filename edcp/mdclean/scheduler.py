@@ -0,0 +1,102 @@
+from typing import List, Callable, Any
+
+from loguru import logger
+
+
+class BatchScheduler:
+    def __init__(self, tokenizer, max_batch_tokens: int = 16384, tokenize_batch: int = 1024):
+        """
+        跨书籍的动态批处理调度器，将多本书的文本行按token长度排序分桶，
+        以填充后的token数量（批大小 x 批内最长行的token数量）不超过max_batch_tokens为约束构造批次，
+        推理结果按原顺序还原到每本书
+        Args:
+            tokenizer: 推理模型的分词器，用于统计每行的token数量
+            max_batch_tokens: 单个批次填充后的token数量上限，超过上限的单行单独成批
+            tokenize_batch: 批量统计token数量时的批大小
+        """
+        self.tokenizer = tokenizer
+        self.max_batch_tokens = max_batch_tokens
+        self.tokenize_batch = tokenize_batch
+        # 实际token数量与填充后token数量，用于统计填充比例
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.batch_num = 0
+
+    def lines_tokens(self, text_list: List[str]) -> List[int]:
+        """批量统计每行的token数量"""
+        lengths: List[int] = []
+        for i in range(0, len(text_list), self.tokenize_batch):
+            encoding = self.tokenizer(text_list[i : i + self.tokenize_batch])
+            lengths.extend(len(ids) for ids in encoding["input_ids"])
+        return lengths
+
+    def plan(self, lengths: List[int], max_batch_size: int) -> List[List[int]]:
+        """
+        按token数量升序排列后依次装入批次，加入下一行会使填充后的token数量超过上限或批大小超过max_batch_size时结束当前批次
+        Args:
+            lengths: 每行的token数量
+            max_batch_size: 单个批次的最大行数
+
+        Returns: 每个批次包含的行下标
+
+        """
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        for i in sorted(range(len(lengths)), key=lambda x: lengths[x]):
+            # 升序排列时，当前行即为批内最长的行
+            if batch and (
+                (len(batch) + 1) * lengths[i] > self.max_batch_tokens
+                or len(batch) >= max_batch_size
+            ):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def run(
+        self,
+        infer: Callable[[List[str], List[str]], List[Any]],
+        book_names: List[str],
+        book_lines: List[List[str]],
+        max_batch_size: int,
+    ) -> List[List[Any]]:
+        """
+        对多本书的文本行进行批推理
+        Args:
+            infer: 推理函数，输入每行对应的书名与文本，返回每行的推理结果
+            book_names: 书名列表
+            book_lines: 每本书的文本行
+            max_batch_size: 单个批次的最大行数
+
+        Returns: 每本书按原顺序排列的推理结果
+
+        """
+        names: List[str] = []
+        texts: List[str] = []
+        for name, lines in zip(book_names, book_lines):
+            names.extend([name] * len(lines))
+            texts.extend(lines)
+        lengths = self.lines_tokens(texts)
+        res: List[Any] = [None] * len(texts)
+        for batch in self.plan(lengths, max_batch_size):
+            batch_res = infer([names[i] for i in batch], [texts[i] for i in batch])
+            for i, r in zip(batch, batch_res):
+                res[i] = r
+            self.real_tokens += sum(lengths[i] for i in batch)
+            self.padded_tokens += len(batch) * lengths[batch[-1]]
+            self.batch_num += 1
+        # 按每本书的行数切分结果
+        book_res: List[List[Any]] = []
+        start = 0
+        for lines in book_lines:
+            book_res.append(res[start : start + len(lines)])
+            start += len(lines)
+        return book_res
+
+    def info(self):
+        padding = 1 - self.real_tokens / self.padded_tokens if self.padded_tokens else 0.0
+        logger.info(
+            f"Batch scheduler: {self.batch_num} batches, {self.real_tokens} tokens, {self.padded_tokens} tokens after padding ({padding * 100:.2f}% padding)."
+        )
@@ -0,0 +1,162 @@
+import time
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from loguru import logger
+
+# 阶段结束标记
+_STOP = object()
+
+
+class _StageError:
+    """包装阶段线程中抛出的异常，由下游阶段重新抛出"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Iterable[Any]], Iterator[Any]],
+        source: Iterable[Any],
+        maxsize: int = 8,
+    ):
+        """
+        在后台线程中运行的流水线阶段，fn逐个消费上游数据并产出结果，结果写入有界队列，
+        下游阶段通过迭代获取，队列满时当前阶段阻塞等待，从而限制各阶段之间暂存的数据量
+        Args:
+            name: 阶段名称，用于日志
+            fn: 阶段处理函数，输入上游数据迭代器，返回结果迭代器
+            source: 上游数据，可以是另一个Stage
+            maxsize: 输出队列的容量
+        """
+        self.name = name
+        self.fn = fn
+        self.source = source
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        # 阶段处理函数抛出的异常，阶段提前结束时用于定位原因
+        self.error: Optional[BaseException] = None
+        # 产出数量、运行时间，以及阻塞在输出队列上（下游处理较慢）的时间
+        self.item_num = 0
+        self.run_time = 0.0
+        self.blocked_time = 0.0
+
+    def start(self) -> "Stage":
+        if isinstance(self.source, Stage):
+            self.source.start()
+        self.thread.start()
+        return self
+
+    def _put(self, item: Any) -> bool:
+        """写入输出队列，阶段被停止时返回False"""
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        start = time.perf_counter()
+        results = self.fn(self.source)
+        try:
+            while True:
+                try:
+                    item = next(results)
+                except StopIteration:
+                    break
+                wait = time.perf_counter()
+                if not self._put(item):
+                    break
+                self.blocked_time += time.perf_counter() - wait
+                self.item_num += 1
+        except BaseException as e:
+            self.error = e
+            self._put(_StageError(e))
+        finally:
+            close = getattr(results, "close", None)
+            if close is not None:
+                close()
+            self.run_time = time.perf_counter() - start
+            self._put(_STOP)
+
+    def failure(self) -> Optional[BaseException]:
+        """最早失败的阶段抛出的异常，下游阶段的异常只是转发上游异常，因此优先返回上游的"""
+        if isinstance(self.source, Stage):
+            upstream = self.source.failure()
+            if upstream is not None:
+                return upstream
+        return self.error
+
+    def get(self, block: bool = True) -> Any:
+        """获取一条数据，阶段被停止且队列为空时返回结束标记"""
+        if not block:
+            item = self.queue.get(block=False)
+        else:
+            while True:
+                try:
+                    item = self.queue.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    if self.stop_event.is_set():
+                        return _STOP
+        if isinstance(item, _StageError):
+            raise RuntimeError(f"Stage {self.name} failed") from item.exc
+        return item
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            item = self.get()
+            if item is _STOP:
+                return
+            yield item
+
+    def batches(self, max_items: int) -> Iterator[List[Any]]:
+        """
+        以微批次形式获取数据，阻塞等待第一条数据后，再取出队列中已就绪的数据，至多max_items条
+        Args:
+            max_items: 单个微批次的最大数量
+
+        Returns: 微批次迭代器
+
+        """
+        while True:
+            first = self.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            stopped = False
+            while len(batch) < max_items:
+                try:
+                    item = self.get(block=False)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopped = True
+                    break
+                batch.append(item)
+            yield batch
+            if stopped:
+                return
+
+    def stop(self):
+        """停止当前阶段及其上游阶段，并等待线程退出"""
+        self.stop_event.set()
+        if isinstance(self.source, Stage):
+            self.source.stop()
+        if self.thread.ident is not None:
+            self.thread.join()
+
+    def info(self):
+        logger.info(
+            f"Pipeline stage {self.name}: {self.item_num} items in {self.run_time:.2f}s, "
+            f"blocked by downstream {self.blocked_time:.2f}s."
+        )
+        if isinstance(self.source, Stage):
+            self.source.info()
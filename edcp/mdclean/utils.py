@@ -60,7 +60,7 @@ def filter_info(op_name: str, og_num: int, new_num: int, file_name: str = None):
     Returns:
 
     """
-    percentage = new_num / og_num * 100
+    percentage = new_num / og_num * 100 if og_num else 0.0
     if file_name is not None:
         logger.info(f"File name: {file_name}")
     logger.info(f"Start {op_name}")
@@ -99,7 +99,7 @@ def select_strings(str_list: List[str], bool_list: List[str]) -> List[str]:
 
 def search_file_suffix(directory: str, suffix: str):
     """
-    搜索文件夹下所有后缀为suffix的文件
+    搜索文件夹下所有后缀为suffix的文件，结果按路径排序
     Args:
         directory:需要搜索的文件夹
         suffix:文件后缀
@@ -108,11 +108,16 @@ def search_file_suffix(directory: str, suffix: str):
 
     """
     suffix_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith(suffix):
-                suffix_files.append(os.path.join(root, file))
-    return suffix_files
+    stack = [directory]
+    while stack:
+        # os.scandir返回的DirEntry自带文件类型信息，无需对每个文件额外调用stat
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(suffix):
+                    suffix_files.append(entry.path)
+    return sorted(suffix_files)
 
 
 def list2dataset(lst: List[Dict[str, str]]) -> Dataset:
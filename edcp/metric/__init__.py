@@ -6,4 +6,5 @@ from .mcdict import *
 from .minhash import *
 from .nlpfeat import *
 from .pipelines import *
+from .store import *
 from .utils import *
@@ -0,0 +1,220 @@
+import os
+import json
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+import jionlp as jio
+from nltk import FreqDist
+from loguru import logger
+from . import utils
+
+
+class TextAnalysis:
+    def __init__(
+        self, sentence: str, no_pinc_text: str, cut_s: List[str], cut_s_stop: List[str]
+    ):
+        """
+        单个样本的分词结果，由各指标计算共用，每个样本只分词一次
+        实例只保存分词结果，分句、ngrams与词的编码每次调用时计算，不随缓存常驻内存
+        Args:
+            sentence: 原始文本
+            no_pinc_text: 去除标点符号后的文本
+            cut_s: 分词列表
+            cut_s_stop: 去除停用词后的分词列表
+        """
+        self.sentence = sentence
+        self.no_pinc_text = no_pinc_text
+        self.cut_s = cut_s
+        self.cut_s_stop = cut_s_stop
+
+    @classmethod
+    def from_text(cls, sentence: str) -> "TextAnalysis":
+        return cls(sentence, *utils.split_word(sentence))
+
+    @property
+    def sentences(self) -> List[str]:
+        """分句结果"""
+        return jio.split_sentence(self.sentence)
+
+    def ngrams(self, ngram_size: int) -> Tuple[List[Any], FreqDist]:
+        """去除停用词后分词列表的ngrams及其频率"""
+        return utils.generate_ngrams(self.cut_s_stop, ngram_size)
+
+    @property
+    def word_bytes(self) -> List[bytes]:
+        """去重后的词的utf-8编码，用于更新MinHash"""
+        return [w.encode("utf-8") for w in set(self.cut_s)]
+
+
+def analyze(sentence: str, analyzer: Optional["AnalysisCache"] = None) -> TextAnalysis:
+    """获取单个样本的分词结果，analyzer为None时直接分词"""
+    if analyzer is None:
+        return TextAnalysis.from_text(sentence)
+    return analyzer.get(sentence)
+
+
+def text_key(text: str) -> bytes:
+    """文本内容的128位哈希值"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class AnalysisCache:
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_items: int = 2000,
+        write_batch: int = 1000,
+    ):
+        """
+        按文本内容哈希缓存分词结果，内存中保留最近使用的max_items个样本，
+        db_path不为None时同时写入sqlite数据库，可在多次运行之间复用
+        更换jieba词典或停用词表后需要删除数据库文件
+        数据库连接在首次使用时按进程创建，实例可以被序列化后传入进程池
+        分块处理超过max_items个样本的数据时，第二遍读取只能命中最后max_items个样本，
+        其余样本需要从数据库读取，未设置db_path时会重新分词
+        Args:
+            db_path: sqlite数据库文件路径，若为None则仅在内存中缓存
+            max_items: 内存中缓存的样本数量上限，缓存中的分词列表约为文本大小的数十倍，2000字的样本约占用100KB
+            write_batch: 未命中的分词结果累积到该数量后在一个事务中写入数据库
+        """
+        self.db_path = db_path
+        self.max_items = max_items
+        self.write_batch = write_batch
+        self.memory: "OrderedDict[bytes, TextAnalysis]" = OrderedDict()
+        # 等待写入数据库的分词结果
+        self.pending: List[Tuple[bytes, TextAnalysis]] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.hit_num = 0
+        self.query_num = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_pid"] = None
+        state["pending"] = []
+        return state
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=60)
+            # WAL模式允许多个进程同时读取，并与单个写入者并发
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis ("
+                "key BLOB PRIMARY KEY, words TEXT NOT NULL) WITHOUT ROWID"
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def remember(self, key: bytes, analysis: TextAnalysis):
+        """写入内存缓存，超过上限时淘汰最久未使用的样本"""
+        self.memory[key] = analysis
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+
+    def load(self, key: bytes, sentence: str) -> Optional[TextAnalysis]:
+        """从数据库读取分词结果"""
+        if self.db_path is None:
+            return None
+        row = self.conn.execute(
+            "SELECT words FROM analysis WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        no_pinc_text, cut_s, cut_s_stop = json.loads(row[0])
+        return TextAnalysis(sentence, no_pinc_text, cut_s, cut_s_stop)
+
+    def store(self, items: List[Tuple[bytes, TextAnalysis]]):
+        """批量写入数据库"""
+        if self.db_path is None or not items:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO analysis (key, words) VALUES (?, ?)",
+                [
+                    (
+                        k,
+                        json.dumps(
+                            [a.no_pinc_text, a.cut_s, a.cut_s_stop], ensure_ascii=False
+                        ),
+                    )
+                    for k, a in items
+                ],
+            )
+
+    def missing(self, sentences: List[str]) -> List[str]:
+        """返回内存与数据库中均未缓存的文本（去重），数据库中命中的结果载入内存"""
+        todo: List[str] = []
+        for sentence in dict.fromkeys(sentences):
+            key = text_key(sentence)
+            if key in self.memory:
+                continue
+            analysis = self.load(key, sentence)
+            if analysis is None:
+                todo.append(sentence)
+            else:
+                self.remember(key, analysis)
+        return todo
+
+    def get(self, sentence: str) -> TextAnalysis:
+        """
+        获取单个样本的分词结果，依次查询内存与数据库，均未命中时分词并写入缓存
+        Args:
+            sentence: 原始文本
+
+        Returns: 分词结果
+
+        """
+        key = text_key(sentence)
+        self.query_num += 1
+        analysis = self.memory.get(key)
+        if analysis is not None:
+            self.memory.move_to_end(key)
+            self.hit_num += 1
+            return analysis
+        analysis = self.load(key, sentence)
+        if analysis is not None:
+            self.hit_num += 1
+        else:
+            analysis = TextAnalysis.from_text(sentence)
+            if self.db_path is not None:
+                self.pending.append((key, analysis))
+                if len(self.pending) >= self.write_batch:
+                    self.flush()
+        self.remember(key, analysis)
+        return analysis
+
+    def flush(self):
+        """将累积的分词结果写入数据库"""
+        items, self.pending = self.pending, []
+        self.store(items)
+
+    def put_many(self, analyses: List[TextAnalysis]):
+        """写入在其他进程中计算的分词结果"""
+        items = [(text_key(a.sentence), a) for a in analyses]
+        for k, a in items:
+            self.remember(k, a)
+        self.store(items)
+
+    def info(self):
+        self.flush()
+        logger.info(
+            f"Analysis cache: {self.hit_num} of {self.query_num} samples hit ({self.hit_num / self.query_num * 100 if self.query_num else 0.0:.2f}%)."
+        )
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = None
+        self._pid = None
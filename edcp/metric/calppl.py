@@ -1,4 +1,5 @@
-from typing import List, Dict, Any
+import math
+from typing import List, Dict, Any, Optional, Tuple
 
 
 import torch
@@ -8,14 +9,30 @@ from transformers import AutoTokenizer, AutoModelForCausalLM
 from .mcdict import McDict
 from loguru import logger
 
+# 默认窗口的最大token数量。logits的显存约为batch_size * max_length * 词表大小 * 2字节，
+# 词表约15万时batch_size为8、窗口为2048的logits约5GB，取模型支持的最大长度（可达32k）时容易显存不足
+DEFAULT_MAX_LENGTH = 2048
+
 
 class CPPl:
-    def __init__(self, llm_model_path: str, text_column: str = "text"):
+    def __init__(
+        self,
+        llm_model_path: str,
+        text_column: str = "text",
+        batch_size: int = 8,
+        max_length: Optional[int] = None,
+        stride: Optional[int] = None,
+    ):
         """
         初始化PPL计算管道
         Args:
             llm_model_path: 用于计算PPL的LLM路径
             text_column: 字典中语料的key
+            batch_size: 每次前向计算的窗口数量，窗口按token长度排序后分批，减少填充
+            max_length: 单个窗口的最大token数量，若为None则取DEFAULT_MAX_LENGTH与模型支持的最大长度中较小的值，
+                超过该长度的文本按滑动窗口计算
+            stride: 滑动窗口的步长，若为None则为max_length的一半，每个窗口只计算新进入窗口的token，
+                之前的token作为上下文，步长至多为max_length - 1，使每个计分token都有上文
         """
         logger.info('Starts initialising the CPPl pipeline.')
         self.model = AutoModelForCausalLM.from_pretrained(
@@ -24,26 +41,156 @@ class CPPl:
         self.tokenizer = AutoTokenizer.from_pretrained(llm_model_path)
         logger.info('LLM Model pre-training weight and tokenizer loading is complete.')
         self.text_column = text_column
+        self.batch_size = batch_size
+        if max_length is None:
+            max_length = self.default_max_length(self.model.config, self.tokenizer)
+        self.max_length = max_length
+        self.stride = stride if stride is not None else max(max_length // 2, 1)
+        if not 0 < self.stride <= self.max_length:
+            raise ValueError("stride must be in (0, max_length]")
+        # 填充位置不参与计算，取值不影响结果
+        self.pad_token_id = (
+            self.tokenizer.pad_token_id
+            if self.tokenizer.pad_token_id is not None
+            else self.tokenizer.eos_token_id or 0
+        )
 
-    def calculate_ppl(self, single_sample: Dict[str, Any]) -> float:
-        text = single_sample[self.text_column]
-        encoders = self.tokenizer(
-            text, padding=True, truncation=True, return_tensors="pt"
+    @staticmethod
+    def default_max_length(config, tokenizer) -> int:
+        """
+        默认窗口的最大token数量，不超过DEFAULT_MAX_LENGTH、模型的位置编码长度与分词器的最大长度
+        Args:
+            config: 模型配置
+            tokenizer: 分词器
+
+        Returns: 窗口的最大token数量
+
+        """
+        return min(
+            DEFAULT_MAX_LENGTH,
+            getattr(config, "max_position_embeddings", None) or DEFAULT_MAX_LENGTH,
+            getattr(tokenizer, "model_max_length", None) or DEFAULT_MAX_LENGTH,
         )
-        input_ids = encoders.input_ids.to(self.model.device)
-        target_ids = input_ids.clone()
+
+    def calculate_ppl(self, single_sample: Dict[str, Any]) -> float:
+        return self.text_ppl(single_sample[self.text_column])
+
+    def text_ppl(self, text: str) -> float:
+        return self.batch_ppl([text])[0][0]
+
+    def windows(self, input_ids: List[int]) -> List[Tuple[List[int], int]]:
+        """
+        将文本的token切分为窗口
+        Args:
+            input_ids: 文本的token
+
+        Returns: [(窗口token, 窗口内第一个计分token的位置)]，每个token只在一个窗口中计分，首个token没有上文，不计分
+
+        """
+        res: List[Tuple[List[int], int]] = []
+        prev_end = 0
+        # 相邻窗口至少重叠一个token，否则窗口的首个token没有上文而无法计分
+        stride = max(min(self.stride, self.max_length - 1), 1)
+        for begin in range(0, len(input_ids), stride):
+            end = min(begin + self.max_length, len(input_ids))
+            window = input_ids[begin:end]
+            res.append((window, max(len(window) - (end - prev_end), 1)))
+            prev_end = end
+            if end == len(input_ids):
+                break
+        return res
+
+    def window_nll(self, batch: List[Tuple[List[int], int]]) -> List[float]:
+        """
+        一批窗口右侧填充后进行一次前向计算，按注意力掩码与计分位置累加每个窗口的负对数似然
+        Args:
+            batch: [(窗口token, 第一个计分token的位置)]
+
+        Returns: 每个窗口计分token的负对数似然之和
+
+        """
+        max_len = max(len(w) for w, _ in batch)
+        input_ids = torch.full((len(batch), max_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), max_len), dtype=torch.long)
+        for i, (w, _) in enumerate(batch):
+            input_ids[i, : len(w)] = torch.tensor(w, dtype=torch.long)
+            attention_mask[i, : len(w)] = 1
+        input_ids = input_ids.to(self.model.device)
+        attention_mask = attention_mask.to(self.model.device)
         with torch.no_grad():
-            outputs = self.model(input_ids, labels=target_ids)
-            neg_log_likelihood = outputs.loss
-        return torch.exp(neg_log_likelihood).cpu().item()
+            logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+            nll: List[float] = []
+            for i, (w, score_from) in enumerate(batch):
+                # 第t个位置的输出预测第t+1个token，逐个窗口转换为float32，避免整批logits同时占用显存
+                log_probs = torch.log_softmax(
+                    logits[i, score_from - 1 : len(w) - 1].float(), dim=-1
+                )
+                targets = input_ids[i, score_from : len(w)].unsqueeze(-1)
+                nll.append(-log_probs.gather(-1, targets).sum().item())
+        return nll
+
+    def batch_ppl(self, texts: List[str]) -> Tuple[List[float], List[int]]:
+        """
+        批量计算PPL，所有文本的窗口按token长度排序后每batch_size个窗口前向计算一次
+        Args:
+            texts: 文本列表
+
+        Returns: (每个文本的PPL, 每个文本计分的token数量)，计分token数量为0的文本PPL为nan
+
+        """
+        encodings = self.tokenizer(texts)["input_ids"] if texts else []
+        windows: List[Tuple[int, List[int], int]] = [
+            (idx, w, score_from)
+            for idx, ids in enumerate(encodings)
+            for w, score_from in self.windows(ids)
+            if len(w) > score_from
+        ]
+        windows.sort(key=lambda x: len(x[1]))
+        nll_sum = [0.0] * len(texts)
+        token_num = [0] * len(texts)
+        for start in range(0, len(windows), self.batch_size):
+            batch = windows[start : start + self.batch_size]
+            for (idx, w, score_from), nll in zip(
+                batch, self.window_nll([(w, score_from) for _, w, score_from in batch])
+            ):
+                nll_sum[idx] += nll
+                token_num[idx] += len(w) - score_from
+        ppl = [
+            math.exp(n / t) if t > 0 else float("nan")
+            for n, t in zip(nll_sum, token_num)
+        ]
+        return ppl, token_num
+
+    @staticmethod
+    def corpus_ppl(ppl: List[float], token_num: List[int]) -> float:
+        """按token数量加权合并多个文本的PPL，得到整个语料的PPL"""
+        total = sum(t for p, t in zip(ppl, token_num) if t > 0)
+        if total == 0:
+            return float("nan")
+        return math.exp(
+            sum(math.log(p) * t for p, t in zip(ppl, token_num) if t > 0) / total
+        )
 
     def do_process(self, single_sample: Dict[str, Any], only_mid_res: bool = False):
-        res_mid = {"llm_ppl": self.calculate_ppl(single_sample)}
+        ppl, token_num = self.batch_ppl([single_sample[self.text_column]])
+        res_mid = {"llm_ppl": ppl[0], "llm_tokens": token_num[0]}
         if only_mid_res:
             return res_mid
         else:
             return utils.cat_dict(single_sample, res_mid)
 
+    def do_batch(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        批量计算PPL指标
+        Args:
+            texts: 文本列表
+
+        Returns: 列名到与texts等长的取值列表，llm_tokens为每个文本计分的token数量，可用于计算整个语料的PPL
+
+        """
+        ppl, token_num = self.batch_ppl(texts)
+        return {"llm_ppl": ppl, "llm_tokens": token_num}
+
     def forward(self, data: List[Dict[str, Any]]):
         for idx in range(len(data)):
             data[idx] = self.do_process(data[idx])
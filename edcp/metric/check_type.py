@@ -3,6 +3,7 @@ from typing import List, Dict, Any, Union, Optional
 
 from loguru import logger
 from pydantic import BaseModel, ValidationError
+from ..stream import is_stream_path
 
 
 class FileOrData(BaseModel):
@@ -20,10 +21,10 @@ class LDictData(BaseModel):
 def check_path_data(path_or_data) -> str:
     try:
         FilePath(file_path=path_or_data)
-        if path_or_data.endswith(".json"):
+        if path_or_data.endswith(".json") or is_stream_path(path_or_data):
             logger.info('The input is the file path and the file is being read.')
         else:
-            raise Exception("Unable to read non-json files!")
+            raise Exception("Unable to read files other than json, jsonl, parquet and arrow!")
         return "path"
     except ValidationError as e:
         try:
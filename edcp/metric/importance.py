@@ -5,6 +5,7 @@ from typing import List, Dict, Any, Optional, Union
 from nltk import FreqDist
 from loguru import logger
 from .mcdict import McDict
+from .analysis import AnalysisCache, analyze
 from .. import tool
 from . import utils
 from pydantic import BaseModel, ValidationError
@@ -27,6 +28,7 @@ class ImportFeat:
         wordgram_model_path: List[Dict[str, str]] = None,
         text_column: str = "text",
         save_wordgram_model_dir: Optional[str] = "wordgram_model",
+        analyzer: Optional[AnalysisCache] = None,
     ):
         """
 
@@ -35,8 +37,10 @@ class ImportFeat:
             wordgram_model_path: 重要性采样书籍数据训练的wordgram模型路径，若此参数不为None，则book_data_or_path将被忽略
             text_column: Dict中文本的Key
             save_wordgram_model_dir: 仅在传入book_data_or_path时有效。保存书籍数据训练的wordgram模型文件夹路径，若为None，则不保存
+            analyzer: 分词结果缓存，与其他指标共用时每个样本只分词一次，若为None则每次调用时分词
         """
         self.text_column: str = text_column
+        self.analyzer = analyzer
         self.wordgram_model: Dict[str, FreqDist] = dict()
         book_datas: Dict[str, List[Dict[str, Any]]] = dict()
 
@@ -112,21 +116,33 @@ class ImportFeat:
         return (ngram_freq[word] + 1) / (total_ngrams + len(ngram_freq))
 
     def cls_prob(
-        self, wordgram_model: FreqDist, single_sample: Dict[str, Any]
+        self,
+        wordgram_model: FreqDist,
+        single_sample: Dict[str, Any],
+        tokens: Optional[List[str]] = None,
     ) -> float:
-        _, tokens, _ = utils.split_word(single_sample[self.text_column])
+        if tokens is None:
+            tokens = analyze(single_sample[self.text_column], self.analyzer).cut_s
+        return self.tokens_prob(wordgram_model, tokens)
+
+    @staticmethod
+    def tokens_prob(wordgram_model: FreqDist, tokens: List[str]) -> float:
+        """计算分词列表在wordgram模型下的对数概率，模型的总频数与词表大小只计算一次"""
+        denominator = sum(wordgram_model.values()) + len(wordgram_model)
         prob = 1.0
         for token in tokens:
-            prob *= self.ngram_prob(wordgram_model, token)
+            prob *= (wordgram_model[token] + 1) / denominator
         return round(math.log(prob), 4)
 
     def do_process(
         self, single_sample: Dict[str, Any], only_mid_res: bool = False
     ) -> Dict[str, Any] | McDict[str, Any]:
         res_mid = dict()
+        # 所有wordgram模型共用同一次分词结果
+        tokens = analyze(single_sample[self.text_column], self.analyzer).cut_s
         for name, model in self.wordgram_model.items():
             res_mid[f"Importance_sample_with_{name}"] = self.cls_prob(
-                model, single_sample
+                model, single_sample, tokens
             )
         if only_mid_res:
             return res_mid
@@ -135,6 +151,23 @@ class ImportFeat:
             res = utils.cat_dict(single_sample, res_mid)
         return res
 
+    def do_batch(self, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        批量计算重要性采样指标，每个文本的分词结果由所有wordgram模型共用
+        Args:
+            texts: 文本列表
+
+        Returns: 列名到与texts等长的取值列表
+
+        """
+        tokens_list = [analyze(text, self.analyzer).cut_s for text in texts]
+        return {
+            f"Importance_sample_with_{name}": [
+                self.tokens_prob(model, tokens) for tokens in tokens_list
+            ]
+            for name, model in self.wordgram_model.items()
+        }
+
     def forward(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         for idx in range(len(data)):
             data[idx] = self.do_process(data[idx])
@@ -39,6 +39,25 @@ class IdentLanguage:
         else:
             return utils.cat_dict(single_sample, res_mid)
 
+    def do_batch(self, texts: List[str]) -> Dict[str, List[Any]]:
+        """
+        批量识别语言，整批文本一次传入fasttext模型
+        Args:
+            texts: 文本列表
+
+        Returns: 列名到与texts等长的取值列表
+
+        """
+        columns: Dict[str, List[Any]] = {"language": [], "prop": []}
+        if not texts:
+            return columns
+        labels, probs = self.model.predict([self.text_trans(t) for t in texts])
+        for res in zip(labels, probs):
+            label, prop = self.split_res(res)
+            columns["language"].append(label)
+            columns["prop"].append(prop)
+        return columns
+
     def forward(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         for idx in range(len(data)):
             data[idx] = self.do_process(data[idx])
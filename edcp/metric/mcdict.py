@@ -1,3 +1,6 @@
+from typing import Any, Iterable, Tuple
+
+
 class McDict(dict):
     def __setitem__(self, key, value):
         # 调用父类的__setitem__方法，插入键值对
@@ -5,10 +8,22 @@ class McDict(dict):
         # 按照要求对字典的键进行排序
         self._sort_dict()
 
+    @staticmethod
+    def sort_key(item: Tuple[Any, Any]):
+        # 'text'键排在首位，其余按键名排序
+        return item[0] != 'text', item[0]
+
+    @classmethod
+    def from_items(cls, items: Iterable[Tuple[Any, Any]]) -> "McDict":
+        """排序一次后构建字典，避免逐个插入时每次都重新排序"""
+        res = cls()
+        dict.update(res, sorted(items, key=cls.sort_key))
+        return res
+
     def _sort_dict(self):
         # 如果字典中有'text'键，则将其放到首位
         items = list(self.items())
-        items.sort(key=lambda x: (x[0] != 'text', x[0]))
+        items.sort(key=self.sort_key)
         # 清空当前字典并重新插入排序后的键值对
         super().clear()
         super().update(items)
@@ -1,5 +1,5 @@
 from multiprocessing import cpu_count
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 
 from mpire import WorkerPool
@@ -7,22 +7,37 @@ from tqdm import tqdm
 from datasketch import MinHash, MinHashLSH
 from . import utils
 from .mcdict import McDict
+from .analysis import AnalysisCache, TextAnalysis, analyze
 from loguru import logger
 
 
 class CalMinHash:
     def __init__(
         self,
-        data: List[Dict[str, Any]],
+        data: Optional[List[Dict[str, Any]]],
         text_column: str = "text",
         idx_column: str = "int_id",
         num_perm: int = 256,
+        analyzer: Optional[AnalysisCache] = None,
     ):
+        """
+        Args:
+            data: 待计算MinHash相似度的样本，若为None则之后通过update分块加入样本
+            text_column: Dict中文本的Key
+            idx_column: Dict中样本ID的Key
+            num_perm: MinHash中构造哈希值所用哈希函数个数
+            analyzer: 分词结果缓存，与其他指标共用时每个样本只分词一次，若为None则直接分词
+        """
         logger.info("Starts initialising the CalMinHash pipeline.")
-        self.data = data
+        self.data = data if data is not None else []
         self.text_column = text_column
         self.idx_column = idx_column
         self.num_perm = num_perm
+        self.analyzer = analyzer
+        # 分块调用update时复用的进程池，由open_pool创建
+        self.pool: Optional[WorkerPool] = None
+        # 多进程失败后，之后的分块直接使用单进程
+        self.parallel = True
         logger.info(
             "Initialise MinHashLSH with thresholds of 0.7, 0.8 and 0.9 respectively."
         )
@@ -30,16 +45,9 @@ class CalMinHash:
         self.ml_lsh0_8: MinHashLSH
         self.ml_lsh0_9: MinHashLSH
         self.mh_dict: Dict[Any, Any]
-
-        # 尝试多进程
-        try:
-            logger.info(f"Update MinHash key-value pairs with parallel computing using {cpu_count()} cpu cores")
-            self._update_mh_pool()
-        # 单进程
-        except:
-            logger.info("Update MinHash key-value pairs")
-            self._update_mh()
-        logger.info("Updates MinHash key-value pairs completed")
+        self._init_mhlsh()
+        if data is not None:
+            self.update(data)
 
     def _init_mhlsh(self):
         """初始化MinHashLSH类以及键值对"""
@@ -48,20 +56,53 @@ class CalMinHash:
         self.ml_lsh0_9 = MinHashLSH(threshold=0.9, num_perm=self.num_perm)
         self.mh_dict: Dict[Any, Any] = {}
 
-    def _update_mh(self):
-        # 初始化MinHashLSH类
-        self._init_mhlsh()
-        for d in tqdm(self.data):
-            # 初始化MinHash类（为每个样本单独初始化MinHash类）
-            mh = MinHash(num_perm=self.num_perm)
-            # 取分词后的词表
-            _, words, _ = utils.split_word(d[self.text_column])
-            for word in set(words):
-                mh.update(word.encode("utf-8"))
-            self.ml_lsh0_7.insert(d[self.idx_column], mh)
-            self.ml_lsh0_8.insert(d[self.idx_column], mh)
-            self.ml_lsh0_9.insert(d[self.idx_column], mh)
-            self.mh_dict[d[self.idx_column]] = mh
+    def open_pool(self):
+        """创建常驻的进程池，之后每次update复用同一批工作进程，直到调用close_pool"""
+        if self.pool is None:
+            self.pool = WorkerPool(
+                n_jobs=cpu_count(), start_method="spawn", keep_alive=True
+            )
+
+    def close_pool(self):
+        """关闭open_pool创建的进程池"""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def update(self, data: List[Dict[str, Any]]):
+        """
+        将一批样本加入MinHashLSH，分块读取数据时逐块调用，逐块调用前应先调用open_pool以复用进程池
+        每个样本的MinHash签名需常驻内存以查询相似样本，占用约num_perm * 8字节
+        Args:
+            data: 样本列表
+        """
+        we_res = None
+        # 尝试多进程
+        if self.parallel:
+            logger.info(f"Update MinHash key-value pairs with parallel computing using {cpu_count()} cpu cores")
+            try:
+                if self.pool is not None:
+                    we_res = self._word_bytes_pool(data, self.pool)
+                else:
+                    with WorkerPool(
+                        n_jobs=min(cpu_count(), max(len(data), 1)), start_method="spawn"
+                    ) as pool:
+                        we_res = self._word_bytes_pool(data, pool)
+            except Exception as e:
+                logger.warning(f"Parallel computing failed ({e!r}), falling back to a single process")
+                self.close_pool()
+                self.parallel = False
+        # 单进程
+        if we_res is None:
+            logger.info("Update MinHash key-value pairs")
+            we_res = self._word_bytes(data)
+        self._insert(data, we_res)
+        logger.info("Updates MinHash key-value pairs completed")
+
+    def _word_bytes(self, data: List[Dict[str, Any]]) -> List[List[bytes]]:
+        return [
+            analyze(d[self.text_column], self.analyzer).word_bytes for d in tqdm(data)
+        ]
 
     @staticmethod
     def _word_encode(d, text_column):
@@ -72,19 +113,31 @@ class CalMinHash:
             encode_list.append(word.encode("utf-8"))
         return encode_list
 
-    def _update_mh_pool(self):
-        # 初始化MinHashLSH类
-        self._init_mhlsh()
-        n_jobs = min(cpu_count(), len(self.data))
+    def _analyze_pool(
+        self, data: List[Dict[str, Any]], pool: WorkerPool
+    ) -> List[List[bytes]]:
+        """多进程分词，结果写入分词缓存，仅对缓存中不存在的文本分词"""
+        texts = [d[self.text_column] for d in data]
+        todo = self.analyzer.missing(texts)
+        if todo:
+            analyses: List[TextAnalysis] = pool.map(TextAnalysis.from_text, todo)
+            self.analyzer.put_many(analyses)
+        return [self.analyzer.get(t).word_bytes for t in texts]
+
+    def _word_bytes_pool(
+        self, data: List[Dict[str, Any]], pool: WorkerPool
+    ) -> List[List[bytes]]:
+        if self.analyzer is not None:
+            return self._analyze_pool(data, pool)
         # 利用多进程快速编码
-        with WorkerPool(n_jobs=n_jobs, start_method="spawn") as pool:
-            we_res: List[List[str]] = pool.map(
-                self._word_encode,
-                [{"d": d, "text_column": self.text_column} for d in self.data],
-            )
+        return pool.map(
+            self._word_encode,
+            [{"d": d, "text_column": self.text_column} for d in data],
+        )
 
+    def _insert(self, data: List[Dict[str, Any]], we_res: List[List[bytes]]):
         # 整合结果
-        for we, d in zip(we_res, self.data):
+        for we, d in zip(we_res, data):
             # 初始化MinHash类（为每个样本单独初始化MinHash类）
             mh = MinHash(num_perm=self.num_perm)
             for e in we:
@@ -108,6 +161,27 @@ class CalMinHash:
         else:
             return utils.cat_dict(single_sample, res_mid)
 
+    def do_batch(self, idxs: List[Any]) -> Dict[str, List[List[Any]]]:
+        """
+        批量查询相似样本，MinHash签名已在update时按样本ID计算，因此按样本ID而非文本查询
+        Args:
+            idxs: 样本ID列表
+
+        Returns: 列名到与idxs等长的取值列表
+
+        """
+        columns: Dict[str, List[List[Any]]] = {}
+        for threshold, ml_lsh in (
+            ("0.7", self.ml_lsh0_7),
+            ("0.8", self.ml_lsh0_8),
+            ("0.9", self.ml_lsh0_9),
+        ):
+            columns[f"signature_sim{threshold}"] = [
+                [s_idx for s_idx in ml_lsh.query(self.mh_dict[idx]) if s_idx != idx]
+                for idx in idxs
+            ]
+        return columns
+
     def forward(self) -> List[Dict[str, Any]]:
         for idx in range(len(self.data)):
             self.data[idx] = self.do_process(self.data[idx])
@@ -1,7 +1,7 @@
 import re
 import math
 from collections import Counter
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 
 import numpy as np
@@ -9,17 +9,25 @@ import jionlp as jio
 from mpire import WorkerPool
 from . import utils
 from .mcdict import McDict
+from .analysis import AnalysisCache, TextAnalysis, analyze
+from nltk import FreqDist
 from loguru import logger
 
 
 class SimpleInfo:
     def __init__(
-        self, sentence: str, no_pinc_text: str, cut_s: List[str], cut_s_stop: List[str]
+        self,
+        sentence: str,
+        no_pinc_text: str,
+        cut_s: List[str],
+        cut_s_stop: List[str],
+        sentences: Optional[List[str]] = None,
     ):
         self.sentence = sentence
         self.no_pinc_text = no_pinc_text
         self.cut_s = cut_s
         self.cut_s_stop = cut_s_stop
+        self.sentences = sentences
 
     def stop_radio(self) -> float:
         """计算停用词占分词列表比例"""
@@ -37,6 +45,8 @@ class SimpleInfo:
 
     def num_sentences(self) -> int:
         """计算句子个数"""
+        if self.sentences is not None:
+            return len(self.sentences)
         return len(jio.split_sentence(self.sentence))
 
     def word_entropy(self) -> float:
@@ -77,13 +87,25 @@ class SimpleInfo:
 
 
 class NlpFeat:
-    def __init__(self, text_column: str = "text"):
+    def __init__(
+        self, text_column: str = "text", analyzer: Optional[AnalysisCache] = None
+    ):
+        """
+        Args:
+            text_column: Dict中文本的Key
+            analyzer: 分词结果缓存，与其他指标共用时每个样本只分词一次，若为None则每次调用时分词
+        """
         logger.info("Starts initialising the NlpFeat pipeline.")
         self.text_column = text_column
+        self.analyzer = analyzer
 
     @staticmethod
     def simple_info(
-        sentence: str, no_pinc_text: str, cut_s: List[str], cut_s_stop: List[str]
+        sentence: str,
+        no_pinc_text: str,
+        cut_s: List[str],
+        cut_s_stop: List[str],
+        sentences: Optional[List[str]] = None,
     ) -> Dict[str, Any]:
         """
         计算简单的NLP特征指标
@@ -92,12 +114,13 @@ class NlpFeat:
             no_pinc_text: 去除标点符号后的文本
             cut_s: 分词列表
             cut_s_stop: 去除停用词后的分类列表
+            sentences: 分句结果，若为None则重新分句
 
         Returns:
         各NLP特征指标分数
         """
         simple_dict = {}
-        si = SimpleInfo(sentence, no_pinc_text, cut_s, cut_s_stop)
+        si = SimpleInfo(sentence, no_pinc_text, cut_s, cut_s_stop, sentences)
         simple_dict["stop_radio"] = si.stop_radio()
         simple_dict["puncs_radio"] = si.puncs_radio()
         simple_dict["word_unique_radio"] = si.word_unique_radio()
@@ -113,10 +136,13 @@ class NlpFeat:
         return simple_dict
 
     @staticmethod
-    def chars_dupe_ngrams(token_list: List[str], ngram_size: int) -> float:
+    def chars_dupe_ngrams(
+        token_list: List[str], ngram_size: int, freq: Optional[FreqDist] = None
+    ) -> float:
         """计算ngrams中重复词的字符占比"""
         word_lengths = np.array([len(token) for token in token_list])
-        bigrams, freq = utils.generate_ngrams(token_list, ngram_size)
+        if freq is None:
+            _, freq = utils.generate_ngrams(token_list, ngram_size)
         duplicate_ngrams = [key for key in freq if freq[key] > 1]
         duplicate_mask = np.zeros(len(token_list), dtype=int)
         for i in range(len(token_list) - ngram_size + 1):
@@ -132,9 +158,12 @@ class NlpFeat:
         return round(repeated_chars_count / total_chars_count, 4)
 
     @staticmethod
-    def chars_top_ngrams(token_list: List[str], ngram_size: int) -> float:
+    def chars_top_ngrams(
+        token_list: List[str], ngram_size: int, freq: Optional[FreqDist] = None
+    ) -> float:
         """统计ngrams中频率最高的grams占比"""
-        bigrams, freq = utils.generate_ngrams(token_list, ngram_size)
+        if freq is None:
+            _, freq = utils.generate_ngrams(token_list, ngram_size)
         max_freq_keys = max(freq, key=lambda k: freq[k])
         if freq[max_freq_keys] == 1:
             return 0.0
@@ -144,20 +173,32 @@ class NlpFeat:
         return score
 
     @classmethod
-    def key_ngrams(cls, token_list: List[str]) -> McDict[str, float]:
-        """循环计算ngrams指标"""
-        ng_dict: McDict[str, float] = McDict()
+    def ngram_values(
+        cls, token_list: List[str], analysis: Optional[TextAnalysis] = None
+    ) -> Dict[str, float]:
+        """循环计算ngrams指标，传入analysis时复用其中缓存的ngrams频率，键未排序"""
+        ng_dict: Dict[str, float] = {}
         # 检查token长度
         max_n = min(len(token_list), 10)
         # 2~10 grams模型
         for i in range(2, max_n + 1):
+            freq = analysis.ngrams(i)[1] if analysis is not None else None
             if i <= 4:
                 ng_dict[f"chars_top_{str(i)}grams"] = cls.chars_top_ngrams(
-                    token_list, i
+                    token_list, i, freq
                 )
-            ng_dict[f"chars_dupe_{str(i)}grams"] = cls.chars_dupe_ngrams(token_list, i)
+            ng_dict[f"chars_dupe_{str(i)}grams"] = cls.chars_dupe_ngrams(
+                token_list, i, freq
+            )
         return ng_dict
 
+    @classmethod
+    def key_ngrams(
+        cls, token_list: List[str], analysis: Optional[TextAnalysis] = None
+    ) -> McDict[str, float]:
+        """循环计算ngrams指标，按键排序后返回"""
+        return McDict.from_items(cls.ngram_values(token_list, analysis).items())
+
     def do_process(
         self, single_sample: Dict[str, Any], only_mid_res: bool = False
     ) -> McDict[str, Any]:
@@ -172,25 +213,52 @@ class NlpFeat:
         """
         sentence: str = single_sample[self.text_column]
         # 去除标点符号后的文本、词表、去除停用词后的词表
-        no_pinc_text, cut_s, cut_s_stop = utils.split_word(sentence)
+        ta = analyze(sentence, self.analyzer)
+        res_mid = utils.cat_dict(
+            # ngrams指标
+            self.key_ngrams(ta.cut_s_stop, ta),
+            # 简单的nlp指标
+            self.simple_info(
+                sentence, ta.no_pinc_text, ta.cut_s, ta.cut_s_stop, ta.sentences
+            ),
+        )
         if only_mid_res:
-            res_mid = utils.cat_dict(
-                # ngrams指标
-                self.key_ngrams(cut_s_stop),
-                # 简单的nlp指标
-                self.simple_info(sentence, no_pinc_text, cut_s, cut_s_stop),
-            )
             return res_mid
-        else:
-            # 计算评估指标，并与原字典进行合并
-            res = utils.cat_dict(
-                single_sample,
-                # ngrams指标
-                self.key_ngrams(cut_s_stop),
-                # 简单的nlp指标
-                self.simple_info(sentence, no_pinc_text, cut_s, cut_s_stop),
+        # 计算评估指标，并与原字典进行合并
+        return utils.cat_dict(single_sample, res_mid)
+
+    def do_batch(self, texts: List[str]) -> Dict[str, List[Any]]:
+        """
+        批量计算NLP特征指标
+        Args:
+            texts: 文本列表
+
+        Returns: 列名到与texts等长的取值列表，ngrams指标列按列名排序，短文本缺少的ngrams指标为utils.MISSING
+
+        """
+        ngram_rows: List[Dict[str, float]] = []
+        simple_rows: List[Dict[str, Any]] = []
+        for sentence in texts:
+            ta = analyze(sentence, self.analyzer)
+            ngram_rows.append(self.ngram_values(ta.cut_s_stop, ta))
+            simple_rows.append(
+                self.simple_info(
+                    sentence, ta.no_pinc_text, ta.cut_s, ta.cut_s_stop, ta.sentences
+                )
             )
-        return res
+        # 列名只排序一次
+        ngram_names = sorted(
+            {name for row in ngram_rows for name in row},
+            key=lambda name: McDict.sort_key((name, None)),
+        )
+        columns: Dict[str, List[Any]] = {
+            name: [row.get(name, utils.MISSING) for row in ngram_rows]
+            for name in ngram_names
+        }
+        if simple_rows:
+            for name in simple_rows[0]:
+                columns[name] = [row[name] for row in simple_rows]
+        return columns
 
     def forward(self, data: List[Dict[str, Any]]) -> list[dict[str, Any]]:
         for idx in range(len(data)):
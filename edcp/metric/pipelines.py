@@ -1,15 +1,19 @@
-from typing import List, Dict, Any, Union, Optional
+from typing import List, Dict, Any, Union, Optional, Iterator
 
 
+from loguru import logger
 from . import utils
 from .nlpfeat import NlpFeat
 from .calppl import CPPl
 from .minhash import CalMinHash
-from ..tool import read_json, save_json
+from ..tool import save_json
+from ..stream import iter_chunks, open_writer, is_stream_path
 from .mcdict import McDict
 from .language import IdentLanguage
 from .importance import ImportFeat
 from .check_type import check_path_data
+from .analysis import AnalysisCache
+from .store import metric_fields
 
 
 class MetricProcess:
@@ -24,12 +28,19 @@ class MetricProcess:
         text_column: str,
         idx_column: str,
         num_perm: int,
-        res_save_path: str
+        res_save_path: str,
+        analysis_cache_path: Optional[str] = None,
+        analysis_cache_size: int = 2000,
+        chunk_size: int = 10000,
+        ppl_batch_size: int = 8,
+        ppl_max_length: Optional[int] = None,
+        ppl_stride: Optional[int] = None,
     ):
         """
         MetricProcess初始化方法
         Args:
-            data_or_filepath: 进入评分管道的变量或json文件路径
+            data_or_filepath: 进入评分管道的变量或文件路径，支持json、jsonl（可加.gz、.zst后缀压缩）、parquet与arrow文件，
+                jsonl、parquet与arrow文件按块流式读取
             book_data_or_path: 用于重要性采样的书籍数据变量或json文件路径
             wordgram_model_path: 重要性采样书籍数据训练的wordgram模型路径，若此参数不为None，则book_data_or_path将被忽略
             save_wordgram_model_dir: 仅在传入book_data_or_path时有效。保存书籍数据训练的wordgram模型文件夹路径，若为None，则不保存
@@ -38,26 +49,81 @@ class MetricProcess:
             text_column: Dict中文本的Key
             idx_column: Dict中样本ID的Key
             num_perm: MinHash中构造哈希值所用哈希函数个数
+            res_save_path: 结果文件保存路径，后缀为.json时保存为json文件，为.jsonl（可加.gz、.zst后缀压缩）、.parquet或.arrow时按块写入，
+                .parquet与.arrow文件中各指标列为带类型的列，可通过read_metrics按列读取
+            analysis_cache_path: 分词结果缓存的sqlite数据库路径，若为None则仅在内存中缓存，
+                样本数量超过analysis_cache_size时，计算指标时被淘汰的样本需要重新分词
+            analysis_cache_size: 内存中缓存分词结果的样本数量上限，2000字的样本约占用100KB，
+                计算指标时每次计算的样本数量不超过该值，使各指标共用同一份分词结果
+            chunk_size: 每次读取与计算的样本数量
+            ppl_batch_size: 计算PPL时每次前向计算的窗口数量
+            ppl_max_length: 计算PPL时单个窗口的最大token数量，若为None则取2048与模型支持的最大长度中较小的值，更长的文本按滑动窗口计算
+            ppl_stride: 计算PPL时滑动窗口的步长，若为None则为ppl_max_length的一半
         """
 
-        if check_path_data(data_or_filepath) == "str":
-            self.data = read_json(data_or_filepath)
+        # 传入文件路径时不预先载入数据，计算时按块读取
+        if check_path_data(data_or_filepath) == "path":
+            self.data = None
         elif check_path_data(data_or_filepath) == "data":
             self.data = data_or_filepath
+        self.data_or_filepath = data_or_filepath
+        self.chunk_size = chunk_size
 
-        self.nf = NlpFeat(text_column)
-        self.cppl = CPPl(llm_model_path, text_column)
-        self.cmh = CalMinHash(self.data, text_column, idx_column, num_perm)
+        # 各指标共用的分词结果缓存，每个样本只分词一次
+        self.analyzer = AnalysisCache(analysis_cache_path, analysis_cache_size)
+        self.nf = NlpFeat(text_column, self.analyzer)
+        self.cppl = CPPl(
+            llm_model_path, text_column, ppl_batch_size, ppl_max_length, ppl_stride
+        )
+        # 第一遍读取：逐块构建MinHashLSH索引，相似样本的查询需要全部样本的签名
+        self.cmh = CalMinHash(None, text_column, idx_column, num_perm, self.analyzer)
+        sample_num = 0
+        # 各块共用同一个进程池，避免每块重新启动进程
+        self.cmh.open_pool()
+        try:
+            for chunk in self.iter_chunks():
+                self.cmh.update(chunk)
+                sample_num += len(chunk)
+        finally:
+            self.cmh.close_pool()
+        self.analyzer.flush()
+        if analysis_cache_path is None and sample_num > analysis_cache_size:
+            logger.warning(
+                f"{sample_num} samples exceed analysis_cache_size ({analysis_cache_size}) and analysis_cache_path is None, "
+                "samples evicted from memory will be segmented again when computing metrics. Set analysis_cache_path to reuse them."
+            )
         self.idl = IdentLanguage(fasttext_model_path, text_column)
         self.imf = ImportFeat(
             book_data_or_path,
             wordgram_model_path,
             text_column,
             save_wordgram_model_dir,
+            self.analyzer,
         )
 
+        self.text_column = text_column
+        self.idx_column = idx_column
         self.res_save_path = res_save_path
 
+    def iter_chunks(self) -> Iterator[List[Dict[str, Any]]]:
+        """按chunk_size分块读取样本"""
+        return iter_chunks(
+            self.data if self.data is not None else self.data_or_filepath,
+            self.chunk_size,
+        )
+
+    def output_fields(self, chunk: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        写入Parquet或Arrow IPC文件时各指标列的类型
+        Args:
+            chunk: 第一块样本，用于确定样本ID的类型
+
+        Returns: 列名与类型名称
+
+        """
+        idx_type = "string" if isinstance(chunk[0][self.idx_column], str) else "int64"
+        return metric_fields(idx_type, self.imf.wordgram_model)
+
     def merger_cal(self, single_sample: Dict[str, Any]) -> McDict[str, Any]:
         return utils.cat_dict(
             # 原数据
@@ -74,8 +140,77 @@ class MetricProcess:
             self.imf.do_process(single_sample, only_mid_res=True),
         )
 
-    def forward(self):
-        for idx in range(len(self.data)):
-            self.data[idx] = self.merger_cal(self.data[idx])
-        save_json(self.res_save_path, self.data)
+    def batch_cal(self, chunk: List[Dict[str, Any]]) -> List[McDict[str, Any]]:
+        """
+        批量计算一块样本的全部指标，各指标按列返回结果，最后每个样本只合并一次
+        Args:
+            chunk: 样本列表
+
+        Returns: 合并指标后的样本列表，除半精度批量前向计算带来的PPL微小差异外，与逐样本调用merger_cal的结果一致
+
+        """
+        texts = [d[self.text_column] for d in chunk]
+        return utils.assemble_records(
+            chunk,
+            # NLP特征指标
+            self.nf.do_batch(texts),
+            # LLM的PPL指标
+            self.cppl.do_batch(texts),
+            # Minhash指标
+            self.cmh.do_batch([d[self.idx_column] for d in chunk]),
+            # 中英语言识别指标
+            self.idl.do_batch(texts),
+            # 重要性采样指标
+            self.imf.do_batch(texts),
+        )
+
+    def iter_results(self) -> Iterator[List[McDict[str, Any]]]:
+        """第二遍读取：逐块计算指标"""
+        step = self.analyzer.max_items
+        for chunk in self.iter_chunks():
+            res: List[McDict[str, Any]] = []
+            # 每次计算的样本数量不超过分词缓存的容量，保证各指标计算时分词结果仍在缓存中
+            for start in range(0, len(chunk), step):
+                res.extend(self.batch_cal(chunk[start : start + step]))
+            self.analyzer.flush()
+            yield res
+
+    def save_results(self, keep: bool) -> List[McDict[str, Any]]:
+        """
+        逐块计算指标并保存，res_save_path为jsonl、parquet或arrow文件时按块写入，为json文件时全部计算完成后保存
+        Args:
+            keep: 是否在内存中保留全部结果，保存为json文件时必须保留
+
+        Returns: 结果列表，keep为False时为空列表
+
+        """
+        results: List[McDict[str, Any]] = []
+        writer = None
+        try:
+            for res in self.iter_results():
+                if is_stream_path(self.res_save_path):
+                    if writer is None:
+                        writer = open_writer(self.res_save_path, self.output_fields(res))
+                    writer.write(res)
+                if keep:
+                    results.extend(res)
+        finally:
+            if writer is not None:
+                writer.close()
+        self.analyzer.info()
+        if not is_stream_path(self.res_save_path):
+            save_json(self.res_save_path, results)
+        return results
+
+    def forward_stream(self):
+        """分块计算并写入结果文件，内存中只保留当前块的结果，res_save_path需为jsonl、parquet或arrow文件"""
+        if not is_stream_path(self.res_save_path):
+            raise ValueError(
+                "forward_stream requires res_save_path to be a .jsonl, .jsonl.gz, .jsonl.zst, .parquet or .arrow file."
+            )
+        self.save_results(keep=False)
+
+    def forward(self) -> List[McDict[str, Any]]:
+        """计算全部样本并返回结果列表"""
+        self.data = self.save_results(keep=True)
         return self.data
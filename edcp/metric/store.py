@@ -0,0 +1,64 @@
+from typing import List, Dict, Optional, Iterable
+
+from ..stream import read_columns, read_schema
+
+# NlpFeat中的浮点型指标
+NLP_FLOAT_COLUMNS = (
+    [f"chars_top_{i}grams" for i in range(2, 5)]
+    + [f"chars_dupe_{i}grams" for i in range(2, 11)]
+    + [
+        "stop_radio",
+        "puncs_radio",
+        "word_unique_radio",
+        "word_entropy",
+        "mean_word_length",
+        "curly_bracket",
+    ]
+)
+# NlpFeat中的计数指标
+NLP_INT_COLUMNS = ["num_sentences", "word_count", "num_words"]
+SIGNATURE_COLUMNS = [f"signature_sim{t}" for t in ("0.7", "0.8", "0.9")]
+
+
+def metric_fields(idx_type: str, importance_names: Iterable[str]) -> Dict[str, str]:
+    """
+    指标结果写入Parquet或Arrow IPC文件时各指标列的类型
+    ngrams指标的列数随文本长度变化，相似样本列表在第一块中可能全部为空，浮点型指标在第一块中可能全部为整数，
+    无法由第一块样本推断，因此全部显式指定。特征指标保存为float32与int32，语言标签使用字典编码，
+    重要性采样指标为对数概率，数值范围较大，保存为float64
+    Args:
+        idx_type: 样本ID的类型名称，int64或string
+        importance_names: 重要性采样wordgram模型的名称
+
+    Returns: 列名与类型名称
+
+    """
+    fields = {name: "float32" for name in NLP_FLOAT_COLUMNS}
+    fields.update({name: "int32" for name in NLP_INT_COLUMNS})
+    fields["is_ending_with_terminal_punctution"] = "bool"
+    fields["llm_ppl"] = "float32"
+    fields["llm_tokens"] = "int32"
+    fields.update({name: f"list<{idx_type}>" for name in SIGNATURE_COLUMNS})
+    fields["language"] = "dictionary<string>"
+    fields["prop"] = "float32"
+    for name in importance_names:
+        fields[f"Importance_sample_with_{name}"] = "float64"
+    return fields
+
+
+def read_metrics(
+    path: str, columns: Optional[List[str]] = None, text_column: str = "text"
+):
+    """
+    读取指标结果文件中的指定列，用于阈值分析
+    Args:
+        path: MetricProcess保存的.parquet或.arrow结果文件路径
+        columns: 需要读取的列名，若为None则读取除文本列以外的全部列
+        text_column: Dict中文本的Key
+
+    Returns: pyarrow表，可通过to_pandas()转换为DataFrame
+
+    """
+    if columns is None:
+        columns = [name for name in read_schema(path).names if name != text_column]
+    return read_columns(path, columns)
@@ -17,6 +17,31 @@ def cat_dict(*args: Union[McDict[str, Any], Dict[str, Any]]) -> McDict[str, Any]
     return temp_dict
 
 
+# 批量计算结果中表示该样本没有此指标的占位值，如短文本没有较大n的ngrams指标
+MISSING = object()
+
+
+def assemble_records(
+    data: List[Dict[str, Any]], *columns: Dict[str, List[Any]]
+) -> List[McDict[str, Any]]:
+    """
+    将各指标批量计算得到的列与原样本合并，每个样本只构建一次字典
+    Args:
+        data: 原样本列表
+        *columns: 各指标do_batch返回的列，列名到与data等长的取值列表，取值为MISSING时跳过
+
+    Returns: 合并后的样本列表，键的顺序为原样本的键，之后依次为各指标的列
+
+    """
+    names = [(name, values) for col in columns for name, values in col.items()]
+    records: List[McDict[str, Any]] = []
+    for i, sample in enumerate(data):
+        items = list(sample.items())
+        items.extend((name, values[i]) for name, values in names if values[i] is not MISSING)
+        records.append(McDict(items))
+    return records
+
+
 def cat_dict_with_pool(
     og_ld: List[Dict[str, Any]],
     add_ld: List[Dict[str, Any]],
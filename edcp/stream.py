@@ -0,0 +1,459 @@
+import io
+import os
+import gzip
+import json
+from itertools import islice
+from typing import List, Dict, Any, Iterator, Optional, Union
+
+from .tool import _is_package_available, read_json
+
+
+def is_zstd_path(path: str) -> bool:
+    """根据后缀判断文件是否为zstd压缩文件"""
+    return path.endswith(".zst") or path.endswith(".zstd")
+
+
+def is_gzip_path(path: str) -> bool:
+    """根据后缀判断文件是否为gzip压缩文件"""
+    return path.endswith(".gz")
+
+
+def is_parquet_path(path: str) -> bool:
+    """根据后缀判断文件是否为Parquet文件"""
+    return path.endswith(".parquet")
+
+
+def is_arrow_path(path: str) -> bool:
+    """根据后缀判断文件是否为Arrow IPC文件"""
+    return path.endswith(".arrow") or path.endswith(".feather")
+
+
+def is_jsonl_path(path: str) -> bool:
+    """根据后缀判断文件是否为JSONL文件（支持gzip与zstd压缩）"""
+    for suffix in (".gz", ".zst", ".zstd"):
+        if path.endswith(suffix):
+            path = path[: -len(suffix)]
+    return path.endswith(".jsonl")
+
+
+def is_stream_path(path: str) -> bool:
+    """判断文件是否支持按块流式读写"""
+    return is_jsonl_path(path) or is_parquet_path(path) or is_arrow_path(path)
+
+
+def _require_pyarrow():
+    if not _is_package_available("pyarrow"):
+        raise ImportError(
+            "Reading and writing parquet and arrow files requires the pyarrow package, 'pip install pyarrow'."
+        )
+
+
+class JsonlWriter:
+    def __init__(self, path: str, mode: str = "w", compress_level: int = 3):
+        """
+        JSONL追加写入工具，每次write调用都会立即落盘
+        Args:
+            path: 结果文件路径，后缀为.zst或.zstd时使用zstd压缩，后缀为.gz时使用gzip压缩
+            mode: 'w'为覆盖写入，'a'为追加写入
+            compress_level: zstd或gzip压缩等级，gzip的压缩等级范围为0~9
+        """
+        if mode not in ("w", "a"):
+            raise ValueError("mode must be 'w' or 'a'")
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        self.path = path
+        self.compressor = None
+        self.gzip_level: Optional[int] = None
+        if is_gzip_path(path):
+            self.gzip_level = compress_level
+        elif is_zstd_path(path):
+            if not _is_package_available("zstandard"):
+                raise ImportError(
+                    "Writing zstd files requires the zstandard package, 'pip install zstandard'."
+                )
+            import zstandard
+
+            self.compressor = zstandard.ZstdCompressor(level=compress_level)
+        self.file = open(path, mode + "b")
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        """
+        写入一批样本并刷新到磁盘
+        Args:
+            records: 样本列表
+
+        Returns: 写入后文件的字节偏移量
+
+        """
+        if records:
+            data = "".join(
+                json.dumps(r, ensure_ascii=False) + "\n" for r in records
+            ).encode("utf-8")
+            # 每批数据压缩为独立的zstd帧，多个帧拼接后仍可直接解压
+            if self.compressor is not None:
+                data = self.compressor.compress(data)
+            # gzip同理，每批数据为独立的gzip成员
+            elif self.gzip_level is not None:
+                data = gzip.compress(data, compresslevel=self.gzip_level)
+            self.file.write(data)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    逐行读取JSONL文件（支持gzip与zstd压缩），不会将整个文件载入内存
+    Args:
+        path: 文件路径
+
+    Returns: 样本迭代器
+
+    """
+    with open(path, "rb") as f:
+        raw = f
+        if is_gzip_path(path):
+            raw = gzip.GzipFile(fileobj=f)
+        elif is_zstd_path(path):
+            if not _is_package_available("zstandard"):
+                raise ImportError(
+                    "Reading zstd files requires the zstandard package, 'pip install zstandard'."
+                )
+            import zstandard
+
+            raw = zstandard.ZstdDecompressor().stream_reader(
+                f, read_across_frames=True
+            )
+        for line in io.TextIOWrapper(raw, encoding="utf-8"):
+            if line.strip():
+                yield json.loads(line)
+
+
+def arrow_type(name: str):
+    """
+    将类型名称转换为pyarrow类型
+    Args:
+        name: pyarrow类型别名，如double、float32、int64、string，支持list<...>嵌套，
+            dictionary<...>表示以int32为索引的字典编码
+
+    Returns: pyarrow类型
+
+    """
+    import pyarrow as pa
+
+    if name.startswith("list<") and name.endswith(">"):
+        return pa.list_(arrow_type(name[5:-1]))
+    if name.startswith("dictionary<") and name.endswith(">"):
+        return pa.dictionary(pa.int32(), arrow_type(name[11:-1]))
+    return pa.type_for_alias(name)
+
+
+class ColumnarWriter:
+    def __init__(self, path: str, fields: Optional[Dict[str, str]] = None):
+        """
+        列式文件分块写入工具的基类，内存中只保留当前块
+        文件的schema由第一块样本推断，第一块中全部为空值或未出现的列需要通过fields指定类型，
+        之后各块按该schema转换，出现schema以外的列时报错
+        字典编码的列在各块之间共用同一个持续增长的字典，后续块只追加新出现的取值
+        Args:
+            path: 结果文件路径
+            fields: 列名与类型名称，如{"score": "float32", "sim": "list<int64>", "lang": "dictionary<string>"}，覆盖推断得到的类型
+        """
+        _require_pyarrow()
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        self.path = path
+        self.fields = fields or {}
+        self.schema = None
+        self.num_rows = 0
+        # 字典编码列的取值与索引
+        self.dictionaries: Dict[str, Dict[Any, int]] = {}
+
+    def _init_schema(self, records: List[Dict[str, Any]]):
+        import pyarrow as pa
+
+        inferred = pa.Table.from_pylist(records).schema
+        schema_fields = [
+            pa.field(f.name, arrow_type(self.fields[f.name]))
+            if f.name in self.fields
+            else f
+            for f in inferred
+        ]
+        schema_fields += [
+            pa.field(name, arrow_type(type_name))
+            for name, type_name in self.fields.items()
+            if name not in inferred.names
+        ]
+        self.schema = pa.schema(schema_fields)
+        self.dictionaries = {
+            f.name: {} for f in self.schema if pa.types.is_dictionary(f.type)
+        }
+
+    def _to_table(self, records: List[Dict[str, Any]]):
+        """按schema将一批样本转换为pyarrow表"""
+        import pyarrow as pa
+
+        unknown = {k for r in records for k in r} - set(self.schema.names)
+        if unknown:
+            raise ValueError(
+                f"Columns {sorted(unknown)} are not in the file schema, pass their types with fields."
+            )
+        # 字典编码列先按取值类型转换，再映射到共用的字典上
+        plain = pa.schema(
+            [
+                pa.field(f.name, f.type.value_type) if f.name in self.dictionaries else f
+                for f in self.schema
+            ]
+        )
+        try:
+            table = pa.Table.from_pylist(records, schema=plain)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(
+                f"Samples do not match the file schema inferred from the first chunk, pass the column types with fields: {e}"
+            ) from e
+        for name, dictionary in self.dictionaries.items():
+            value_type = self.schema.field(name).type.value_type
+            indices = [
+                None if v is None else dictionary.setdefault(v, len(dictionary))
+                for v in table.column(name).to_pylist()
+            ]
+            column = pa.DictionaryArray.from_arrays(
+                pa.array(indices, pa.int32()), pa.array(list(dictionary), value_type)
+            )
+            table = table.set_column(
+                table.schema.get_field_index(name), self.schema.field(name), column
+            )
+        return table
+
+    def _open(self):
+        raise NotImplementedError
+
+    def _write_table(self, table):
+        raise NotImplementedError
+
+    def write(self, records: List[Dict[str, Any]]) -> int:
+        """
+        写入一批样本
+        Args:
+            records: 样本列表
+
+        Returns: 已写入的样本数量
+
+        """
+        if not records:
+            return self.num_rows
+        if self.schema is None:
+            self._init_schema(records)
+            self._open()
+        self._write_table(self._to_table(records))
+        self.num_rows += len(records)
+        return self.num_rows
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ParquetWriter(ColumnarWriter):
+    def __init__(
+        self,
+        path: str,
+        fields: Optional[Dict[str, str]] = None,
+        compression: str = "zstd",
+    ):
+        """
+        Parquet分块写入工具，每次write调用写入一个row group
+        Args:
+            path: 结果文件路径
+            fields: 列名与类型名称，覆盖推断得到的类型
+            compression: 压缩算法
+        """
+        super().__init__(path, fields)
+        self.compression = compression
+        self.writer = None
+
+    def _open(self):
+        import pyarrow.parquet as pq
+
+        self.writer = pq.ParquetWriter(
+            self.path, self.schema, compression=self.compression
+        )
+
+    def _write_table(self, table):
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class ArrowWriter(ColumnarWriter):
+    def __init__(self, path: str, fields: Optional[Dict[str, str]] = None):
+        """
+        Arrow IPC文件分块写入工具，每次write调用写入一个record batch，
+        文件不压缩，可通过内存映射零拷贝读取
+        Args:
+            path: 结果文件路径
+            fields: 列名与类型名称，覆盖推断得到的类型
+        """
+        super().__init__(path, fields)
+        self.sink = None
+        self.writer = None
+
+    def _open(self):
+        import pyarrow as pa
+
+        self.sink = pa.OSFile(self.path, "wb")
+        # IPC文件中同一列只能有一个字典，后续块以增量的形式追加新出现的取值
+        self.writer = pa.ipc.new_file(
+            self.sink,
+            self.schema,
+            options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True),
+        )
+
+    def _write_table(self, table):
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+            self.writer = None
+            self.sink = None
+
+
+def open_writer(
+    path: str, fields: Optional[Dict[str, str]] = None
+) -> Union[JsonlWriter, ColumnarWriter]:
+    """
+    按文件后缀创建分块写入工具
+    Args:
+        path: 结果文件路径，后缀为.parquet时写入Parquet文件，为.arrow或.feather时写入Arrow IPC文件，
+            为.jsonl（可加.gz、.zst后缀压缩）时写入JSONL文件
+        fields: 仅对Parquet与Arrow IPC文件有效，指定列的类型
+
+    Returns: 写入工具
+
+    """
+    if is_parquet_path(path):
+        return ParquetWriter(path, fields)
+    if is_arrow_path(path):
+        return ArrowWriter(path, fields)
+    if is_jsonl_path(path):
+        return JsonlWriter(path)
+    raise ValueError(
+        "Streaming output only supports .jsonl, .jsonl.gz, .jsonl.zst, .parquet and .arrow files."
+    )
+
+
+def iter_parquet(path: str, batch_size: int = 1024) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按row group分批读取Parquet文件，不会将整个文件载入内存
+    Args:
+        path: 文件路径
+        batch_size: 每批的最大样本数量
+
+    Returns: 样本列表迭代器
+
+    """
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+
+    pf = pq.ParquetFile(path)
+    try:
+        for batch in pf.iter_batches(batch_size=batch_size):
+            yield batch.to_pylist()
+    finally:
+        pf.close()
+
+
+def read_schema(path: str):
+    """读取Parquet或Arrow IPC文件的schema，不读取数据"""
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if is_parquet_path(path):
+        return pq.read_schema(path)
+    if is_arrow_path(path):
+        return pa.ipc.open_file(pa.memory_map(path, "r")).schema
+    raise ValueError("Only .parquet and .arrow files can be read by column.")
+
+
+def read_columns(path: str, columns: Optional[List[str]] = None):
+    """
+    读取Parquet或Arrow IPC文件中的指定列
+    Arrow IPC文件通过内存映射零拷贝读取，未选中的列（如文本列）不会被读入内存；
+    Parquet文件只解码选中列的数据
+    Args:
+        path: 文件路径
+        columns: 需要读取的列名，若为None则读取全部列
+
+    Returns: pyarrow表
+
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if is_parquet_path(path):
+        return pq.read_table(path, columns=columns, memory_map=True)
+    if is_arrow_path(path):
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return table if columns is None else table.select(columns)
+    raise ValueError("Only .parquet and .arrow files can be read by column.")
+
+
+def iter_chunks(
+    data_or_path: Union[str, List[Dict[str, Any]]], chunk_size: int
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按固定大小分块读取样本
+    Args:
+        data_or_path: 样本列表或文件路径，JSONL（支持gzip与zstd压缩）、Parquet与Arrow IPC文件流式读取，
+            json文件仍需整体载入后再分块
+        chunk_size: 每块的样本数量
+
+    Returns: 样本列表迭代器
+
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not isinstance(data_or_path, str):
+        for i in range(0, len(data_or_path), chunk_size):
+            yield data_or_path[i : i + chunk_size]
+    elif is_parquet_path(data_or_path):
+        yield from iter_parquet(data_or_path, chunk_size)
+    elif is_arrow_path(data_or_path):
+        for batch in read_columns(data_or_path).to_batches(max_chunksize=chunk_size):
+            yield batch.to_pylist()
+    elif is_jsonl_path(data_or_path):
+        records = iter_jsonl(data_or_path)
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from iter_chunks(read_json(data_or_path), chunk_size)
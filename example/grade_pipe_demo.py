@@ -14,6 +14,7 @@ def test_pipelines(
     prompt_type: Literal["domain", "general"],
     domain: Optional[str],
     res_save_path: str = "data_grade.json",
+    chunk_size: int = 1000,
 ):
     data = [
         {"text": "你好啊，我叫郝青松。你好啊，我叫李林潞。"},
@@ -29,6 +30,7 @@ def test_pipelines(
         prompt_type=prompt_type,
         domain=domain,
         res_save_path=res_save_path,
+        chunk_size=chunk_size,
     )
     gp.forward()
 
@@ -46,4 +48,5 @@ if __name__ == "__main__":
         grade_arg.base_url,
         grade_arg.prompt_type,
         grade_arg.domain,
+        chunk_size=grade_arg.chunk_size,
     )
@@ -0,0 +1,194 @@
+import time
+import random
+from typing import List, Tuple, Optional
+
+from loguru import logger
+from edcp.mdclean import utils
+from edcp.mdclean.ruleengine import RuleEngine
+from edcp.mdclean.mdstrip import MdStripper
+from edcp.mdclean.pipelines import BaseProcess
+from edcp.mdclean.packing import PackText
+from edcp.mdclean.LLMFilter import ChatModel
+
+
+def random_cjk(rng: random.Random, length: int) -> str:
+    return "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(length))
+
+
+def bench_rule_engine(num_rules: int = 2000, num_lines: int = 500, seed: int = 42):
+    """
+    对比逐条执行规则与RuleEngine的耗时，并检查两者结果是否一致
+    Args:
+        num_rules: 模拟的OCR混淆替换规则数量
+        num_lines: 模拟的文本行数
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    # 模拟"弓起→引起"一类的两字混淆规则，加上一条真正的正则规则
+    replacements: List[Tuple[str, str]] = list(
+        {random_cjk(rng, 2): random_cjk(rng, 2) for _ in range(num_rules)}.items()
+    )
+    replacements.append((r"(!|！){2,}", ""))
+    lines = [random_cjk(rng, rng.randint(10, 200)) + "！！" for _ in range(num_lines)]
+    # 人为插入可命中的字符串
+    for i in range(0, num_lines, 3):
+        lines[i] = lines[i] + replacements[i % num_rules][0]
+
+    start = time.perf_counter()
+    loop_res = [utils.remove_and_replace(l, None, replacements) for l in lines]
+    loop_time = time.perf_counter() - start
+
+    engine = RuleEngine(None, replacements)
+    start = time.perf_counter()
+    engine_res = [engine.apply(l) for l in lines]
+    engine_time = time.perf_counter() - start
+
+    mismatch = sum(a != b for a, b in zip(loop_res, engine_res))
+    logger.info(
+        f"{num_rules} rules x {num_lines} lines: loop {loop_time:.2f}s, rule engine {engine_time:.2f}s, speedup {loop_time / engine_time:.1f}x, {mismatch} mismatched lines"
+    )
+    engine.hit_info(top_k=5)
+
+
+def mineru_like_md(rng: random.Random, num_blocks: int) -> str:
+    """生成与MinerU输出结构类似的markdown文本"""
+    blocks: List[str] = []
+    for i in range(num_blocks):
+        r = rng.random()
+        if r < 0.05:
+            blocks.append(f"# 第{i}章 " + random_cjk(rng, 6))
+        elif r < 0.1:
+            blocks.append("$$\na_{i} = \\frac{b}{c}\n$$")
+        elif r < 0.13:
+            blocks.append(
+                "<html><body><table><tr><td>"
+                + random_cjk(rng, 4)
+                + "</td></tr></table></body></html>"
+            )
+        elif r < 0.16:
+            blocks.append(f"![](images/{i}.jpg)")
+        elif r < 0.2:
+            blocks.append(f"- {random_cjk(rng, 20)}\n- {random_cjk(rng, 20)}")
+        else:
+            blocks.append(
+                random_cjk(rng, rng.randint(20, 300)) + "，**" + random_cjk(rng, 4) + "**。"
+            )
+    return "\n\n".join(blocks)
+
+
+def bench_unmark(md_path: Optional[str] = None, num_blocks: int = 20000, seed: int = 42):
+    """
+    对比Markdown库渲染与MdStripper逐行剥离的吞吐量，并检查两者按行分割后的结果是否一致
+    Args:
+        md_path: 用于测试的markdown文件路径，若为None则生成与MinerU输出结构类似的文本
+        num_blocks: 生成文本时的块数量
+        seed: 随机种子
+    """
+    if md_path:
+        with open(md_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = mineru_like_md(random.Random(seed), num_blocks)
+    size_mb = len(text.encode("utf-8")) / 1024 / 1024
+
+    start = time.perf_counter()
+    md_res = utils.split_text(BaseProcess.unmark_markdown(text))
+    md_time = time.perf_counter() - start
+
+    stripper = MdStripper()
+    start = time.perf_counter()
+    fast_res = utils.split_text(stripper.strip(text))
+    fast_time = time.perf_counter() - start
+
+    same = sum(a == b for a, b in zip(md_res, fast_res))
+    logger.info(
+        f"{size_mb:.1f}MB markdown: Markdown {size_mb / md_time:.2f}MB/s, MdStripper {size_mb / fast_time:.2f}MB/s, speedup {md_time / fast_time:.1f}x"
+    )
+    logger.info(
+        f"Markdown outputs {len(md_res)} lines, MdStripper outputs {len(fast_res)} lines, {same} lines are identical"
+    )
+
+
+def legacy_to_max_tokens(pt: PackText, content: List[str]) -> List[str]:
+    """改写前的打包方法，每次超过max_tokens个字符都会对整个拼接字符串重新分词"""
+    max_token_list = []
+    temp_str = ""
+    for i in range(len(content)):
+        temp_str = temp_str + content[i]
+        if len(temp_str) >= pt.max_tokens and pt.tokens_cont(temp_str) >= pt.max_tokens:
+            max_token_list.append(temp_str)
+            temp_str = ""
+    if temp_str != "":
+        max_token_list.append(temp_str)
+    return max_token_list
+
+
+def bench_packing(
+    token_cont_model: str, near_tokens: int = 1024, num_lines: int = 20000, seed: int = 42
+):
+    """
+    对比改写前后PackText的耗时与打包结果，以及window_bfd策略的token使用率
+    Args:
+        token_cont_model: 用于统计token数量的LLM路径
+        near_tokens: token数量的大致范围
+        num_lines: 模拟的文本行数
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    lines = [random_cjk(rng, rng.randint(5, 300)) + "。" for _ in range(num_lines)]
+    pt = PackText(token_cont_model, near_tokens)
+
+    start = time.perf_counter()
+    legacy_res = legacy_to_max_tokens(pt, lines)
+    legacy_time = time.perf_counter() - start
+
+    for exact in (False, True):
+        pt.exact = exact
+        start = time.perf_counter()
+        res = pt.forward(lines)
+        new_time = time.perf_counter() - start
+        same = sum(a == b for a, b in zip(legacy_res, res))
+        logger.info(
+            f"exact={exact}: legacy {legacy_time:.2f}s, PackText {new_time:.2f}s, speedup {legacy_time / new_time:.1f}x, "
+            f"{len(legacy_res)} vs {len(res)} chunks, {same} chunks are identical"
+        )
+    # 滑动窗口装箱与贪心打包的token使用率对比
+    pt.strategy = "window_bfd"
+    pt.forward(lines)
+
+
+def bench_prefix_cache(
+    llm_model_path: str, batch_size: int = 8, num_lines: int = 64, seed: int = 42
+):
+    """
+    对比score模式下复用与不复用书籍公共前缀KV缓存的耗时，并检查两者概率的最大差异
+    Args:
+        llm_model_path: 用于过滤非正文样本的LLM路径
+        batch_size: 批处理大小
+        num_lines: 模拟的文本行数
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    lines = [random_cjk(rng, rng.randint(5, 100)) + "。" for _ in range(num_lines)]
+    cm = ChatModel(llm_model_path, mode="score")
+    probs = {}
+    times = {}
+    for prefix_cache in (False, True):
+        cm.prefix_cache = prefix_cache
+        start = time.perf_counter()
+        probs[prefix_cache] = [
+            p
+            for i in range(0, num_lines, batch_size)
+            for p in cm.forward_with_prob("儿科学", lines[i : i + batch_size])
+        ]
+        times[prefix_cache] = time.perf_counter() - start
+    diff = max(abs(a - b) for a, b in zip(probs[False], probs[True]))
+    logger.info(
+        f"{num_lines} lines: full prompt {times[False]:.2f}s, prefix cache {times[True]:.2f}s, "
+        f"speedup {times[False] / times[True]:.1f}x, max probability difference {diff:.2e}"
+    )
+
+
+if __name__ == "__main__":
+    bench_rule_engine()
+    bench_unmark()
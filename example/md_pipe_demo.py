@@ -1,6 +1,3 @@
-from typing import Literal
-
-
 from loguru import logger
 from transformers import HfArgumentParser
 from edcp.mdclean.pipelines import MdProcess
@@ -19,20 +16,18 @@ def test_llm_filter(llm_model_path: str):
     print(res)
 
 
-def test_pipelines(
-    md_path: str,
-    llm_model_path: str,
-    batch_size: int,
-    save_path: str,
-    token_cont_model: str,
-    near_tokens: int,
-    process_method: Literal["chat", "cls"] = "cls",
-    save_middle: bool = True,
-):
-    mp = MdProcess(
-        md_path, llm_model_path, token_cont_model, near_tokens, process_method
+def test_pipelines(mdpipe_arg: MdPipeArgs):
+    # 初始化参数由MdPipeArgs中同名的字段以关键字传入
+    mp = MdProcess.from_args(mdpipe_arg)
+    mp.forward(
+        batch_size=mdpipe_arg.batch_size,
+        save_path=mdpipe_arg.save_path,
+        save_middle=mdpipe_arg.save_middle,
+        stream=mdpipe_arg.stream,
+        bloom_capacity=mdpipe_arg.bloom_capacity,
+        resume=mdpipe_arg.resume,
+        index_dir=mdpipe_arg.index_dir,
     )
-    mp.forward(batch_size, save_path, save_middle)
 
 
 if __name__ == "__main__":
@@ -45,14 +40,4 @@ if __name__ == "__main__":
     # 测试chat-llm过滤管道
     # test_llm_filter(mdpipe_arg.llm_model_path)
     # 测试管道全流程
-    test_pipelines(
-        mdpipe_arg.md_path,
-        mdpipe_arg.llm_model_path,
-        mdpipe_arg.batch_size,
-        mdpipe_arg.save_path,
-        mdpipe_arg.token_cont_model,
-        mdpipe_arg.near_tokens,
-        mdpipe_arg.process_method,
-        mdpipe_arg.save_middle,
-    )
-
+    test_pipelines(mdpipe_arg)
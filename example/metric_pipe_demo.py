@@ -39,7 +39,13 @@ def test_pipelines(
     text_column,
     idx_column,
     num_perm,
-    res_save_path
+    res_save_path,
+    analysis_cache_path=None,
+    analysis_cache_size=2000,
+    chunk_size=10000,
+    ppl_batch_size=8,
+    ppl_max_length=None,
+    ppl_stride=None,
 ):
     data = [
         {"text": "你好啊，我叫小松鼠。你好啊，我叫小雪球。", "id_int": 0},
@@ -56,7 +62,13 @@ def test_pipelines(
         text_column,
         idx_column,
         num_perm,
-        res_save_path
+        res_save_path,
+        analysis_cache_path,
+        analysis_cache_size,
+        chunk_size,
+        ppl_batch_size,
+        ppl_max_length,
+        ppl_stride,
     )
     print(mcp.forward())
 
@@ -83,5 +95,11 @@ if __name__ == "__main__":
         mcpipe_arg.text_column,
         mcpipe_arg.idx_column,
         mcpipe_arg.num_perm,
-        mcpipe_arg.res_save_path
+        mcpipe_arg.res_save_path,
+        mcpipe_arg.analysis_cache_path,
+        mcpipe_arg.analysis_cache_size,
+        mcpipe_arg.chunk_size,
+        mcpipe_arg.ppl_batch_size,
+        mcpipe_arg.ppl_max_length,
+        mcpipe_arg.ppl_stride,
     )
@@ -0,0 +1,45 @@
+from edcp.metric.analysis import AnalysisCache, TextAnalysis
+from edcp.metric.nlpfeat import NlpFeat
+
+TEXTS = [
+    "临床药理学是研究药物在人体内作用规律的学科。临床药理学作为药理学科的分支。",
+    "急性支气管炎一般不发热或仅有低热，全身状况好，以咳嗽为主要症状。",
+]
+
+
+def test_shared_analysis_matches_direct():
+    """使用分词缓存计算的指标与每次调用时分词的结果一致"""
+    cache = AnalysisCache()
+    direct = NlpFeat("text")
+    cached = NlpFeat("text", analyzer=cache)
+    for text in TEXTS * 2:
+        assert cached.do_process({"text": text}, True) == direct.do_process({"text": text}, True)
+    assert (cache.hit_num, cache.query_num) == (2, 4)
+
+
+def test_memory_bound():
+    cache = AnalysisCache(max_items=1)
+    cache.get(TEXTS[0])
+    cache.get(TEXTS[1])
+    assert len(cache.memory) == 1
+    cache.get(TEXTS[0])
+    assert cache.hit_num == 0
+
+
+def test_sqlite_persistent(tmp_path):
+    """分词结果写入sqlite数据库，新的实例可以直接读取"""
+    db_path = str(tmp_path / "analysis.db")
+    first = AnalysisCache(db_path)
+    expected = first.get(TEXTS[0])
+    first.close()
+    second = AnalysisCache(db_path)
+    assert second.missing(TEXTS) == [TEXTS[1]]
+    loaded = second.get(TEXTS[0])
+    assert second.hit_num == 1
+    assert isinstance(loaded, TextAnalysis)
+    assert (loaded.no_pinc_text, loaded.cut_s, loaded.cut_s_stop) == (
+        expected.no_pinc_text,
+        expected.cut_s,
+        expected.cut_s_stop,
+    )
+    second.close()
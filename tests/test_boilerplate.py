@@ -0,0 +1,85 @@
+from edcp.mdclean.blocks import Block
+from edcp.mdclean.boilerplate import Boilerplate, boilerplate_key
+
+
+def book(pages: int, page_lines):
+    lines = []
+    for i in range(pages):
+        lines.extend(line.format(i=i) for line in page_lines)
+    return lines
+
+
+def test_key_masks_digits():
+    assert boilerplate_key("儿科学 第12页") == boilerplate_key("儿科学 第3页")
+
+
+def test_removes_running_headers():
+    """仅页码不同的页眉页脚达到min_count时剔除"""
+    lines = book(5, ["儿科学 第{i}页", "第{i}章 正文内容很长，不会重复出现的段落{i}" + "。" * 70])
+    bp = Boilerplate(min_count=5, max_len=64)
+    kept = bp.filter("儿科学", lines)
+    assert len(kept) == 5
+    assert all("页" not in t for t in kept)
+    assert bp.removed_num == 5 and bp.total_num == 10
+
+
+def test_below_min_count_kept():
+    lines = book(4, ["儿科学 第{i}页"])
+    assert Boilerplate(min_count=5).filter("儿科学", lines) == lines
+
+
+def test_long_lines_kept():
+    """超过max_len的重复文本行视为正文"""
+    lines = ["重复" * 40] * 10
+    assert Boilerplate(min_count=5, max_len=64).filter("书", lines) == lines
+
+
+
+def test_exempt_headings_formula_and_table():
+    """【…】小标题、$$公式块与html表格中的文本行不作为样板文本剔除"""
+    lines = book(
+        6,
+        [
+            "【临床表现】",
+            "$$",
+            "x = 1",
+            "$$",
+            "<table>",
+            "<tr><td>1</td></tr>",
+            "</table>",
+            "第{i}页",
+        ],
+    )
+    kept = Boilerplate(min_count=5).filter("书", lines)
+    assert kept == [t for t in lines if not t.startswith("第")]
+
+
+def test_exempt_flags():
+    lines = ["$$", "a", "$$", "b", "<table><tr>", "c", "</tr></table>", "d", "【诊断】x"]
+    assert Boilerplate.exempt(lines) == [True, True, True, False, True, True, True, False, True]
+
+
+def test_blocks():
+    """按块处理时按块的文本检测，保留块的类型与行号"""
+    blocks = []
+    for i in range(5):
+        blocks += [
+            Block("text", f"第{i}页", 2 * i + 1, 2 * i + 1),
+            Block("text", f"正文{i}" + "。" * 70, 2 * i + 2, 2 * i + 2),
+        ]
+    kept = Boilerplate(min_count=5).filter("书", blocks)
+    assert [b.start for b in kept] == [2, 4, 6, 8, 10]
+
+
+def test_blocks_exempt():
+    """按块处理时公式块、表格与【…】小标题不参与检测"""
+    blocks = []
+    for i in range(5):
+        blocks += [
+            Block("formula", "$$x$$", 4 * i, 4 * i),
+            Block("table", "<table></table>", 4 * i + 1, 4 * i + 1),
+            Block("heading", "【诊断】", 4 * i + 2, 4 * i + 2),
+            Block("text", f"第{i}页", 4 * i + 3, 4 * i + 3),
+        ]
+    kept = Boilerplate(min_count=5).filter("书", blocks)
+    assert [b.type for b in kept] == ["formula", "table", "heading"] * 5
@@ -0,0 +1,109 @@
+import math
+
+import pytest
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from edcp.metric.calppl import CPPl
+
+
+class CharIdTokenizer:
+    """按字符分词并映射到较小词表的分词器，配合随机初始化的小模型使用"""
+
+    vocab_size = 64
+
+    def encode(self, text: str):
+        return [ord(c) % (self.vocab_size - 1) + 1 for c in text]
+
+    def __call__(self, texts):
+        return {"input_ids": [self.encode(t) for t in texts]}
+
+
+@pytest.fixture
+def tiny_cppl():
+    """随机初始化的两层GPT2模型构造的CPPl，不需要下载模型"""
+    torch.manual_seed(0)
+    config = GPT2Config(
+        vocab_size=CharIdTokenizer.vocab_size, n_positions=64, n_embd=16, n_layer=2, n_head=2
+    )
+    cppl = CPPl.__new__(CPPl)
+    cppl.model = GPT2LMHeadModel(config).eval()
+    cppl.tokenizer = CharIdTokenizer()
+    cppl.text_column = "text"
+    cppl.batch_size = 4
+    cppl.max_length = 64
+    cppl.stride = 32
+    cppl.pad_token_id = 0
+    return cppl
+
+
+@pytest.mark.parametrize("length", [0, 1, 2, 7, 8, 9, 33, 100])
+@pytest.mark.parametrize("max_length,stride", [(8, 8), (8, 4), (8, 3), (8, 1), (5, 2)])
+def test_windows_score_each_token_once(tiny_cppl, length, max_length, stride):
+    """除首个token外，每个token只在一个窗口中计分，且计分时的上文不超过窗口长度"""
+    tiny_cppl.max_length = max_length
+    tiny_cppl.stride = stride
+    ids = list(range(length))
+    scored = []
+    for window, score_from in tiny_cppl.windows(ids):
+        assert 0 < len(window) <= max_length
+        assert score_from >= 1
+        scored.extend(window[score_from:])
+    assert scored == ids[1:]
+
+
+def test_windows_last_window_ends_at_text_end(tiny_cppl):
+    tiny_cppl.max_length = 8
+    tiny_cppl.stride = 4
+    windows = tiny_cppl.windows(list(range(20)))
+    assert [w[-1] for w, _ in windows][-1] == 19
+    assert len(windows) == 4
+
+
+def test_single_window_matches_model_loss(tiny_cppl):
+    """文本不超过max_length时，PPL等于模型在整段文本上的平均损失取指数"""
+    text = "急性支气管炎一般不发热或仅有低热"
+    ids = torch.tensor([tiny_cppl.tokenizer.encode(text)])
+    with torch.no_grad():
+        loss = tiny_cppl.model(input_ids=ids, labels=ids).loss.item()
+    ppl, token_num = tiny_cppl.batch_ppl([text])
+    assert token_num == [len(text) - 1]
+    assert ppl[0] == pytest.approx(math.exp(loss), rel=1e-5)
+
+
+def test_batch_matches_single(tiny_cppl):
+    """右侧填充后批量计算的结果与逐条计算一致"""
+    tiny_cppl.max_length = 16
+    tiny_cppl.stride = 8
+    texts = ["短", "胸部X线检查示肺纹理增多", "临床药理学是研究药物在人体内作用规律的学科" * 3, ""]
+    ppl, token_num = tiny_cppl.batch_ppl(texts)
+    for text, p, n in zip(texts, ppl, token_num):
+        single_ppl, single_num = tiny_cppl.batch_ppl([text])
+        assert n == single_num[0]
+        if n == 0:
+            assert math.isnan(p) and math.isnan(single_ppl[0])
+        else:
+            assert p == pytest.approx(single_ppl[0], rel=1e-5)
+
+
+def test_do_batch_and_corpus_ppl(tiny_cppl):
+    texts = ["胸部X线检查", "肺纹理增多、排列紊乱。", "啊"]
+    columns = tiny_cppl.do_batch(texts)
+    assert list(columns) == ["llm_ppl", "llm_tokens"]
+    assert columns["llm_tokens"] == [5, 10, 0]
+    corpus = tiny_cppl.corpus_ppl(columns["llm_ppl"], columns["llm_tokens"])
+    # 整个语料的PPL等于全部计分token平均负对数似然取指数
+    total = sum(math.log(p) * n for p, n in zip(columns["llm_ppl"], columns["llm_tokens"]) if n)
+    assert corpus == pytest.approx(math.exp(total / 15))
+    assert math.isnan(tiny_cppl.corpus_ppl([float("nan")], [0]))
+
+
+@pytest.mark.parametrize(
+    "positions,tokenizer_max,expected",
+    [(32768, 32768, 2048), (1024, 32768, 1024), (32768, 512, 512), (None, None, 2048)],
+)
+def test_default_max_length(positions, tokenizer_max, expected):
+    """默认窗口不超过2048，避免按模型支持的最大长度（可达32k）构造窗口导致显存不足"""
+    config = type("Config", (), {"max_position_embeddings": positions})()
+    tokenizer = type("Tokenizer", (), {"model_max_length": tokenizer_max})()
+    assert CPPl.default_max_length(config, tokenizer) == expected
@@ -0,0 +1,100 @@
+import pickle
+
+import pytest
+
+from edcp.mdclean.blocks import Block
+from edcp.mdclean.dedup import DedupStore, dedup_key
+from train_qwen_cls.clsdataset import PrepareData
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DedupStore(str(tmp_path / "dedup.db"))
+    yield store
+    store.close()
+
+
+def test_key_normalized():
+    """去重键基于NFKC归一化后的文本"""
+    assert dedup_key("ＡＢＣ１２３") == dedup_key("ABC123")
+    assert len(dedup_key("a", 128)) == 16
+    with pytest.raises(ValueError):
+        DedupStore(":memory:", bits=32)
+
+
+def test_unique_within_call(store):
+    assert store.unique("line", ["甲", "乙", "甲", "丙"], "a") == [True, True, False, True]
+
+
+def test_other_owner_filtered(store):
+    """其他书籍写入的键会过滤当前书籍"""
+    store.unique("line", ["甲", "乙"], "a")
+    assert store.unique("line", ["乙", "丙"], "b") == [False, True]
+
+
+def test_same_owner_not_filtered(store):
+    """同一本书重新处理时不会被自身之前写入的键过滤"""
+    store.unique("line", ["甲", "乙"], "a")
+    assert store.unique("line", ["甲", "乙", "甲"], "a") == [True, True, False]
+    # 首次出现的书籍不变
+    assert store.unique("line", ["甲"], "b") == [False]
+
+
+def test_no_owner_across_runs(tmp_path):
+    """未指定来源时，之前运行写入的键全部过滤"""
+    path = str(tmp_path / "dedup.db")
+    first = DedupStore(path)
+    assert first.unique("label", ["a", "b", "a"]) == [True, True, False]
+    first.close()
+    second = DedupStore(path)
+    assert second.unique("label", ["a", "c"]) == [False, True]
+    # 书籍写入的键同样过滤未指定来源的文本，反之亦然
+    second.unique("line", ["甲"], "a")
+    assert second.unique("line", ["甲"]) == [False]
+    assert second.unique("label", ["c"], "b") == [False]
+    second.close()
+
+
+def test_prepare_data_across_runs(tmp_path):
+    """标注数据去重跨运行生效，第二次运行不再保留已写入的文本"""
+    path = str(tmp_path / "dedup.db")
+
+    def run(texts):
+        pd = PrepareData.__new__(PrepareData)
+        pd.dedup = DedupStore(path)
+        kept = pd.dedup_filter([{"text": t, "label": "正文"} for t in texts])
+        pd.dedup.close()
+        return [d["text"] for d in kept]
+
+    assert run(["a", "b", "a"]) == ["a", "b"]
+    assert run(["a", "c"]) == ["c"]
+
+
+def test_levels_independent(store):
+    store.unique("line", ["甲"], "a")
+    assert store.unique("chunk", ["甲"], "b") == [True]
+
+
+def test_persistent_and_picklable(tmp_path):
+    """去重集合跨实例持久化，序列化后重新建立数据库连接"""
+    path = str(tmp_path / "dedup.db")
+    first = DedupStore(path)
+    first.unique("chunk", ["样本"], "a")
+    first.close()
+    second = pickle.loads(pickle.dumps(DedupStore(path)))
+    assert second.unique("chunk", ["样本"], "b") == [False]
+    assert second.unique("chunk", ["样本"], "a") == [True]
+    second.close()
+
+
+def test_filter(store):
+    kept = store.filter("line", ["甲", "甲", "乙"], "a", "书")
+    assert kept == ["甲", "乙"]
+    assert store.total_num["line"] == 3
+    assert store.unique_num["line"] == 2
+
+
+def test_filter_blocks(store):
+    blocks = [Block("text", "甲", 1, 1), Block("text", "甲", 3, 3), Block("text", "乙", 5, 5)]
+    kept = store.filter("line", blocks, "a", "书")
+    assert [(b.text, b.start) for b in kept] == [("甲", 1), ("乙", 5)]
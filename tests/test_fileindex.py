@@ -0,0 +1,49 @@
+import os
+
+from edcp.mdclean.fileindex import FileIndex
+
+
+def write(path, text, mtime_ns=None):
+    path.write_text(text, encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def test_reuse_unchanged_and_moved(tmp_path):
+    """内容未变的文件（包括移动后的文件）复用缓存结果，索引跨实例持久化"""
+    index_dir = str(tmp_path / "index")
+    a = write(tmp_path / "a.md", "正文")
+    index = FileIndex(index_dir, "cfg")
+    assert not index.has_output(a)
+    index.put_output(a, ["样本"])
+    index.save()
+
+    index = FileIndex(index_dir, "cfg")
+    assert index.has_output(a)
+    assert index.get_output(a) == ["样本"]
+    b = write(tmp_path / "b.md", "正文")
+    assert index.has_output(b)
+    assert (index.hit_num, index.miss_num) == (2, 0)
+
+
+def test_modified_or_config_changed(tmp_path):
+    """内容修改或配置变化时视为需要重新处理的文件"""
+    index_dir = str(tmp_path / "index")
+    a = write(tmp_path / "a.md", "正文", 1_000_000_000)
+    index = FileIndex(index_dir, "cfg")
+    index.put_output(a, ["样本"])
+    assert not FileIndex(index_dir, "other").has_output(a)
+    # 大小不变但修改时间变化时重新计算内容哈希
+    write(tmp_path / "a.md", "改文", 2_000_000_000)
+    assert not index.has_output(a)
+
+
+def test_block_outputs_use_current_path(tmp_path):
+    """内容相同的文件复用按块处理的结果时，样本的来源文件为当前文件"""
+    index = FileIndex(str(tmp_path / "index"), "cfg")
+    a = write(tmp_path / "a.md", "正文")
+    b = write(tmp_path / "b.md", "正文")
+    index.put_output(a, [{"text": "正文", "file": a, "lines": [[1, 1]]}])
+    assert index.get_output(b) == [{"text": "正文", "file": b, "lines": [[1, 1]]}]
+    assert index.get_output(a)[0]["file"] == a
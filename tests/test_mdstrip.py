@@ -0,0 +1,114 @@
+import pytest
+
+from edcp.mdclean import utils
+from edcp.mdclean.mdstrip import MdStripper
+from edcp.mdclean.pipelines import BaseProcess
+
+
+def lines_fast(text: str):
+    return utils.split_text(MdStripper().strip(text))
+
+
+def lines_markdown(text: str):
+    return utils.split_text(BaseProcess.unmark_markdown(text))
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # 链接与图片
+        "参见[儿科学](http://a.com/x)第3章",
+        "![图1](images/a.jpg)\n\n图片之后的正文",
+        # 嵌套强调
+        "这是**加粗中*斜体*文本**结尾",
+        "***粗斜体***与**加粗**",
+        "使用`print()`函数",
+        "价格\\*特价\\*",
+        # 标题、列表与引用
+        "# 第一章 绪论\n\n## 1.1 概述",
+        "- 项目一\n- 项目二\n\n1. 第一\n2. 第二",
+        "> 引用文本",
+        # 表格：MinerU以单行html输出，markdown表格原样保留
+        "表1 结果\n\n<html><body><table><tr><td>a</td></tr></table></body></html>\n\n正文",
+        "| 列1 | 列2 |\n| --- | --- |\n| a | b |",
+        # 公式块
+        "$$\nx^2 + y_1\n$$",
+    ],
+)
+def test_strip_matches_markdown(text):
+    """逐行剥离与Markdown库渲染后展平的结果一致"""
+    assert lines_fast(text) == lines_markdown(text)
+
+
+@pytest.mark.parametrize(
+    "text,fast,markdown",
+    [
+        # 列表续行与缩进续行去掉行首空白
+        (
+            "- 项目一\n  续行内容\n- 项目二",
+            ["项目一", "续行内容", "项目二"],
+            ["项目一", "  续行内容", "项目二"],
+        ),
+        ("正文\n    缩进续行", ["正文", "缩进续行"], ["正文", "    缩进续行"]),
+        # html块内部的行内语法被剥离
+        (
+            "<div>\n**粗**文本\n</div>",
+            ["<div>", "粗文本", "</div>"],
+            ["<div>", "**粗**文本", "</div>"],
+        ),
+    ],
+)
+def test_differences_from_markdown(text, fast, markdown):
+    """逐行剥离与Markdown库渲染结果的已知差异"""
+    assert lines_fast(text) == fast
+    assert lines_markdown(text) == markdown
+
+
+def test_default_unmark_method():
+    """默认使用Markdown库渲染，且不修改Markdown类的输出格式"""
+    from markdown import Markdown
+
+    assert BaseProcess.unmark_method == "markdown"
+    assert "plain" not in Markdown.output_formats
+    text = "- 项目一\n  续行内容"
+    assert BaseProcess().unmark(text) == BaseProcess.unmark_markdown(text)
+
+
+def test_code_fence():
+    """代码块去掉围栏与语言标记，内容不做行内语法剥离"""
+    text = "前文\n\n```python\nx = *a*\n```\n\n后文"
+    assert lines_fast(text) == ["前文", "x = *a*", "后文"]
+
+
+def test_html_lines_kept_whole():
+    """多行html表格逐行原样保留，keep_html为False时剔除"""
+    text = "<table>\n<tr><td>**a**</td></tr>\n</table>\n正文"
+    assert lines_fast(text) == ["<table>", "<tr><td>**a**</td></tr>", "</table>", "正文"]
+    assert utils.split_text(MdStripper(keep_html=False).strip(text)) == ["正文"]
+
+
+def test_formula_dropped():
+    text = "正文\n$$\nx=1\n$$\n后文"
+    assert utils.split_text(MdStripper(keep_formula=False).strip(text)) == ["正文", "后文"]
+
+
+def test_strip_blocks_types_and_lines():
+    """按块剥离时记录块类型与源文件中的起止行号"""
+    text = "# 标题\n\n正文[链接](u)\n\n$$\nx=1\n$$\n<table>\n<tr></tr>\n</table>\n- 列表"
+    blocks = list(MdStripper().strip_blocks(text.split("\n")))
+    assert [(b.type, b.start, b.end) for b in blocks] == [
+        ("heading", 1, 1),
+        ("text", 3, 3),
+        ("formula", 5, 7),
+        ("table", 8, 10),
+        ("list", 11, 11),
+    ]
+    assert blocks[1].text == "正文链接"
+    assert blocks[2].text == "$$\nx=1\n$$"
+
+
+def test_strip_blocks_unclosed_formula():
+    """文件末尾未闭合的公式块同样遵循keep_formula"""
+    lines = ["正文", "$$", "x=1"]
+    assert [b.type for b in MdStripper().strip_blocks(lines)] == ["text", "formula"]
+    assert [b.type for b in MdStripper(keep_formula=False).strip_blocks(lines)] == ["text"]
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from edcp.metric import utils
+from edcp.metric.analysis import AnalysisCache
+from edcp.metric.importance import ImportFeat
+from edcp.metric.language import IdentLanguage
+from edcp.metric.mcdict import McDict
+from edcp.metric.minhash import CalMinHash
+from edcp.metric.nlpfeat import NlpFeat
+from edcp.metric.pipelines import MetricProcess
+
+TEXTS = [
+    "临床药理学是研究药物在人体内作用规律的学科。临床药理学作为药理学科的分支。",
+    "临床药理学是研究药物在人体内作用规律的学科。临床药理学作为药理学的分支。",
+    "你好啊",
+    "Clinical pharmacology studies drugs in humans.",
+    "急性支气管炎一般不发热或仅有低热，全身状况好，以咳嗽为主要症状。",
+    "啊",
+]
+
+
+class FakeFastText:
+    """与fasttext.FastText._FastText.predict返回格式一致的语言识别模型"""
+
+    @staticmethod
+    def label(text: str):
+        return ("__label__en",) if text.isascii() else ("__label__zh",)
+
+    def predict(self, text):
+        if isinstance(text, str):
+            return self.label(text), np.array([0.91])
+        return [self.label(t) for t in text], [np.array([0.91]) for _ in text]
+
+
+class LengthPPL:
+    """按文本长度给出PPL的模型，与CPPl的单样本与批量接口一致"""
+
+    @staticmethod
+    def text_ppl(text: str) -> float:
+        return 1.0 + len(text) / 7
+
+    def do_process(self, single_sample, only_mid_res: bool = False):
+        return {"llm_ppl": self.text_ppl(single_sample["text"])}
+
+    def do_batch(self, texts):
+        return {"llm_ppl": [self.text_ppl(t) for t in texts]}
+
+
+@pytest.fixture
+def metric_process():
+    data = [{"text": t, "int_id": i} for i, t in enumerate(TEXTS)]
+    mp = MetricProcess.__new__(MetricProcess)
+    mp.text_column = "text"
+    mp.idx_column = "int_id"
+    mp.nf = NlpFeat("text")
+    mp.cppl = LengthPPL()
+    mp.cmh = CalMinHash(None, "text", "int_id", 64)
+    mp.cmh._insert(data, mp.cmh._word_bytes(data))
+    mp.idl = IdentLanguage.__new__(IdentLanguage)
+    mp.idl.model = FakeFastText()
+    mp.idl.text_column = "text"
+    mp.imf = ImportFeat({"med": [{"text": TEXTS[0]}, {"text": TEXTS[4]}]}, None, "text", None)
+    return mp, data
+
+
+def test_assemble_records_order_and_missing():
+    """键的顺序为原样本的键，之后依次为各指标的列，取值为MISSING的列跳过"""
+    data = [{"text": "a", "id": 0}, {"text": "b", "id": 1}]
+    records = utils.assemble_records(
+        data,
+        {"x": [1, 2], "y": [utils.MISSING, 3]},
+        {"z": ["p", "q"]},
+    )
+    assert all(isinstance(r, McDict) for r in records)
+    assert [list(r.items()) for r in records] == [
+        [("text", "a"), ("id", 0), ("x", 1), ("z", "p")],
+        [("text", "b"), ("id", 1), ("x", 2), ("y", 3), ("z", "q")],
+    ]
+    # 不修改原样本
+    assert data[0] == {"text": "a", "id": 0}
+
+
+def test_batch_cal_matches_merger_cal(metric_process):
+    """批量计算并一次合并的结果与逐样本调用merger_cal一致（键的顺序与取值）"""
+    mp, data = metric_process
+    old = [mp.merger_cal(d) for d in data]
+    new = mp.batch_cal(data)
+    assert len(old) == len(new)
+    for o, n in zip(old, new):
+        assert list(o) == list(n)
+        for key in o:
+            assert n[key] == o[key], key
+
+
+def test_iter_results_slices_share_analysis(metric_process):
+    """每次计算的样本数量不超过分词缓存容量，各指标共用同一份分词结果，结果与整块计算一致"""
+    mp, data = metric_process
+    expected = mp.batch_cal(data)
+    mp.analyzer = AnalysisCache(max_items=2)
+    mp.nf.analyzer = mp.analyzer
+    mp.imf.analyzer = mp.analyzer
+    mp.data = data
+    mp.chunk_size = 4
+    results = [r for res in mp.iter_results() for r in res]
+    assert [list(r.items()) for r in results] == [list(r.items()) for r in expected]
+    # NlpFeat与ImportFeat各查询一次，每个样本只分词一次
+    assert mp.analyzer.query_num == 2 * len(data)
+    assert mp.analyzer.hit_num == len(data)
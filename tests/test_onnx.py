@@ -0,0 +1,61 @@
+import numpy as np
+import onnx
+import pytest
+from onnx import TensorProto, helper, numpy_helper
+
+from edcp.mdclean import ONNXFilter
+from edcp.mdclean.ONNXFilter import INT8_NAME, ONNX_NAME, ONNXCLS
+
+
+def save_tiny_model(path: str):
+    """输入输出与导出的分类模型一致的小模型：词向量取平均后经过线性层得到logits"""
+    rng = np.random.default_rng(0)
+    embedding = numpy_helper.from_array(rng.standard_normal((32, 8)).astype(np.float32), "embedding")
+    weight = numpy_helper.from_array(rng.standard_normal((8, 2)).astype(np.float32), "weight")
+    nodes = [
+        helper.make_node("Gather", ["embedding", "input_ids"], ["hidden"]),
+        helper.make_node("ReduceMean", ["hidden"], ["pooled"], axes=[1], keepdims=0),
+        helper.make_node("MatMul", ["pooled", "weight"], ["logits"]),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        "tiny_cls",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"]),
+        ],
+        [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 2])],
+        [embedding, weight],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+@pytest.fixture
+def onnx_dir(tmp_path, monkeypatch):
+    """只包含未量化模型的目录，导出与分词器加载均不可用"""
+    save_tiny_model(str(tmp_path / ONNX_NAME))
+
+    def no_export(*args, **kwargs):
+        raise AssertionError("the model should not be exported again")
+
+    monkeypatch.setattr(ONNXFilter, "export_onnx", no_export)
+    monkeypatch.setattr(ONNXFilter.AutoTokenizer, "from_pretrained", lambda *args, **kwargs: None)
+    return tmp_path
+
+
+def test_quantize_existing_model(onnx_dir):
+    """目录中只有未量化的模型时直接量化，不重新导出"""
+    cls = ONNXCLS("model_path", str(onnx_dir), quantize=True)
+    assert cls.onnx_path == str(onnx_dir / INT8_NAME)
+    assert (onnx_dir / INT8_NAME).exists()
+    ids = np.array([[1, 2, 3]], dtype=np.int64)
+    logits = cls.session.run(["logits"], {"input_ids": ids, "attention_mask": np.ones_like(ids)})[0]
+    assert logits.shape == (1, 2)
+
+
+def test_use_existing_fp32_model(onnx_dir):
+    cls = ONNXCLS("model_path", str(onnx_dir), quantize=False)
+    assert cls.onnx_path == str(onnx_dir / ONNX_NAME)
+    assert not (onnx_dir / INT8_NAME).exists()
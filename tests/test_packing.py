@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from edcp.mdclean import packing
+from edcp.mdclean.packing import PackText
+
+
+class CharTokenizer:
+    """每个字符为一个token的分词器，不需要加载模型"""
+
+    def __call__(self, text, add_special_tokens: bool = True):
+        if isinstance(text, str):
+            return {"input_ids": list(text)}
+        return {"input_ids": [list(t) for t in text]}
+
+
+@pytest.fixture(autouse=True)
+def char_tokenizer(monkeypatch):
+    monkeypatch.setattr(
+        packing.AutoTokenizer, "from_pretrained", lambda *args, **kwargs: CharTokenizer()
+    )
+
+
+def make_lines(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return ["字" * rng.choice([1, 3, 8, 20, 45, 130]) for _ in range(n)]
+
+
+def test_greedy_order_and_budget():
+    """按顺序累加，达到max_tokens时（包含当前行）结束当前样本"""
+    pt = PackText("char", max_tokens=10)
+    lines = ["a" * 4, "b" * 4, "c" * 4, "d" * 1, "e" * 20, "f" * 2]
+    assert pt.lines_tokens(lines) == [4, 4, 4, 1, 20, 2]
+    assert pt.to_max_tokens(lines) == ["aaaabbbbcccc", "d" + "e" * 20, "ff"]
+
+
+def test_lines_tokens_batched():
+    lines = make_lines(50)
+    assert PackText("char", batch_size=7).lines_tokens(lines) == [len(t) for t in lines]
+
+
+def test_exact():
+    """exact为True时对拼接后的文本重新统计，逐行统计与整体统计一致时结果相同"""
+    lines = make_lines(200)
+    assert PackText("char", 64, exact=True).forward(lines) == PackText("char", 64).forward(lines)
+
+
+@pytest.mark.parametrize("window_size", [1, 4, 16, 64])
+def test_window_bfd_partition(window_size):
+    """window_bfd输出每行恰好一次，样本内部保持行序，样本按首行顺序输出"""
+    pt = PackText("char", 64, strategy="window_bfd", window_size=window_size)
+    lengths = [len(t) for t in make_lines(300, seed=window_size)]
+    chunks = pt.pack_window_bfd(lengths)
+    assert sorted(i for c in chunks for i in c) == list(range(len(lengths)))
+    assert all(c == sorted(c) for c in chunks)
+    assert [c[0] for c in chunks] == sorted(c[0] for c in chunks)
+
+
+def test_window_bfd_capacity():
+    """除单独成箱的超长行外，样本不超过max_tokens"""
+    pt = PackText("char", 64, strategy="window_bfd", window_size=16)
+    lengths = [len(t) for t in make_lines(300, seed=1)]
+    for chunk in pt.pack_window_bfd(lengths):
+        if len(chunk) > 1:
+            assert sum(lengths[i] for i in chunk) <= 64
+
+
+def test_window_bfd_bounded_carry():
+    """填充不足的样本最多顺延一个窗口，样本包含的行不超过相邻两个窗口"""
+    window_size = 8
+    pt = PackText("char", 100, strategy="window_bfd", window_size=window_size)
+    for lines in (["a"] * 400, make_lines(400, seed=2)):
+        for chunk in pt.pack_window_bfd([len(t) for t in lines]):
+            assert chunk[-1] // window_size - chunk[0] // window_size <= 1
+
+
+def test_invalid_strategy():
+    with pytest.raises(ValueError):
+        PackText("char", 64, strategy="first_fit")
+
+
+def test_join_chunk():
+    """相邻的行直接拼接，不相邻的行之间插入换行符"""
+    content = ["a", "b", "c", "d", "e"]
+    assert PackText.join_chunk(content, [0, 1, 2]) == "abc"
+    assert PackText.join_chunk(content, [0, 1, 3, 4]) == "ab\nde"
+    assert PackText.join_chunk(content, [2]) == "c"
+
+
+def test_window_bfd_joins_non_adjacent_lines():
+    """window_bfd将不相邻的行装入同一样本时，样本内按行序拼接，不相邻的行之间以换行符分隔"""
+    pt = PackText("char", 10, strategy="window_bfd", window_size=8)
+    lines = ["a" * 6, "b" * 5, "c" * 4, "d" * 5]
+    assert pt.pack_window_bfd([len(t) for t in lines]) == [[0, 2], [1, 3]]
+    assert pt.forward(lines) == ["aaaaaa\ncccc", "bbbbb\nddddd"]
@@ -0,0 +1,124 @@
+import os
+
+import pytest
+
+from edcp.mdclean.journal import RunJournal, config_hash
+from edcp.mdclean.pipelines import MdProcess
+from edcp.stream import JsonlWriter, iter_jsonl
+
+
+def stream_process(md_paths, config):
+    """仅包含流式输出所需状态的MdProcess，不加载模型"""
+    mp = MdProcess.__new__(MdProcess)
+    mp.md_path_list = md_paths
+    mp.config = config
+    mp.middle_res = []
+    mp.writer = None
+    mp.middle_writer = None
+    mp.journal = None
+    return mp
+
+
+BOOKS = {
+    "/books/a.md": ["a1", "a2"],
+    "/books/b.md": ["b1", "a1"],
+    "/books/c.md": ["c1", "b1", "c2"],
+}
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.zst"])
+def test_resume_after_crash(tmp_path, suffix):
+    """崩溃后截断未完成书籍写入的数据，跳过已完成的书籍，并延续样本编号与去重状态"""
+    save_path = str(tmp_path / f"data{suffix}")
+    paths = list(BOOKS)
+    mp = stream_process(paths, {"near_tokens": 128})
+    assert mp.open_stream(save_path, 1000, resume=True) == paths
+    for p in paths[:2]:
+        mp.stream_book(p, BOOKS[p])
+    # 模拟第三本书写入一半时崩溃：结果文件与运行日志末尾留下不完整的数据
+    mp.writer.write([{"text": "partial", "id_int": 99}])
+    mp.journal.file.write('{"single_md_path": "/books/c')
+    mp.close_stream()
+
+    mp = stream_process(paths, {"near_tokens": 128})
+    assert mp.open_stream(save_path, 1000, resume=True) == paths[2:]
+    assert mp.sample_num == 3
+    mp.stream_book(paths[2], BOOKS[paths[2]])
+    mp.close_stream()
+
+    records = list(iter_jsonl(save_path))
+    assert [r["text"] for r in records] == ["a1", "a2", "b1", "c1", "c2"]
+    assert [r["id_int"] for r in records] == list(range(5))
+
+
+def test_resume_config_changed(tmp_path):
+    """配置变化时丢弃运行日志，重新处理全部书籍"""
+    save_path = str(tmp_path / "data.jsonl")
+    paths = list(BOOKS)
+    mp = stream_process(paths, {"near_tokens": 128})
+    mp.open_stream(save_path, 1000)
+    mp.stream_book(paths[0], BOOKS[paths[0]])
+    mp.close_stream()
+
+    mp = stream_process(paths, {"near_tokens": 256})
+    assert mp.open_stream(save_path, 1000, resume=True) == paths
+    mp.close_stream()
+    assert list(iter_jsonl(save_path)) == []
+
+
+def test_journal_skips_broken_tail(tmp_path):
+    path = str(tmp_path / "run.journal")
+    journal = RunJournal(path, config_hash({"a": 1}))
+    journal.open("w")
+    journal.record("/books/a.md", 10, 2)
+    journal.record("/books/b.md", 20, 4, middle_offset=7)
+    journal.file.write('{"single_md_path": ')
+    journal.close()
+
+    loaded = RunJournal(path, config_hash({"a": 1}))
+    loaded.load()
+    assert loaded.finished == ["/books/a.md", "/books/b.md"]
+    assert loaded.last_entry["offset"] == 20
+    assert loaded.last_entry["middle_offset"] == 7
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.zst"])
+def test_jsonl_offsets(tmp_path, suffix):
+    """每次写入返回的偏移量可用于截断，截断后追加写入的文件仍可完整读取"""
+    path = str(tmp_path / f"x{suffix}")
+    with JsonlWriter(path) as writer:
+        offset = writer.write([{"text": "一"}, {"text": "二"}])
+        writer.write([{"text": "三"}])
+    with open(path, "r+b") as f:
+        f.truncate(offset)
+    with JsonlWriter(path, mode="a") as writer:
+        writer.write([{"text": "四"}])
+    assert [r["text"] for r in iter_jsonl(path)] == ["一", "二", "四"]
+
+
+@pytest.mark.parametrize("damage", ["deleted", "shortened"])
+def test_resume_output_missing(tmp_path, damage):
+    """结果文件被删除或短于日志记录的偏移量时，丢弃运行日志重新处理全部书籍"""
+    save_path = str(tmp_path / "data.jsonl")
+    paths = list(BOOKS)
+    mp = stream_process(paths, {"near_tokens": 128})
+    mp.open_stream(save_path, 1000)
+    for p in paths[:2]:
+        mp.stream_book(p, BOOKS[p])
+    mp.close_stream()
+    if damage == "deleted":
+        os.remove(save_path)
+    else:
+        os.truncate(save_path, 3)
+
+    mp = stream_process(paths, {"near_tokens": 128})
+    assert mp.open_stream(save_path, 1000, resume=True) == paths
+    assert mp.sample_num == 0
+    for p in paths:
+        mp.stream_book(p, BOOKS[p])
+    mp.close_stream()
+    records = list(iter_jsonl(save_path))
+    assert [r["text"] for r in records] == ["a1", "a2", "b1", "c1", "c2"]
+    # 重新开始后日志只包含本次运行完成的书籍
+    journal = RunJournal(save_path + ".journal", config_hash({"near_tokens": 128}))
+    assert journal.load() and journal.finished == paths
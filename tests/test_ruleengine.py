@@ -0,0 +1,120 @@
+import json
+import random
+
+from edcp.mdclean import utils
+from edcp.mdclean.charreplace import BookClean
+from edcp.mdclean.pipelines import BaseProcess
+from edcp.mdclean.ruleengine import RuleEngine, literal_of
+
+
+def sequential(text, remove_words, replacements):
+    return utils.remove_and_replace(text, remove_words, replacements)
+
+
+def test_literal_of():
+    assert literal_of("弓起") == "弓起"
+    assert literal_of(r"引\|") == "引|"
+    assert literal_of(r"(!|！){2,}") is None
+    assert literal_of(r"\d+") is None
+
+
+def test_default_rules_match_sequential():
+    """默认规则下与逐条替换的结果一致"""
+    engine = RuleEngine.from_files()
+    texts = [
+        "感染弓起发热，泉液检查十扰较多！！！",
+        "引|言：药物弓起的泉液改变!!",
+        "弓起|与弓|起，引||起",
+        "没有需要替换的内容",
+        "",
+    ]
+    for text in texts:
+        assert engine.apply(text) == sequential(
+            text, BookClean.REMOVE_WORDS, BookClean.REPLACEMENTS
+        )
+
+
+def test_default_rules_random_texts():
+    """由默认规则中的字符随机组合的文本，与逐条替换的结果一致"""
+    engine = RuleEngine.from_files()
+    pieces = ["弓", "起", "引", "|", "泉", "液", "十", "扰", "!", "！", "正文", "\n"]
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 12)))
+        assert engine.apply(text) == sequential(
+            text, BookClean.REMOVE_WORDS, BookClean.REPLACEMENTS
+        )
+
+def test_random_literals_match_sequential():
+    """互不重叠的普通字符串规则与逐条替换的结果一致"""
+    rng = random.Random(0)
+    chars = [chr(c) for c in range(0x4E00, 0x4E00 + 120)]
+    rng.shuffle(chars)
+    # 每条规则使用互不相同的字符，规则之间不会互相包含或跨边界匹配
+    words = ["".join(chars[i : i + 2]) for i in range(0, len(chars), 2)]
+    remove_words = words[:20]
+    replacements = [(w, "X") for w in words[20:]]
+    engine = RuleEngine(remove_words, replacements)
+    for _ in range(50):
+        text = "，".join(rng.choice(words + ["正文"]) for _ in range(20))
+        assert engine.apply(text) == sequential(text, remove_words, replacements)
+
+
+def test_regex_rules_and_group_reference():
+    """正则规则按顺序执行，替换中的分组引用与反向引用正确展开"""
+    replacements = [
+        (r"(\d+)页", r"第\1页"),
+        (r"\s+$", ""),
+        (r"(\w)\1{2,}", r"\1"),
+    ]
+    engine = RuleEngine([], replacements)
+    for text in ["见12页   ", "啊啊啊啊好", "第3页与5页"]:
+        assert engine.apply(text) == sequential(text, [], replacements)
+
+
+def test_rule_order_kept():
+    """普通字符串规则与正则规则交替出现时按原顺序执行，之后的规则看到之前规则的结果"""
+    replacements = [
+        (r"\d+", "N"),
+        ("N页", "某页"),
+        ("页", "叶"),
+        (r"叶+", "Y"),
+        ("ab", "b"),
+        ("bc", "X"),
+        ("aa", "a"),
+    ]
+    engine = RuleEngine(["Q"], replacements)
+    for text in ["第12页", "页页页", "abc", "aab", "aQab", "aaab"]:
+        assert engine.apply(text) == sequential(text, ["Q"], replacements)
+
+def test_hits():
+    """统计每条规则的命中次数"""
+    engine = RuleEngine(["删"], [(r"\d+", "0")])
+    assert engine.apply("删1，删22") == "0，0"
+    assert engine.hits["删"] == 2
+    assert engine.hits[r"\d+"] == 2
+
+
+def test_engine_per_process():
+    """每个处理器持有独立的规则引擎，命中次数互不影响"""
+    a = BaseProcess()
+    b = BaseProcess(RuleEngine(["删"]))
+    assert a.rule_engine is not BaseProcess().rule_engine
+    assert a.replace_op(["感染弓起发热"]) == ["感染引起发热"]
+    assert b.replace_op(["删除"]) == ["除"]
+    assert a.rule_engine.hits and "删" not in a.rule_engine.hits
+    assert list(b.rule_engine.hits) == ["删"]
+
+
+def test_from_files(tmp_path):
+    """json与tsv规则文件与默认规则合并"""
+    json_path = tmp_path / "rules.json"
+    json_path.write_text(
+        json.dumps({"remove_words": ["页眉"], "replacements": [["甲", "乙"]]}),
+        encoding="utf-8",
+    )
+    tsv_path = tmp_path / "rules.tsv"
+    tsv_path.write_text("# 注释\n页脚\n丙\t丁\n", encoding="utf-8")
+    engine = RuleEngine.from_files([str(json_path), str(tsv_path)])
+    assert engine.apply("页眉甲丙页脚弓起") == "乙丁引起"
+    assert RuleEngine.from_files([str(json_path)], with_default=False).apply("弓起甲") == "弓起乙"
@@ -0,0 +1,45 @@
+import pytest
+
+from edcp.mdclean.stages import Stage
+
+
+def double(items):
+    for x in items:
+        yield x * 2
+
+
+def fail_after(n):
+    def fn(items):
+        for i, x in enumerate(items):
+            if i == n:
+                raise ValueError("bad book")
+            yield x
+
+    return fn
+
+
+def test_pipeline_order():
+    first = Stage("parse", double, range(20), maxsize=2)
+    second = Stage("inference", double, first, maxsize=2).start()
+    assert list(second) == [x * 4 for x in range(20)]
+    second.stop()
+    assert second.failure() is None
+
+
+def test_upstream_error_raised():
+    """上游阶段抛出的异常由下游重新抛出，并可通过failure定位"""
+    first = Stage("parse", fail_after(3), range(10))
+    second = Stage("inference", double, first).start()
+    with pytest.raises(RuntimeError) as e:
+        list(second)
+    second.stop()
+    assert isinstance(second.failure(), ValueError)
+    assert isinstance(e.value.__cause__, RuntimeError)
+
+
+def test_early_end_returns_default():
+    """结果少于预期时next返回默认值，而不是抛出StopIteration"""
+    stage = Stage("inference", double, range(2)).start()
+    result_iter = iter(stage)
+    assert [next(result_iter, None) for _ in range(3)] == [0, 2, None]
+    stage.stop()
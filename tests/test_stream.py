@@ -0,0 +1,35 @@
+import io
+import json
+
+import pytest
+import zstandard
+
+from edcp.stream import JsonlWriter
+
+
+def read_lines(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".zst"):
+        data = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.zst"])
+def test_write_batches(tmp_path, suffix):
+    """每次写入立即落盘，多批写入（压缩时为多个zstd帧）可连续读取"""
+    path = str(tmp_path / "out" / f"data{suffix}")
+    with JsonlWriter(path) as writer:
+        offset = writer.write([{"text": "一"}, {"text": "二"}])
+        assert offset == writer.tell() > 0
+        assert read_lines(path) == [{"text": "一"}, {"text": "二"}]
+        assert writer.write([]) == offset
+        writer.write([{"text": "三"}])
+    with JsonlWriter(path, mode="a") as writer:
+        writer.write([{"text": "四"}])
+    assert [r["text"] for r in read_lines(path)] == ["一", "二", "三", "四"]
+
+
+def test_invalid_mode(tmp_path):
+    with pytest.raises(ValueError):
+        JsonlWriter(str(tmp_path / "x.jsonl"), mode="r")
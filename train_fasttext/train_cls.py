@@ -0,0 +1,142 @@
+import time
+import random
+from typing import List, Dict, Tuple, Optional
+
+import fasttext
+from edcp.tool import read_json
+from edcp.mdclean import utils
+from edcp.mdclean.FTFilter import FastTextCLS, ft_tokenize
+from edcp.mdclean.pipelines import BaseProcess
+
+
+class DistillData:
+    def __init__(
+        self,
+        book_data_path: str,
+        teacher_path: Optional[str] = None,
+        md_dir: Optional[str] = None,
+        batch_size: int = 32,
+    ):
+        """
+        构造fastText正文与非正文分类模型的训练数据
+        Args:
+            book_data_path: train_qwen_cls/clsdataset.py生成的book_data.json，形如[{"text": ..., "label": 0或1}]
+            teacher_path: 作为教师模型的QwenCLS路径，若不为None则对md_dir中的文本行进行标注，扩充训练数据
+            md_dir: 需要教师模型标注的markdown文件目录
+            batch_size: 教师模型推理的批大小
+        """
+        self.book_data = read_json(book_data_path)
+        self.teacher_path = teacher_path
+        self.md_dir = md_dir
+        self.batch_size = batch_size
+        self.teacher_speed: Optional[float] = None
+
+    def teacher_data(self) -> List[Dict[str, int]]:
+        """使用教师模型对markdown文件中的文本行进行标注"""
+        from edcp.mdclean.CLSFilter import QwenCLS
+
+        teacher = QwenCLS(self.teacher_path)
+        bp = BaseProcess()
+        lines: List[str] = []
+        for md_path in utils.search_file_suffix(self.md_dir, "md"):
+            lines.extend(bp.replace_op(utils.split_text(bp.read_md(md_path))))
+        lines = list(dict.fromkeys(lines))
+        datas: List[Dict[str, int]] = []
+        start = time.perf_counter()
+        for chunk in utils.chunk_list(lines, self.batch_size):
+            for text, (_, prob) in zip(chunk, teacher.predict([""] * len(chunk), chunk)):
+                datas.append({"text": text, "label": 0 if prob >= 0.5 else 1})
+        self.teacher_speed = len(lines) / (time.perf_counter() - start)
+        print(f"Teacher labeled {len(datas)} lines, {self.teacher_speed:.1f} lines/s")
+        return datas
+
+    @staticmethod
+    def to_train_data(datas: List[Dict[str, int]]) -> List[str]:
+        return [f"__label__{d['label']} {ft_tokenize(d['text'])}" for d in datas]
+
+    @staticmethod
+    def save_txt(string_list: List[str], file_path: str):
+        with open(file_path, "w", encoding="utf-8") as file:
+            for item in string_list:
+                file.write(item + "\n")
+
+    def forward(
+        self, valid_ratio: float = 0.1, seed: int = 42
+    ) -> List[Dict[str, int]]:
+        """
+        保存训练集与验证集，验证集仅由人工标注数据构成
+        Returns: 验证集
+        """
+        gold = list(self.book_data)
+        random.Random(seed).shuffle(gold)
+        valid_len = int(len(gold) * valid_ratio)
+        valid, train = gold[:valid_len], gold[valid_len:]
+        if self.teacher_path is not None and self.md_dir is not None:
+            train = train + self.teacher_data()
+            random.Random(seed).shuffle(train)
+        print(f"Train sample: {len(train)}")
+        print(f"Valid sample: {len(valid)}")
+        self.save_txt(self.to_train_data(train), "cls_train.txt")
+        self.save_txt(self.to_train_data(valid), "cls_valid.txt")
+        return valid
+
+
+def threshold_report(
+    ft: FastTextCLS,
+    valid: List[Dict[str, int]],
+    thresholds: Tuple[float, ...] = (0.5, 0.8, 0.9, 0.95, 0.98, 0.99),
+):
+    """
+    统计不同置信度阈值下fastText直接判断的文本行比例及其准确率，用于选择ft_keep_threshold与ft_drop_threshold
+    Args:
+        ft: fastText分类模型
+        valid: 验证集
+        thresholds: 需要统计的阈值
+    """
+    texts = [d["text"] for d in valid]
+    start = time.perf_counter()
+    probs = ft.prob(texts)
+    speed = len(texts) / (time.perf_counter() - start)
+    print(f"FastText throughput: {speed:.1f} lines/s")
+    for t in thresholds:
+        decided = correct = 0
+        for p, d in zip(probs, valid):
+            if p >= t or 1 - p >= t:
+                decided += 1
+                correct += int((0 if p >= 0.5 else 1) == d["label"])
+        coverage = decided / len(valid) * 100 if valid else 0.0
+        accuracy = correct / decided * 100 if decided else 0.0
+        print(
+            f"threshold {t}: {coverage:.2f}% lines decided by fastText, accuracy {accuracy:.2f}%"
+        )
+
+
+def main(
+    book_data_path: str,
+    teacher_path: Optional[str] = None,
+    md_dir: Optional[str] = None,
+):
+    dd = DistillData(book_data_path, teacher_path, md_dir)
+    valid = dd.forward()
+    classifier = fasttext.train_supervised(
+        input="cls_train.txt",
+        lr=0.5,
+        epoch=25,
+        wordNgrams=2,
+        dim=64,
+        bucket=200000,
+        thread=8,
+    )
+    train_result = classifier.test("cls_train.txt")
+    print("train_precision:", train_result[1])
+    valid_result = classifier.test("cls_valid.txt")
+    print("valid_precision:", valid_result[1])
+    classifier.save_model("cls_model.bin")
+
+    threshold_report(FastTextCLS("cls_model.bin"), valid)
+    if dd.teacher_speed is not None:
+        print(f"Teacher throughput: {dd.teacher_speed:.1f} lines/s")
+
+
+if __name__ == "__main__":
+    main("../train_qwen_cls/book_data.json")
@@ -1,24 +1,30 @@
 import re
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 
 from tqdm import tqdm
-from rbloom import Bloom
 from edcp.tool import read_json, save_json
 from edcp.mdclean.utils import search_file_suffix
-from edcp.mdclean.utils import remove_and_replace
-from edcp.mdclean.charreplace import BookClean
+from edcp.mdclean.ruleengine import RuleEngine
+from edcp.mdclean.dedup import DedupStore
 
 ID2LABEL: Dict[int, str] = {0: "正文", 1: "非正文"}
 LABEL2ID: Dict[str, int] = {"正文": 0, "非正文": 1}
+# 与MdProcess相同的删除与替换规则
+RULE_ENGINE = RuleEngine.from_files()
 
 
 class PrepareData:
 
-    def __init__(self, json_dir: str):
+    def __init__(self, json_dir: str, dedup_path: Optional[str] = None):
+        """
+        Args:
+            json_dir: 标注数据所在目录
+            dedup_path: 持久化去重集合的sqlite数据库路径，与MdProcess的dedup_path可以共用，若为None则仅在本次运行内去重
+        """
         json_path_list = search_file_suffix(json_dir, "json")
         self.book_data = self.aux_read(json_path_list)
-        self.bf = Bloom(int(5.0e5), 0.01)
+        self.dedup = DedupStore(dedup_path or ":memory:")
 
     @classmethod
     def aux_read(cls, json_path_list: str):
@@ -50,9 +56,7 @@ class PrepareData:
     @staticmethod
     def batch_amend(datas: List[Dict[str, Any]]):
         for data in datas:
-            data["text"] = remove_and_replace(
-                data["text"], BookClean.REMOVE_WORDS, BookClean.REPLACEMENTS
-            )
+            data["text"] = RULE_ENGINE.apply(data["text"])
             if re.match(r"^【", data["text"]):
                 data["label"] = "正文"
             # 以表、图开头的全部是非正文
@@ -60,16 +64,16 @@ class PrepareData:
                 data["label"] = "非正文"
         return datas
 
-    def bloom_filter(self, datas: List[Dict[str, Any]]):
+    def dedup_filter(self, datas: List[Dict[str, Any]]):
+        # 标注数据不区分来源，历次运行（或MdProcess）写入的文本全部过滤
+        keep = self.dedup.unique("label", [data["text"] for data in datas])
         filter_list = []
-        for data in tqdm(datas, desc="Bloom Filter"):
-            if data["text"] in self.bf:
-                continue
-            else:
-                self.bf.add(data["text"])
+        for data, k in zip(tqdm(datas, desc="Dedup Filter"), keep):
+            if k:
                 filter_list.append(
                     {"text": data["text"], "label": LABEL2ID[data["label"]]}
                 )
+        self.dedup.info()
         return filter_list
 
     @staticmethod
@@ -87,7 +91,7 @@ class PrepareData:
 
     def forward(self):
         book_data = self.batch_amend(self.book_data)
-        book_data = self.bloom_filter(book_data)
+        book_data = self.dedup_filter(book_data)
         self.print_info(book_data)
         save_json("book_data.json", book_data)
 
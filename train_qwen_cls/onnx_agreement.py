@@ -0,0 +1,78 @@
+import time
+from typing import List, Dict, Optional
+
+from datasets import load_dataset
+from edcp.mdclean import utils
+from edcp.mdclean.CLSFilter import QwenCLS
+from edcp.mdclean.ONNXFilter import ONNXCLS
+
+
+def held_out_data(book_data_path: str) -> List[Dict[str, int]]:
+    """与run_cls.py使用相同的划分方式，返回训练时未见过的验证集"""
+    dataset = load_dataset("json", data_files=book_data_path, split="train")
+    dataset = dataset.train_test_split(test_size=0.1, shuffle=True, seed=42)
+    return dataset["test"].to_list()
+
+
+def backend_probs(model, texts: List[str], batch_size: int):
+    """返回每行文本属于正文的概率及推理速度（行/秒）"""
+    probs: List[float] = []
+    # 预热一个批次，避免首次推理的初始化开销计入速度
+    if texts:
+        model.predict([""] * len(texts[:batch_size]), texts[:batch_size])
+    start = time.perf_counter()
+    for chunk in utils.chunk_list(texts, batch_size):
+        probs.extend(p for _, p in model.predict([""] * len(chunk), chunk))
+    return probs, len(texts) / (time.perf_counter() - start)
+
+
+def agreement_report(
+    model_path: str,
+    book_data_path: str,
+    onnx_dir: Optional[str] = None,
+    quantize: bool = True,
+    intra_op_threads: Optional[int] = None,
+    inter_op_threads: int = 1,
+    batch_size: int = 32,
+):
+    """
+    在验证集上对比PyTorch与ONNX Runtime（动态int8量化）两种推理后端，
+    统计判断结果的一致率、各自的准确率、正文概率的最大偏差以及推理速度
+    Args:
+        model_path: Qwen2.5分类模型路径
+        book_data_path: clsdataset.py生成的book_data.json
+        onnx_dir: ONNX模型的保存目录，若为None则为模型路径下的onnx文件夹
+        quantize: 是否使用动态int8量化后的模型
+        intra_op_threads: ONNX Runtime单个算子内部的并行线程数
+        inter_op_threads: ONNX Runtime算子之间的并行线程数
+        batch_size: 推理批大小
+    """
+    valid = held_out_data(book_data_path)
+    texts = [d["text"] for d in valid]
+    labels = [d["label"] for d in valid]
+    torch_probs, torch_speed = backend_probs(QwenCLS(model_path), texts, batch_size)
+    onnx_model = ONNXCLS(
+        model_path, onnx_dir, quantize, intra_op_threads, inter_op_threads
+    )
+    onnx_probs, onnx_speed = backend_probs(onnx_model, texts, batch_size)
+
+    torch_pred = [0 if p >= 0.5 else 1 for p in torch_probs]
+    onnx_pred = [0 if p >= 0.5 else 1 for p in onnx_probs]
+    agree = sum(t == o for t, o in zip(torch_pred, onnx_pred))
+    max_diff = max((abs(t - o) for t, o in zip(torch_probs, onnx_probs)), default=0.0)
+    total = len(valid) if valid else 1
+    print(f"Valid sample: {len(valid)}")
+    print(f"Agreement: {agree / total * 100:.2f}% ({len(valid) - agree} lines differ)")
+    print(f"Max probability difference: {max_diff:.4f}")
+    print(
+        f"PyTorch accuracy: {sum(p == l for p, l in zip(torch_pred, labels)) / total * 100:.2f}%, "
+        f"throughput: {torch_speed:.1f} lines/s"
+    )
+    print(
+        f"ONNX accuracy: {sum(p == l for p, l in zip(onnx_pred, labels)) / total * 100:.2f}%, "
+        f"throughput: {onnx_speed:.1f} lines/s"
+    )
+
+
+if __name__ == "__main__":
+    agreement_report("Qwen2.5-0.5B-cls", "book_data.json")